@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Micro-benchmark for evaluating many runs with the default effectiveness measures of evaluate.
+
+Compares ir_measures.calc_aggregate per run with lsr_benchmark.effectiveness.evaluate_runs (qrels indexed once) on
+synthetic qrels and runs, asserts that both compute the same scores, and reports the wall-clock time.
+"""
+import json
+import time
+
+import click
+import ir_measures
+import numpy as np
+from ir_measures import RR, P, R, nDCG
+
+from lsr_benchmark.effectiveness import QrelsIndex, evaluate_runs
+from lsr_benchmark.runs import ColumnarRun, RunRows
+
+MEASURES = [nDCG @ 10, nDCG(judged_only=True) @ 10, P @ 10, RR, R @ 100]
+
+
+@click.command()
+@click.option("--num-runs", type=int, default=200, help="Number of synthetic runs.")
+@click.option("--num-queries", type=int, default=200, help="Number of queries per run.")
+@click.option("--k", type=int, default=100, help="Number of results per query.")
+def main(num_runs, num_queries, k):
+    rng = np.random.default_rng(42)
+    qrels = {
+        f"q{q}": {f"d{i}": int(rng.integers(0, 4)) for i in rng.choice(2_000, 50, replace=False)}
+        for q in range(num_queries)
+    }
+    query_ids = np.repeat([f"q{q}" for q in range(num_queries)], k)
+    runs = [
+        ColumnarRun.from_rows(
+            RunRows(
+                query_ids,
+                np.array([f"d{i}" for i in rng.integers(0, 3_000, num_queries * k)]),
+                np.tile(np.arange(1, k + 1), num_queries),
+                rng.random(num_queries * k).astype(np.float32),
+            )
+        )
+        for _ in range(num_runs)
+    ]
+
+    start = time.perf_counter()
+    expected = [ir_measures.calc_aggregate(MEASURES, qrels, run.to_dict()) for run in runs]
+    print(json.dumps({"mode": "ir_measures", "seconds": round(time.perf_counter() - start, 3)}))
+
+    start = time.perf_counter()
+    actual = evaluate_runs(QrelsIndex.from_dict(qrels), runs, MEASURES)
+    print(json.dumps({"mode": "evaluate_runs", "seconds": round(time.perf_counter() - start, 3)}))
+
+    assert all(abs(i[m] - j[str(m)]) < 1e-9 for i, j in zip(expected, actual) for m in MEASURES)
+
+
+if __name__ == "__main__":
+    main()
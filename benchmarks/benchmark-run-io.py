@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Micro-benchmark for writing and reading deep runs (e.g., k=1000) in the TREC format.
+
+Compares the per-hit gzip.open(..., "wt") writer that the step-03 scripts used before with lsr_benchmark.runs.RunWriter,
+and list(ir_measures.read_trec_run(...)) that evaluate used before with lsr_benchmark.runs.read_run, on a synthetic run.
+Reported is the wall-clock time and the size of the run file.
+"""
+import gzip
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import click
+import numpy as np
+
+from lsr_benchmark.runs import RunWriter, read_run
+
+
+def legacy_write(rankings, run_file):
+    with gzip.open(run_file, "wt") as f:
+        for qid, docnos, scores in rankings:
+            rank = 1
+            for docno, score in zip(docnos, scores):
+                f.write(f"{qid} Q0 {docno} {rank} {score} legacy\n")
+                rank += 1
+
+
+def run_writer(rankings, run_file, compresslevel):
+    with RunWriter(run_file, "run-writer", compresslevel) as run:
+        for qid, docnos, scores in rankings:
+            run.add(qid, docnos, scores)
+
+
+def legacy_read(run_file):
+    import ir_measures
+
+    return len(list(ir_measures.read_trec_run(gzip.open(run_file, "rt"))))
+
+
+@click.command()
+@click.option("--num-queries", type=int, default=1_000, help="Number of synthetic queries.")
+@click.option("--num-docs", type=int, default=8_000_000, help="Number of synthetic documents.")
+@click.option("--k", type=int, default=1_000, help="Number of results per query.")
+def main(num_queries, num_docs, k):
+    rng = np.random.default_rng(42)
+    rankings = [
+        (f"query-{i}", [f"doc-{j}" for j in rng.integers(0, num_docs, k)], (-np.sort(-rng.random(k))).tolist())
+        for i in range(num_queries)
+    ]
+
+    def report(mode, start, run_file):
+        seconds = round(time.perf_counter() - start, 3)
+        print(json.dumps({"mode": mode, "seconds": seconds, "megabytes": round(run_file.stat().st_size / 2**20, 1)}))
+
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_file = Path(directory) / "legacy.txt.gz"
+        start = time.perf_counter()
+        legacy_write(rankings, legacy_file)
+        report("write: legacy", start, legacy_file)
+
+        for compresslevel in (6, 1):
+            run_file = Path(directory) / f"run-writer-{compresslevel}.txt.gz"
+            start = time.perf_counter()
+            run_writer(rankings, run_file, compresslevel)
+            report(f"write: RunWriter (compresslevel={compresslevel})", start, run_file)
+
+        start = time.perf_counter()
+        assert legacy_read(legacy_file) == num_queries * k
+        report("read: ir_measures", start, legacy_file)
+
+        start = time.perf_counter()
+        assert len(read_run(legacy_file)) == num_queries * k
+        report("read: read_run", start, legacy_file)
+
+
+if __name__ == "__main__":
+    main()
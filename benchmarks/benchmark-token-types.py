@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Micro-benchmark for loading document embeddings with string vs. integer token ids.
+
+Each mode runs in a fresh process on synthetic SPLADE-like embeddings and converts the tokens of every document into
+the int32 arrays that engines such as kannolo or pytorch-naive consume. Reported are the wall-clock time and peak RSS.
+"""
+import json
+import multiprocessing
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+import click
+import numpy as np
+
+MODES = ("legacy-str-list", "str", "int")
+
+
+def create_embeddings(directory: Path, num_docs: int, tokens_per_doc: int, vocab_size: int):
+    rng = np.random.default_rng(42)
+    (directory / "doc").mkdir(parents=True, exist_ok=True)
+    indptr = np.arange(num_docs + 1, dtype=np.int64) * tokens_per_doc
+    indices = rng.integers(0, vocab_size, size=num_docs * tokens_per_doc, dtype=np.int64)
+    data = rng.random(num_docs * tokens_per_doc, dtype=np.float32)
+    np.savez_compressed(directory / "doc" / "doc-embeddings.npz", data=data, indices=indices, indptr=indptr)
+    (directory / "doc" / "doc-ids.txt").write_text("\n".join(f"doc-{i}" for i in range(num_docs)))
+
+
+def measure(mode: str, directory: str, cache_dir: str, queue):
+    import os
+
+    os.environ["LSR_BENCHMARK_HOME"] = cache_dir
+    from lsr_benchmark.irds import embeddings
+
+    start = time.perf_counter()
+    if mode == "legacy-str-list":
+        # the behaviour before SparseEmbeddingMatrix: all tokens are converted to strings up front
+        npz = np.load(Path(directory) / "doc" / "doc-embeddings.npz")
+        ids = (Path(directory) / "doc" / "doc-ids.txt").read_text().strip().split("\n")
+        indices, data, rows, ptr_start = npz["indices"].astype("U30"), npz["data"], [], 0
+        for doc_id, ptr_end in zip(ids, npz["indptr"][1:]):
+            rows.append((doc_id, indices[ptr_start:ptr_end], data[ptr_start:ptr_end]))
+            ptr_start = ptr_end
+        for _, tokens, _ in rows:
+            np.fromiter(map(int, tokens), dtype=np.int32)
+    elif mode == "str":
+        for _, tokens, _ in embeddings("ignored", directory, "doc", token_type="str"):
+            np.fromiter(map(int, tokens), dtype=np.int32)
+    else:
+        for _, tokens, _ in embeddings("ignored", directory, "doc", token_type="int"):
+            np.asarray(tokens, dtype=np.int32)
+
+    queue.put({
+        "mode": mode,
+        "seconds": round(time.perf_counter() - start, 3),
+        "peak-rss-mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    })
+
+
+@click.command()
+@click.option("--num-docs", type=int, default=200_000, help="Number of synthetic documents.")
+@click.option("--tokens-per-doc", type=int, default=120, help="Number of non-zero tokens per document.")
+@click.option("--vocab-size", type=int, default=30522, help="Size of the vocabulary.")
+def main(num_docs, tokens_per_doc, vocab_size):
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory, tempfile.TemporaryDirectory() as cache_dir:
+        create_embeddings(Path(directory), num_docs, tokens_per_doc, vocab_size)
+        # warm up the memory-mapped cache so that all modes read the same data
+        from lsr_benchmark.irds import memory_mapped_embeddings
+        import os
+
+        os.environ["LSR_BENCHMARK_HOME"] = cache_dir
+        memory_mapped_embeddings(Path(directory) / "doc" / "doc-embeddings.npz")
+
+        for mode in MODES:
+            queue = ctx.Queue()
+            process = ctx.Process(target=measure, args=(mode, directory, cache_dir, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+            print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,39 @@
 __version__ = "0.0.1rc4"
 import json
 from pathlib import Path
-from ir_datasets import registry
-from lsr_benchmark.irds import build_dataset, MAPPING_OF_DATASET_IDS, ir_datasets_from_tira
-from lsr_benchmark.corpus import materialize_corpus, materialize_queries, materialize_qrels
 from click import group, argument
 import lsr_benchmark.click
+from lsr_benchmark.datasets import MAPPING_OF_DATASET_IDS
 
 SUPPORTED_IR_DATASETS = MAPPING_OF_DATASET_IDS.keys()
 
 from ._commands._evaluate import evaluate
 from ._commands._retrieval import retrieval
 from ._commands._download import download_embeddings, download_run
+from ._commands._export import export_arrow
+from ._commands._sweep import sweep
 from .datasets import TIRA_DATASET_ID_TO_IR_DATASET_ID, IR_DATASET_TO_TIRA_DATASET
 import os
 
 
+def __getattr__(name):
+    # ir_datasets and tira take seconds to import, so we only import them when the dataset api is used
+    if name in ("build_dataset", "ir_datasets_from_tira"):
+        import lsr_benchmark.irds
+        return getattr(lsr_benchmark.irds, name)
+    if name in ("materialize_corpus", "materialize_queries", "materialize_qrels"):
+        import lsr_benchmark.corpus
+        return getattr(lsr_benchmark.corpus, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def register_to_ir_datasets(dataset=None):
+    from ir_datasets import registry
+    from lsr_benchmark.irds import build_dataset, ir_datasets_from_tira
+
     if dataset and os.path.isdir(dataset):
         if dataset not in registry:
             ds = build_dataset(dataset, False)
-            registry.register(dataset, ds)
-            registry.register("lsr-benchmark/" + dataset, ds)
-    elif dataset and (dataset in ir_datasets_from_tira() or dataset in ir_datasets_from_tira(True)):
-        if dataset not in registry:
-            ds = build_dataset(dataset, False)
-
             registry.register(dataset, ds)
             registry.register("lsr-benchmark/" + dataset, ds)
     elif dataset and dataset in IR_DATASET_TO_TIRA_DATASET:
@@ -35,6 +43,14 @@ def register_to_ir_datasets(dataset=None):
             if IR_DATASET_TO_TIRA_DATASET[dataset] not in registry:
                 registry.register(IR_DATASET_TO_TIRA_DATASET[dataset], ds)
             registry.register("lsr-benchmark/" + dataset, ds)
+    elif dataset and (
+        dataset in TIRA_DATASET_ID_TO_IR_DATASET_ID or dataset in ir_datasets_from_tira() or dataset in ir_datasets_from_tira(True)
+    ):
+        if dataset not in registry:
+            ds = build_dataset(dataset, False)
+
+            registry.register(dataset, ds)
+            registry.register("lsr-benchmark/" + dataset, ds)
     elif dataset and dataset not in SUPPORTED_IR_DATASETS:
         raise ValueError(f"Can not register {dataset}. Supported are: {sorted(IR_DATASET_TO_TIRA_DATASET.keys())}")
     else:
@@ -48,8 +64,9 @@ def register_to_ir_datasets(dataset=None):
                 registry.register(irds_id, build_dataset(k, False))
 
 
-def load(ir_datasets_id: str):
-    return build_dataset(ir_datasets_id, False)
+def load(ir_datasets_id: str, format: str = "jsonl"):
+    from lsr_benchmark.irds import build_dataset
+    return build_dataset(ir_datasets_id, False, format)
 
 
 @group()
@@ -59,6 +76,7 @@ def main():
 
 def create_subsampled_corpus(directory, config):
     from tirex_tracker import tracking, ExportFormat
+    from lsr_benchmark.corpus import materialize_corpus, materialize_queries, materialize_qrels
     target_directory = directory
 
     target_directory.mkdir(exist_ok=True)
@@ -75,6 +93,14 @@ def create_lsr_corpus(directory):
     create_subsampled_corpus(directory, config)
 
 
+def _format_table(rows):
+    # renders the rows like a pandas DataFrame without index, but without the import time of pandas
+    columns = list(rows[0].keys())
+    widths = [max(len(str(i)) for i in [c] + [r[c] for r in rows]) for c in columns]
+    lines = [[c for c in columns]] + [[r[c] for c in columns] for r in rows]
+    return "\n".join("  " + "  ".join(str(v).rjust(w) for v, w in zip(line, widths)) for line in lines)
+
+
 @main.command()
 def overview():
     overview = json.loads((Path(__file__).parent / "datasets" / "overview.json").read_text())
@@ -85,7 +111,6 @@ def overview():
     def f(s):
         return str(int(s/(1024))) + " MB"
 
-    import pandas as pd
     model_to_size = {}
 
     for dataset_id, stats in overview.items():
@@ -98,23 +123,22 @@ def overview():
             model_to_size[embedding] = int(embedding_size) + model_to_size.get(embedding, 0)
 
         df_dataset += [{"Dataset": TIRA_DATASET_ID_TO_IR_DATASET_ID.get(dataset_id, dataset_id), "Text": f(int(stats['dataset-size'])), "Avg. Embeddings": f(embeddings_for_dataset/len(overall_embeddings))}]
-    df_dataset = pd.DataFrame(df_dataset)
-    df_dataset.index = ['']*len(df_dataset)
-    
+    df_dataset = _format_table(sorted(df_dataset, key=lambda i: i["Dataset"]))
+
     df_embeddings = []
     for k, v in model_to_size.items():
         df_embeddings += [{"Model": k, "Size (avg)": f(v/len(overall_embeddings))}]
 
+    df_embeddings = _format_table(df_embeddings)
 
-    df_embeddings = pd.DataFrame(df_embeddings)
-    df_embeddings.index = ['']*len(df_embeddings)
-
-    print(f"Overview of the lsr-benchmark:\n\n\t- {overall_datasets} Datasets with {len(overall_embeddings)} pre-computed embeddings ({f(overall_size)})\n\nDatasets:\n{df_dataset.sort_values('Dataset')}\n\nEmbeddings:\n{df_embeddings}")
+    print(f"Overview of the lsr-benchmark:\n\n\t- {overall_datasets} Datasets with {len(overall_embeddings)} pre-computed embeddings ({f(overall_size)})\n\nDatasets:\n{df_dataset}\n\nEmbeddings:\n{df_embeddings}")
 
 main.command()(download_embeddings)
 main.command()(download_run)
 main.command()(evaluate)
 main.command()(retrieval)
+main.command()(export_arrow)
+main.command()(sweep)
 
 if __name__ == '__main__':
     main()
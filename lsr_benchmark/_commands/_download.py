@@ -1,8 +1,6 @@
 import click
-from tira.rest_api_client import Client
 from pathlib import Path
 from lsr_benchmark.datasets import all_embeddings, all_ir_datasets, IR_DATASET_TO_TIRA_DATASET
-from shutil import copytree
 
 @click.option(
     "--dataset",
@@ -23,11 +21,16 @@ from shutil import copytree
     help="The output directory to write to.",
 )
 def download_embeddings(dataset, embedding, out):
+    from tira.rest_api_client import Client
+
+    from lsr_benchmark.artifacts import fetch_artifact, refreshable
+
     tira = Client()
-    ret = tira.get_run_output(f'lsr-benchmark/lightning-ir/{embedding}', IR_DATASET_TO_TIRA_DATASET[dataset])
-    if out is not None:
-        copytree(ret, out)
-        ret = out
+    dataset_id = IR_DATASET_TO_TIRA_DATASET[dataset]
+    # TIRA caches the run in <run_id>/output and checks whether <run_id> exists
+    download = refreshable(lambda: tira.get_run_output(f'lsr-benchmark/lightning-ir/{embedding}', dataset_id), lambda path: path.parent)
+    # the output directory links to the files in the artifact store instead of copying them
+    ret = fetch_artifact(f"embeddings/{embedding}/{dataset_id}", download, out)
     print(ret)
 
 
@@ -56,9 +59,14 @@ def download_embeddings(dataset, embedding, out):
     help="The output directory to write to.",
 )
 def download_run(dataset, embedding, retrieval, out):
+    from tira.rest_api_client import Client
+
+    from lsr_benchmark.artifacts import fetch_artifact, refreshable
+
     tira = Client()
-    ret = tira.get_run_output(f'lsr-benchmark/lightning-ir/{embedding}', IR_DATASET_TO_TIRA_DATASET[dataset])
-    if out is not None:
-        copytree(ret, out)
-        ret = out
+    dataset_id = IR_DATASET_TO_TIRA_DATASET[dataset]
+    # TIRA caches the run in <run_id>/output and checks whether <run_id> exists
+    download = refreshable(lambda: tira.get_run_output(f'lsr-benchmark/lightning-ir/{embedding}', dataset_id), lambda path: path.parent)
+    # the output directory links to the files in the artifact store instead of copying them
+    ret = fetch_artifact(f"embeddings/{embedding}/{dataset_id}", download, out)
     print(ret)
\ No newline at end of file
@@ -1,20 +1,18 @@
+import hashlib
+import json
 import logging
+import os
 import re
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from glob import glob
 from gzip import GzipFile
-from io import TextIOWrapper
 from pathlib import Path
-from typing import TYPE_CHECKING, Mapping, Dict, Any
+from typing import TYPE_CHECKING, Mapping, Dict, Any, Iterable
 from zipfile import ZipFile
-import gzip
 
 import click
-import ir_measures
-import pandas as pd
-import yaml
-from tira.check_format import lines_if_valid
-from ir_measures import parse_trec_measure
 
 import lsr_benchmark
 from lsr_benchmark.datasets import TIRA_DATASET_ID_TO_IR_DATASET_ID, all_embeddings
@@ -22,10 +20,17 @@ from lsr_benchmark.datasets import TIRA_DATASET_ID_TO_IR_DATASET_ID, all_embeddi
 if TYPE_CHECKING:
     from typing import _KT, _T, _VT, Any, Callable, Literal, Optional, Union
 
-    from ir_measures import Measure, ScoredDoc
+    import pandas as pd
+    from ir_measures import Measure
+
+    from lsr_benchmark.effectiveness import QrelsIndex
+    from lsr_benchmark.runs import ColumnarRun
 
     Metadata = dict[str, Any]
 
+# increase to invalidate the cached scores of all runs (e.g., after a change of how a measure is computed)
+EVALUATION_CACHE_VERSION = 1
+
 
 def __get_nested(
     d: "Mapping[_KT, Union[dict, _VT]]", keys: "list[_KT]"
@@ -61,7 +66,10 @@ def __get_nested_or_default(d: "Mapping[_KT, Union[dict, _VT]]", keys: "list[_KT
 
 
 
-def __read_metrics(name: str) -> "tuple[dict[str, Metadata], list[ScoredDoc]]":
+def __read_metadata(name: str) -> "dict[str, Metadata]":
+    import yaml
+    from tira.check_format import lines_if_valid
+
     metadata: "dict[str, Metadata]" = {}
 
     if name.endswith('/run.txt.gz'):
@@ -70,26 +78,51 @@ def __read_metrics(name: str) -> "tuple[dict[str, Metadata], list[ScoredDoc]]":
     if Path(name).is_dir():
         for l in lines_if_valid(Path(name), "ir_metadata"):
             metadata[l['name'].replace('.', '').split("-")[0]] = l['content']
-        if (Path(name) / "run.txt").is_file():
-            run = list(ir_measures.read_trec_run((Path(name) / "run.txt").read_text()))
-        else:
-            run = list(ir_measures.read_trec_run(gzip.open(Path(name) / "run.txt.gz", "rt")))
     else:
         with ZipFile(name) as archive:
             for entry in archive.filelist:
                 if (m := re.match(r"(\w+)-metadata.ya?ml", entry.filename)) is not None:
                     with archive.open(entry) as file:
                         metadata[m.group(1)] = yaml.safe_load(file)
-            with archive.open("run.txt.gz", mode="r") as compressed:
-                with GzipFile(fileobj=compressed, mode="r") as binary:
-                    with TextIOWrapper(binary, encoding="utf-8") as file:
-                        run = list(ir_measures.read_trec_run(file))
-    
+
     if len(metadata) == 0:
         raise ValueError("I could not read any metadata")
+    return metadata
+
+
+def __read_run(name: str) -> "ColumnarRun":
+    from lsr_benchmark.runs import read_run
+
+    if name.endswith('/run.txt.gz'):
+        name = name.replace('/run.txt.gz', '/')
+
+    if Path(name).is_dir():
+        if (Path(name) / "run.txt").is_file():
+            run = read_run(Path(name) / "run.txt")
+        else:
+            run = read_run(Path(name) / "run.txt.gz")
+    else:
+        with ZipFile(name) as archive:
+            with archive.open("run.txt.gz", mode="r") as compressed:
+                with GzipFile(fileobj=compressed, mode="r") as binary:
+                    run = read_run(binary)
+
     if len(run) == 0:
         raise ValueError("I could not load a run")
-    return metadata, run
+    return run
+
+
+def __read_metrics(name: str) -> "tuple[dict[str, Metadata], ColumnarRun]":
+    return __read_metadata(name), __read_run(name)
+
+
+def __approach_files(name: str) -> "list[Path]":
+    """The files that determine the scores of the approach: its run and metadata (or the zip archive)."""
+    if name.endswith('/run.txt.gz'):
+        name = name.replace('/run.txt.gz', '/')
+    if not Path(name).is_dir():
+        return [Path(name)]
+    return sorted(i for i in Path(name).iterdir() if i.is_file() and (i.name.startswith("run.txt") or re.fullmatch(r"\w+-metadata.ya?ml", i.name)))
 
 
 def __get_runtime(metadata: "Metadata", param: "Literal['system', 'user', 'wallclock']" = "wallclock") -> "Optional[str]":
@@ -131,9 +164,13 @@ def __get_avg_gpu_usage(metadata: "Metadata") -> "Optional[int]":
     return __get_nested_or_default(metadata, ("resources", "gpu", "used process", "avg"))
 
 
+def __get_latency(metadata: "Metadata", param: "Literal['p50', 'p90', 'p99', 'max', 'qps']" = "p50") -> "Optional[str]":
+    return __get_nested_or_default(metadata, ("resources", "latency", param))
+
+
 __efficiency_measures: "dict[str, Callable]" = {
     "runtime": __get_runtime, "energy": __get_energy_usage, "cpu": __get_avg_cpu_usage, "ram": __get_max_ram_usage,
-    "gpu": __get_avg_gpu_usage, "vram": __get_max_vram_usage
+    "gpu": __get_avg_gpu_usage, "vram": __get_max_vram_usage, "latency": __get_latency
 }
 
 
@@ -143,7 +180,13 @@ def __parse_tirex_measure(measure: "str") -> "Callable":
     return lambda x: func(x, *arg)
 
 
-def __parse_measure(measure: "str") -> "tuple[str, Literal['ir_measure', 'tirex'], Measure | Callable]":
+def __parse_measure(measure: "str") -> "tuple[str, Literal['ir_measure', 'tirex', 'oracle'], Measure | Callable | int]":
+    import ir_measures
+    from ir_measures import parse_trec_measure
+
+    if (m := re.fullmatch(r"ann_recall@(\d+)", measure)) is not None:
+        return (measure, 'oracle', int(m.group(1)))
+
     try:
         return (measure, 'ir_measure', parse_trec_measure(measure)[0])
     except ValueError:
@@ -183,6 +226,8 @@ def __get_embedding_name(p: Path):
     return ret[0]
 
 def __get_output_routine(specifier: str) -> "Callable[[pd.DataFrame], None]":
+    import pandas as pd
+
     suffix_to_routine: dict[str, Callable[[pd.DataFrame], None]] = {
         ".csv": lambda df: df.to_csv(specifier),
         ".xlsx": lambda df: df.to_excel(specifier),
@@ -203,9 +248,80 @@ def __get_output_routine(specifier: str) -> "Callable[[pd.DataFrame], None]":
         raise ValueError(f"The suffix of {specifier} is not known.")
 
 
-def evaluate_approach(approach: str, measure: list[str]):
+def __get_ann_recall(dataset, embedding: "Optional[str]", run: "ColumnarRun", k: int) -> "Optional[float]":
+    """The recall of the exact top-k documents of the embedding (see lsr_benchmark.oracle) in the top-k of the run."""
+    from lsr_benchmark.oracle import ann_recall, exact_run
+
+    if embedding is None:
+        return None
+    return ann_recall(run.scored_docs(), exact_run(dataset, f"lightning-ir/{embedding}", k), k)
+
+
+def __load_qrels(dataset: str) -> "QrelsIndex":
+    from lsr_benchmark.effectiveness import QrelsIndex
+
+    lsr_benchmark.register_to_ir_datasets(dataset)
+    dset = lsr_benchmark.load(dataset)
+    assert dset.has_qrels()
+    ret: "dict[str, dict[str, int]]" = defaultdict(dict)
+    for qrel in dset.qrels_iter():
+        ret[qrel.query_id][qrel.doc_id] = qrel.relevance
+    return QrelsIndex.from_dict(ret)
+
+
+@lru_cache(maxsize=None)
+def __load_dataset(dataset: str):
+    lsr_benchmark.register_to_ir_datasets(dataset)
+    return lsr_benchmark.load(dataset)
+
+
+def evaluate_approach(approach: str, measure: list[str], qrels: "Optional[QrelsIndex]" = None, metadata: "Optional[dict[str, Metadata]]" = None):
+    """Evaluate the run and metadata of the approach (pass the qrels of its dataset to not load them again)."""
+    return evaluate_approaches_of_dataset([approach], measure, qrels, None if metadata is None else [metadata])[0]
+
+
+def evaluate_approaches_of_dataset(
+    approaches: "list[str]",
+    measure: list[str],
+    qrels: "Optional[QrelsIndex]" = None,
+    metadata: "Optional[list[dict[str, Metadata]]]" = None,
+) -> "list[dict[str, Any]]":
+    """Evaluate the runs and metadata of approaches on the same dataset (the measures that lsr_benchmark.effectiveness
+    supports are computed for all runs in one call)."""
+    from lsr_benchmark.effectiveness import evaluate_runs, supports
+
+    metadata = [__read_metadata(i) for i in approaches] if metadata is None else metadata
+    datasets = sorted(set(__get_dataset_name(i) for i in metadata))
+    if len(datasets) > 1:
+        raise ValueError(f"The approaches must be evaluated on the same dataset. I found: {datasets}")
+    if not datasets:
+        return []
+
+    qrels = __load_qrels(datasets[0]) if qrels is None else qrels
+    runs = [__read_run(i) for i in approaches]
+    irmeasures = set(m for _, t, m in measure if t == 'ir_measure')
+    effectiveness = evaluate_runs(qrels, runs, [m for m in irmeasures if supports(m)])
+
+    return [
+        __evaluate(approach, measure, qrels, meta, run, scores)
+        for approach, meta, run, scores in zip(approaches, metadata, runs, effectiveness)
+    ]
+
+
+def __evaluate(
+    approach: str,
+    measure: list[str],
+    qrels: "QrelsIndex",
+    metadata: "dict[str, Metadata]",
+    run: "ColumnarRun",
+    effectiveness: "dict[str, float]",
+) -> "dict[str, Any]":
+    """The scores of the approach, given the measures that lsr_benchmark.effectiveness computed for its run."""
+    import ir_measures
+
+    from lsr_benchmark.effectiveness import supports
+
     ret = {}
-    metadata, run = __read_metrics(approach)
     for group, meta in metadata.items():
         for name, typ, func in measure:
             if typ == 'tirex':
@@ -219,18 +335,149 @@ def evaluate_approach(approach: str, measure: list[str]):
     irmeasures = set(m for _, t, m in measure if t == 'ir_measure')
 
     dataset = __get_dataset_name(metadata)
-    lsr_benchmark.register_to_ir_datasets(dataset)
-    dset = lsr_benchmark.load(dataset)
-    assert dset.has_qrels()
 
-    ret.update({str(k): v for k, v in ir_measures.calc_aggregate(irmeasures, dset.qrels, run).items()})
+    # the measures that lsr_benchmark.effectiveness supports are computed vectorised, the others via ir_measures
+    ret.update(effectiveness)
+    if irmeasures := [m for m in irmeasures if not supports(m)]:
+        ret.update({str(k): v for k, v in ir_measures.calc_aggregate(irmeasures, qrels.to_dict(), run.to_dict()).items()})
+    embedding = __get_embedding_name(approach)
+    for name, typ, k in measure:
+        if typ == 'oracle':
+            ret[name] = __get_ann_recall(__load_dataset(dataset), embedding, run, k)
+            if ret[name] is None:
+                logging.warning(f"Measure {name} could not be reported for {approach} as its embedding is not known")
     ret["tira-dataset-id"] = dataset
     ret["ir-dataset-id"] = TIRA_DATASET_ID_TO_IR_DATASET_ID[dataset]
     ret["approach"] = approach
-    ret["embedding/model"] = __get_embedding_name(approach)
+    ret["embedding/model"] = embedding
     return ret
 
 
+# the qrels of the dataset that the worker processes evaluate, set once per worker by the initializer of the pool
+__worker_qrels: "Optional[QrelsIndex]" = None
+
+
+def __init_worker(qrels: "QrelsIndex"):
+    global __worker_qrels
+    __worker_qrels = qrels
+
+
+def __evaluate_in_worker(
+    approaches: "list[str]", measure_names: "list[str]", metadata: "list[dict[str, Metadata]]"
+) -> "list[dict[str, Any]]":
+    # the parsed tirex measures are lambdas that can not be pickled, so the workers parse the measures again
+    measure = [__parse_measure(i) for i in measure_names]
+    return evaluate_approaches_of_dataset(approaches, measure, __worker_qrels, metadata)
+
+
+@lru_cache(maxsize=None)
+def __qrels_checksum(dataset: str) -> str:
+    from lsr_benchmark.cache import file_checksum
+    from lsr_benchmark.irds import _dowload_from_tira
+
+    return file_checksum(_dowload_from_tira(dataset, True) / "qrels.txt")
+
+
+def __score_key(approach: str, measure_names: "list[str]", qrels_checksum: str) -> str:
+    """The key of the cached scores: a content hash of the run and metadata, the measures, the embedding, and the qrels
+    of the dataset (so that the scores are evaluated again when the qrels of a dataset are updated)."""
+    from lsr_benchmark.cache import file_checksum
+
+    key = {
+        "version": EVALUATION_CACHE_VERSION,
+        "files": [(i.name, file_checksum(i)) for i in __approach_files(approach)],
+        "measures": sorted(set(measure_names)),
+        "embedding": __get_embedding_name(approach),
+        "qrels": qrels_checksum,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def __score_cache_file(key: str) -> "Optional[Path]":
+    from lsr_benchmark.cache import cache_home
+
+    try:
+        return cache_home() / "evaluation" / key[:2] / f"{key}.json"
+    except OSError:
+        # e.g., no writable cache directory in the sandbox
+        return None
+
+
+def __read_cached_scores(key: str) -> "Optional[dict[str, Any]]":
+    if (cache_file := __score_cache_file(key)) is None or not cache_file.is_file():
+        return None
+    try:
+        return json.loads(cache_file.read_text())
+    except ValueError:
+        return None
+
+
+def __write_cached_scores(key: str, scores: "dict[str, Any]"):
+    if (cache_file := __score_cache_file(key)) is None:
+        return
+    tmp_file = cache_file.with_name(f".tmp-{os.getpid()}-{cache_file.name}")
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file.write_text(json.dumps(scores))
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        tmp_file.unlink(missing_ok=True)
+
+
+def __map(func: "Callable", args: "list[tuple]", workers: int, initializer: "Optional[Callable]" = None, initargs: tuple = ()) -> "Iterable":
+    """Apply func to the args in a process pool (or in this process for a single worker or task), in order."""
+    if workers <= 1 or len(args) <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return (func(*i) for i in args)
+
+    def results():
+        with ProcessPoolExecutor(min(workers, len(args)), initializer=initializer, initargs=initargs) as pool:
+            yield from pool.map(func, *zip(*args), chunksize=max(1, len(args) // (4 * workers)))
+    return results()
+
+
+def evaluate_approaches(approaches: "list[str]", measure: "list[tuple]", workers: "Optional[int]" = None, cache: bool = True) -> "list[dict[str, Any]]":
+    """Evaluate all approaches: runs are grouped by dataset (so that the qrels are loaded once per dataset) and
+    evaluated in a process pool, the scores of each run are cached by the hash of its files and the measures."""
+    from tqdm import tqdm
+
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    measure_names = [name for name, _, _ in measure]
+    scores: "dict[str, dict[str, Any]]" = {}
+
+    metadata = {i: __read_metadata(i) for i in approaches}
+    datasets = {i: __get_dataset_name(metadata[i]) for i in approaches}
+    # the qrels are checksummed once per dataset in this process, the workers only hash the files of the approaches
+    qrels_checksums = {i: __qrels_checksum(i) for i in set(datasets.values())}
+    keys = list(__map(__score_key, [(i, measure_names, qrels_checksums[datasets[i]]) for i in approaches], workers))
+    if cache:
+        for approach, key in zip(approaches, keys):
+            if (cached := __read_cached_scores(key)) is not None:
+                scores[approach] = {**cached, "approach": approach}
+
+    by_dataset: "dict[str, list[tuple[str, str, dict[str, Metadata]]]]" = defaultdict(list)
+    for approach, key in zip(approaches, keys):
+        if approach not in scores:
+            by_dataset[datasets[approach]].append((approach, key, metadata[approach]))
+
+    with tqdm(total=len(approaches), initial=len(scores)) as progress:
+        for dataset, group in by_dataset.items():
+            # all runs of the dataset are evaluated in one call per worker
+            n = max(1, min(workers, len(group)))
+            chunks = [group[i * len(group) // n:(i + 1) * len(group) // n] for i in range(n)]
+            tasks = [([i[0] for i in chunk], measure_names, [i[2] for i in chunk]) for chunk in chunks]
+            results = __map(__evaluate_in_worker, tasks, workers, __init_worker, (__load_qrels(dataset),))
+            for chunk, chunk_results in zip(chunks, results):
+                for (approach, key, _), result in zip(chunk, chunk_results):
+                    scores[approach] = result
+                    if cache:
+                        __write_cached_scores(key, result)
+                progress.update(len(chunk))
+
+    return [scores[i] for i in approaches]
+
+
 @click.argument(
     "approaches",
     type=str,
@@ -260,19 +507,31 @@ def evaluate_approach(approach: str, measure: list[str]):
     default="-",
     help="The output file to write to. Use - to print the results to stdout. Default: -",
 )
-def evaluate(approaches: list[str], measure: list[str], out: str, upload: bool) -> int:
+@click.option(
+    "--workers",
+    type=int,
+    required=False,
+    default=None,
+    help="The number of processes that evaluate the runs. Default: the number of CPUs.",
+)
+@click.option(
+    "--cache/--no-cache",
+    default=True,
+    help="Whether to reuse the scores of runs that were already evaluated with the same measures. Default: --cache",
+)
+def evaluate(approaches: list[str], measure: list[str], out: str, upload: bool, workers: "Optional[int]", cache: bool) -> int:
+    import pandas as pd
+
     approaches = [x for xs in map(glob, approaches) for x in xs]
     output_routine = __get_output_routine(out)
 
-    scores: list = []
-    from tqdm import tqdm
-    for approach in tqdm(approaches):
-        scores += [evaluate_approach(approach, measure)]
+    scores = evaluate_approaches(approaches, measure, workers, cache)
 
-        if upload:
-            from tira.tira_cli import upload_command
-            from lsr_benchmark.irds import TIRA_LSR_TASK_ID
-            upload_command(dataset=dataset, directory=approach, dry_run=False, system=approach, default_task=TIRA_LSR_TASK_ID)
+    if upload:
+        from tira.tira_cli import upload_command
+        from lsr_benchmark.irds import TIRA_LSR_TASK_ID
+        for approach, score in zip(approaches, scores):
+            upload_command(dataset=score["tira-dataset-id"], directory=approach, dry_run=False, system=approach, default_task=TIRA_LSR_TASK_ID)
 
     output_routine(pd.DataFrame(scores))
     return 0
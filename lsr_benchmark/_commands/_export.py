@@ -0,0 +1,41 @@
+import click
+from pathlib import Path
+from lsr_benchmark.datasets import IR_DATASET_TO_TIRA_DATASET
+
+
+@click.option(
+    "--dataset",
+    type=str,
+    required=True,
+    help="The dataset to export, either an ir_datasets id or a local directory.",
+)
+@click.option(
+    "--embedding",
+    type=str,
+    required=False,
+    multiple=True,
+    default=[],
+    help="The embeddings to export alongside the text (can be passed multiple times).",
+)
+@click.option(
+    "--format",
+    "file_format",
+    type=click.Choice(["arrow", "parquet"]),
+    required=False,
+    default="arrow",
+    help="Arrow IPC files can be memory mapped, parquet files are smaller.",
+)
+@click.option(
+    "-o", "--out",
+    type=Path,
+    required=True,
+    help="The output directory to write to.",
+)
+def export_arrow(dataset, embedding, file_format, out):
+    """Export the corpus, queries, and embeddings of a dataset to columnar Arrow/Parquet files."""
+    from lsr_benchmark.arrow import export_dataset
+    from lsr_benchmark.irds import build_dataset
+
+    ds = build_dataset(IR_DATASET_TO_TIRA_DATASET.get(dataset, dataset), False)
+    export_dataset(ds, out, embedding, file_format)
+    print(out)
@@ -1,49 +1,102 @@
 import click
 import os
 import sys
-from tira.io_utils import _fmt, log_message, verify_tira_installation
-from tira.third_party_integrations import temporary_directory
-from tira.check_format import _fmt, check_format
-from tira.rest_api_client import Client
+import threading
+from functools import lru_cache
 from pathlib import Path
 from lsr_benchmark.datasets import all_embeddings, all_datasets
 import shutil
-import yaml
 import json
 
+__locks: "dict[tuple, threading.Lock]" = {}
+__locks_lock = threading.Lock()
 
-def run_foo(docker_image, command, dataset_id, embedding, output_dir=None):
+
+def __once(function, *args):
+    """Call the cached function, blocking concurrent calls with the same arguments until the first one finished."""
+    with __locks_lock:
+        lock = __locks.setdefault((function, args), threading.Lock())
+    with lock:
+        return function(*args)
+
+
+@lru_cache(maxsize=None)
+def __download_dataset(dataset_id):
+    from tira.rest_api_client import Client
+    from lsr_benchmark.artifacts import fetch_artifact, refreshable
+
+    return fetch_artifact(f"datasets/{dataset_id}", refreshable(lambda: Client().download_dataset("lsr-benchmark", dataset_id)))
+
+
+@lru_cache(maxsize=None)
+def __download_embeddings(dataset_id, embedding):
+    from tira.rest_api_client import Client
+    from lsr_benchmark.artifacts import fetch_artifact, refreshable
+
+    # TIRA caches the run in <run_id>/output and checks whether <run_id> exists
+    download = refreshable(lambda: Client().get_run_output(f'lsr-benchmark/lightning-ir/{embedding}', dataset_id), lambda path: path.parent)
+    return fetch_artifact(f"embeddings/{embedding}/{dataset_id}", download)
+
+
+def __tira_inputs(dataset_id, embedding):
+    # the inputs are downloaded once per dataset/embedding into the artifact store and not once per approach
+    dataset_path = __once(__download_dataset, dataset_id)
+    if embedding.lower() != "none":
+        return dataset_path, __once(__download_embeddings, dataset_id, embedding)
+    return dataset_path, None
+
+
+def __local_inputs(datasets_dir, embeddings_dir):
+    """The inputs from local directories: <datasets_dir>/<dataset> and <embeddings_dir>/<embedding>/<dataset>."""
+    def inputs(dataset_id, embedding):
+        dataset_path = Path(datasets_dir).absolute() / dataset_id
+        if not dataset_path.is_dir():
+            raise FileNotFoundError(f"The dataset {dataset_id} does not exist in {datasets_dir}.")
+        if embedding.lower() == "none":
+            return dataset_path, None
+        if embeddings_dir is None:
+            raise ValueError(f"Please pass --embeddings-dir to run on the embedding {embedding}.")
+        embeddings_path = Path(embeddings_dir).absolute() / embedding / dataset_id
+        if not embeddings_path.is_dir():
+            raise FileNotFoundError(f"The embedding {embedding} of {dataset_id} does not exist in {embeddings_dir}.")
+        return dataset_path, embeddings_path
+    return inputs
+
+
+def run_foo(backend, approach, dataset_id, embedding, output_dir=None, cpu_count=None, mem_limit=None, inputs=None):
     if output_dir is not None and Path(output_dir).exists():
         return
-    tira = Client()
-    dataset_path = tira.download_dataset("lsr-benchmark", dataset_id)
-    if embedding.lower() != "none":
-        embeddings_dir = tira.get_run_output(f'lsr-benchmark/lightning-ir/{embedding}', dataset_id)
-    else:
-        embeddings_dir = None
+    import yaml
+    from tira.check_format import _fmt, check_format
+    from tira.third_party_integrations import temporary_directory
+
+    dataset_path, embeddings_dir = (inputs or __tira_inputs)(dataset_id, embedding)
     tmp_dir = temporary_directory()
-    tira.local_execution.run(
-        image=docker_image,
-        command=command,
-        input_dir=dataset_path,
-        output_dir=tmp_dir,
-        allow_network=False,
-        input_run=embeddings_dir
-    )
-
-    result, msg = check_format(Path(tmp_dir), ["run.txt"], {})
-    if result != _fmt.OK:
-        print(msg)
-        raise ValueError(msg)
-
-    tag = yaml.safe_load((Path(tmp_dir) / "retrieval-metadata.yml").read_text())["tag"]
-    
-    if output_dir is not None:
-        from tira.io_utils import patch_ir_metadata
-        output_dir.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copytree(tmp_dir, output_dir)
-        patch_ir_metadata(output_dir, {"data": {"test collection": {"name": "/tira-data/input"}}}, {"data": {"test collection": {"name": dataset_id}}})
-    
+    try:
+        backend.run(approach, dataset_path, embeddings_dir, tmp_dir, cpu_count, mem_limit)
+
+        result, msg = check_format(Path(tmp_dir), ["run.txt"], {})
+        if result != _fmt.OK:
+            print(msg)
+            raise ValueError(msg)
+
+        tag = yaml.safe_load((Path(tmp_dir) / "retrieval-metadata.yml").read_text())["tag"]
+
+        if output_dir is not None:
+            from tira.io_utils import patch_ir_metadata
+            output_dir.parent.mkdir(parents=True, exist_ok=True)
+            # the output directory appears atomically, so that an interrupted copy is not mistaken for a finished run
+            partial_dir = output_dir.with_name(f"{output_dir.name}.partial")
+            shutil.rmtree(partial_dir, ignore_errors=True)
+            shutil.move(tmp_dir, partial_dir)
+            # the dataset is /tira-data/input in containers and the dataset directory for the local backend
+            for name in ("/tira-data/input", os.path.abspath(dataset_path)):
+                patch_ir_metadata(partial_dir, {"data": {"test collection": {"name": name}}}, {"data": {"test collection": {"name": dataset_id}}})
+            os.replace(partial_dir, output_dir)
+    finally:
+        # the outputs of failed runs (and of the validation on the example dataset) are not kept
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
     return tag
 
 
@@ -71,7 +124,59 @@ def run_foo(docker_image, command, dataset_id, embedding, output_dir=None):
     multiple=True,
     help="The datasets to run on.",
 )
-def retrieval(approaches: list[str], dataset: list[str], embedding: list[str], out: str) -> int:
+@click.option(
+    "--workers",
+    type=int,
+    default=1,
+    help="The number of approaches that run concurrently. Default: 1",
+)
+@click.option(
+    "--cpus",
+    type=int,
+    default=None,
+    help="The number of CPUs available to each approach. Default: no limit",
+)
+@click.option(
+    "--memory",
+    type=str,
+    default=None,
+    help="The memory available to each approach in the format of docker, e.g., 16g. Default: no limit",
+)
+@click.option(
+    "--retries",
+    type=int,
+    default=2,
+    help="How often a failed approach is executed again on a dataset/embedding. Default: 2",
+)
+@click.option(
+    "--backoff",
+    type=float,
+    default=30.0,
+    help="The seconds to wait before the first retry, doubled for each further retry. Default: 30",
+)
+@click.option(
+    "--backend",
+    type=click.Choice(["tira", "local", "docker", "podman"]),
+    default="tira",
+    help="How the approaches are executed: in their docker image via TIRA (tira) or a local container runtime (docker, podman), or as local process without container (local). Default: tira",
+)
+@click.option(
+    "--datasets-dir",
+    type=click.Path(exists=True, file_okay=False),
+    default=None,
+    help="Run on the datasets in <datasets-dir>/<dataset> instead of downloading them from TIRA.",
+)
+@click.option(
+    "--embeddings-dir",
+    type=click.Path(exists=True, file_okay=False),
+    default=None,
+    help="Run on the embeddings in <embeddings-dir>/<embedding>/<dataset> instead of downloading them from TIRA.",
+)
+def retrieval(approaches: list[str], dataset: list[str], embedding: list[str], out: str, workers: int, cpus: "int | None", memory: "str | None", retries: int, backoff: float, backend: str, datasets_dir: "str | None", embeddings_dir: "str | None") -> int:
+    from tira.io_utils import _fmt, log_message, verify_tira_installation
+    from lsr_benchmark.execution import ApproachManifest, execution_backend
+    from lsr_benchmark.scheduler import DONE, Job, JobLedger, JobResult, run_jobs
+
     all_messages = []
 
     def print_message(message, level):
@@ -81,51 +186,68 @@ def retrieval(approaches: list[str], dataset: list[str], embedding: list[str], o
         for m, l in all_messages:
             log_message(m, l)
 
+    # with local directories, all means all datasets/embeddings in the directories
     if dataset is None or not dataset or "all" in dataset:
-        dataset = all_datasets()
+        dataset = sorted(i.name for i in Path(datasets_dir).iterdir() if i.is_dir()) if datasets_dir else all_datasets()
 
     if embedding is None or not embedding or "all" in embedding:
-        embedding = all_embeddings()
+        embedding = sorted(i.name for i in Path(embeddings_dir).iterdir() if i.is_dir()) if embeddings_dir else all_embeddings()
     if embedding and "none" in embedding:
         embedding = ["none"]
 
-    status = verify_tira_installation()
+    if backend == "tira":
+        status = verify_tira_installation()
 
-    if status != _fmt.OK:
-        print_message("Your TIRA installation is not valid. Please run 'tira-cli verify-installation' to resolve the problem", status)
-        return 1
+        if status != _fmt.OK:
+            print_message("Your TIRA installation is not valid. Please run 'tira-cli verify-installation' to resolve the problem", status)
+            return 1
 
-    print_message("Your TIRA installation is valid.", _fmt.OK)
-    
-    tira = Client()
-    approach_to_execution = {}
+        print_message("Your TIRA installation is valid.", _fmt.OK)
+
+    executor = execution_backend(backend)
+    inputs = __local_inputs(datasets_dir, embeddings_dir) if datasets_dir else None
+    approach_to_manifest = {}
     for approach in approaches:
-        docker_tag, zipped_code, remotes, commit, active_branch = tira.build_docker_image_from_code(
-            Path(approach), log_message, False
-        )
-        assert docker_tag not in approach_to_execution.values()
-        cmd = (Path(approach) / "README.md").read_text().split("tira-cli code-submission")[1].split('--command')[1].split("'")[1]
+        manifest = ApproachManifest.load(Path(approach))
+        executor.prepare(manifest)
+        approach_to_manifest[approach] = manifest
+
+        if inputs is None:
+            log_message(f"Approach {approach} is compiled.", _fmt.OK)
+            system_tag = run_foo(executor, manifest, 'tiny-example-20251002_0-training', embedding[0], cpu_count=cpus, mem_limit=memory)
+            print_message(f"Approach {approach} compiled and produced valid outputs on example dataset (tag={system_tag}).", _fmt.OK)
+        else:
+            # the outputs are validated on the first job, as the example dataset might not be available offline
+            print_message(f"Approach {approach} is prepared for the {backend} backend.", _fmt.OK)
+
+    def execute(job: Job):
+        # approaches outside of the working directory (e.g., absolute paths) are stored under the name of their manifest
+        name = job.approach if not Path(job.approach).is_absolute() and ".." not in Path(job.approach).parts else approach_to_manifest[job.approach].name
+        out_dir = Path(out) / job.dataset / job.embedding / name
+        run_foo(executor, approach_to_manifest[job.approach], job.dataset, job.embedding, out_dir, cpus, memory, inputs)
 
-        log_message(f"Approach {approach} is compiled.", _fmt.OK)
-        system_tag = run_foo(docker_tag, cmd, 'tiny-example-20251002_0-training', embedding[0])
-        print_message(f"Approach {approach} compiled and produced valid outputs on example dataset (tag={system_tag}).", _fmt.OK)
-        approach_to_execution[approach] = {"tag": docker_tag, "command": cmd}
+    def report(result: JobResult):
+        job = result.job
+        if result.state == DONE:
+            log_message(f"Approach {job.approach} finished on {job.dataset} for embedding {job.embedding}", _fmt.OK)
+        else:
+            log_message(f"Approach {job.approach} failed on {job.dataset} for embedding {job.embedding}: {result.error}", _fmt.ERROR)
+
+    # the ledger records the state of all jobs, so that an interrupted retrieval continues with the unfinished jobs
+    jobs = [Job(d, e, approach) for d in dataset for e in embedding for approach in approaches]
+    ledger = JobLedger(Path(out) / ".jobs" / "ledger.jsonl")
+    results = run_jobs(jobs, execute, ledger, Path(out) / ".jobs" / "logs", workers, retries, backoff, report)
 
     stats = {}
-    for d in dataset:
-        for e in embedding:
-            for approach in approaches:
-                out_dir = Path(out) / d / e / approach
-                try:
-                    run_foo(approach_to_execution[approach]["tag"], approach_to_execution[approach]["command"], d, e, out_dir)
-                except:
-                    continue
-                    log_message(f"Approach {approach} finished on {d} for embedding {e}", _fmt.OK)
-                    if approach not in stats:
-                        stats[approach] = {"datasets": set(), "embeddings": set()}
-                    stats[approach]["datasets"].add(d)
-                    stats[approach]["embeddings"].add(e)
+    for result in results:
+        if result.state != DONE:
+            print_message(f"Approach {result.job.approach} failed on {result.job.dataset} for embedding {result.job.embedding} after {result.attempts} attempts: {result.error}. See the logs in {result.log_file}.", _fmt.ERROR)
+            continue
+        if result.job.approach not in stats:
+            stats[result.job.approach] = {"datasets": set(), "embeddings": set()}
+        stats[result.job.approach]["datasets"].add(result.job.dataset)
+        stats[result.job.approach]["embeddings"].add(result.job.embedding)
     for approach in stats:
         print_message(f"Approach {approach} produced valid outputs on {len(stats[approach]['datasets'])} datasets for {len(stats[approach]['embeddings'])} embeddings.", _fmt.OK)
-    
-    return 0
+
+    return 0 if all(i.state == DONE for i in results) else 1
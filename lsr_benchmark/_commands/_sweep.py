@@ -0,0 +1,85 @@
+import click
+from pathlib import Path
+from lsr_benchmark.click import embedding_param_type
+from lsr_benchmark.datasets import IR_DATASET_TO_TIRA_DATASET
+
+ENGINE_NAMES = ["native-search", "seismic", "kannolo"]
+
+
+@click.option(
+    "--dataset",
+    type=str,
+    required=True,
+    help="The dataset, either an ir_datasets id or a local directory.",
+)
+@click.option(
+    "--embedding",
+    type=embedding_param_type(),
+    required=False,
+    default="naver/splade-v3",
+    help="The embedding model or a local directory.",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(ENGINE_NAMES),
+    required=False,
+    default="native-search",
+    help="The retrieval engine to sweep.",
+)
+@click.option(
+    "--index-param",
+    type=str,
+    required=False,
+    multiple=True,
+    default=[],
+    help="Values of an index parameter as name=value1,value2 (can be passed multiple times), e.g., block_size=64,128.",
+)
+@click.option(
+    "--search-param",
+    type=str,
+    required=False,
+    multiple=True,
+    default=[],
+    help="Values of a search parameter as name=value1,value2 (can be passed multiple times), e.g., query_cut=5,10,20.",
+)
+@click.option(
+    "--k",
+    type=int,
+    required=False,
+    default=10,
+    help="Number of results to return per each query.",
+)
+@click.option(
+    "--threads",
+    type=int,
+    required=False,
+    default=None,
+    help="Number of threads that search queries in parallel. Default: all cores.",
+)
+@click.option(
+    "--index-cache/--no-index-cache",
+    default=True,
+    help="Whether to reuse (and persist) the indexes across sweeps.",
+)
+@click.option(
+    "-o", "--out",
+    type=Path,
+    required=True,
+    help="The output directory, with one run directory per point of the grid and the pareto.tsv table.",
+)
+def sweep(dataset, embedding, engine, index_param, search_param, k, threads, index_cache, out):
+    """Run a grid of index and search parameters of an engine, loading the embeddings and building each index once."""
+    from lsr_benchmark.irds import build_dataset
+    from lsr_benchmark.sweep import ENGINES, PARETO_FILE, parse_grid
+    from lsr_benchmark.sweep import sweep as run_sweep
+
+    engine = ENGINES[engine]()
+    try:
+        index_grid = parse_grid(index_param, engine.index_params)
+        search_grid = parse_grid(search_param, engine.search_params)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    ds = build_dataset(IR_DATASET_TO_TIRA_DATASET.get(dataset, dataset), False)
+    rows = run_sweep(ds, embedding, engine, index_grid, search_grid, out, k, threads, index_cache)
+    print((Path(out) / PARETO_FILE).read_text() if rows else "No runs.")
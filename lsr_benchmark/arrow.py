@@ -0,0 +1,299 @@
+"""Columnar (Arrow IPC / Parquet) copies of the corpus, queries, and embeddings of an lsr-benchmark dataset.
+
+The exported directory has the following layout, where the suffix is .arrow (uncompressed Arrow IPC files that are
+memory mapped when loading) or .parquet:
+
+    docs.arrow          doc_id, text, segments (list<struct<start, end, text>>)
+    segments.arrow      doc_id ("{doc_id}___{idx}___"), parent_doc_id, idx, start, end, text
+    queries.arrow       query_id, text
+    qrels.txt           (if available)
+    embeddings/<model>/doc.arrow and query.arrow: id, tokens (list<int32>), values (list<float32>)
+"""
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator
+
+import numpy as np
+from ir_datasets.datasets.base import Dataset
+from ir_datasets.formats import BaseDocs, BaseQueries, GenericQuery, TrecQrels
+from ir_datasets.util import MetadataComponent
+
+from lsr_benchmark.irds import (
+    IdTable,
+    LsrBenchmarkDocument,
+    LsrBenchmarkSegmentedDocument,
+    Segment,
+    SparseEmbeddingMatrix,
+)
+
+if TYPE_CHECKING:
+    from typing import Optional
+
+    import pyarrow as pa
+
+FORMATS = ("arrow", "parquet")
+BATCH_SIZE = 10_000
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ValueError("The arrow format requires pyarrow. Please install it via 'pip3 install pyarrow'.")
+    return pyarrow
+
+
+def embedding_dir_name(model_name: str) -> str:
+    if Path(model_name).is_dir():
+        return Path(model_name).resolve().name
+    return model_name.replace("/", "-")
+
+
+def _find_file(directory: Path, name: str) -> Path:
+    for file_format in FORMATS:
+        if (directory / f"{name}.{file_format}").is_file():
+            return directory / f"{name}.{file_format}"
+    raise ValueError(f"I could not find {name}.arrow or {name}.parquet in {directory}.")
+
+
+def read_table(file: Path) -> "pa.Table":
+    """Read an exported table, memory mapped (zero-copy) for Arrow IPC files."""
+    pa = _pyarrow()
+    if file.suffix == ".parquet":
+        return pa.parquet.read_table(file, memory_map=True)
+    with pa.memory_map(str(file), "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+class _TableWriter:
+    def __init__(self, file: Path, schema: "pa.Schema"):
+        pa = _pyarrow()
+        if file.suffix == ".parquet":
+            self.__writer = pa.parquet.ParquetWriter(file, schema)
+        else:
+            self.__writer = pa.ipc.new_file(str(file), schema)
+        self.__schema = schema
+
+    def write(self, rows: "dict[str, list]"):
+        pa = _pyarrow()
+        self.__writer.write(pa.RecordBatch.from_pydict(rows, schema=self.__schema))
+
+    def write_table(self, table: "pa.Table"):
+        self.__writer.write_table(table)
+
+    def close(self):
+        self.__writer.close()
+
+
+def _batched(iterator: Iterator, batch_size: int) -> "Iterator[list]":
+    batch = []
+    for i in iterator:
+        batch.append(i)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def id_array(ids: IdTable) -> "pa.LargeStringArray":
+    """The ids as Arrow strings that share the utf-8 blob of the IdTable instead of creating one Python str per id."""
+    pa = _pyarrow()
+    offsets = np.asarray(ids.offsets, dtype=np.int64)
+    blob = np.ascontiguousarray(ids.blob[offsets[0] : offsets[-1]])
+    return pa.LargeStringArray.from_buffers(len(ids), pa.py_buffer(offsets - offsets[0]), pa.py_buffer(blob))
+
+
+def sparse_embedding_table(matrix: SparseEmbeddingMatrix) -> "pa.Table":
+    """Convert the CSR arrays into list<int32>/list<float32> columns without per-row copies."""
+    pa = _pyarrow()
+    indptr = np.asarray(matrix.indptr) - matrix.indptr[0]
+    list_type = pa.LargeListArray if indptr[-1] > np.iinfo(np.int32).max else pa.ListArray
+    offsets = pa.array(indptr.astype(np.int64 if list_type is pa.LargeListArray else np.int32))
+    # string and not large_string, as sparse_embedding_matrix reads the int32 offsets of the ids
+    if isinstance(matrix.ids, IdTable):
+        ids = id_array(matrix.ids).cast(pa.string())
+    else:
+        ids = pa.array(list(matrix.ids), type=pa.string())
+    return pa.table(
+        {
+            "id": ids,
+            "tokens": list_type.from_arrays(offsets, pa.array(np.asarray(matrix.indices, dtype=np.int32))),
+            "values": list_type.from_arrays(offsets, pa.array(np.asarray(matrix.data, dtype=np.float32))),
+        }
+    )
+
+
+def sparse_embedding_matrix(table: "pa.Table", token_type: str = "int") -> SparseEmbeddingMatrix:
+    """Wrap an exported embedding table as SparseEmbeddingMatrix, zero-copy if the table has a single chunk."""
+    table = table.combine_chunks()
+    ids, tokens, values = (table.column(i).chunk(0) if table.num_rows > 0 else None for i in ["id", "tokens", "values"])
+    if ids is None:
+        return SparseEmbeddingMatrix(
+            [], np.empty(0, np.float32), np.empty(0, np.int32), np.zeros(1, np.int64), token_type
+        )
+
+    id_offsets = np.frombuffer(ids.buffers()[1], dtype=np.int32)[ids.offset : ids.offset + len(ids) + 1]
+    id_blob = np.frombuffer(ids.buffers()[2], dtype=np.uint8)
+    indptr = tokens.offsets.to_numpy()
+    return SparseEmbeddingMatrix(
+        IdTable(id_blob, id_offsets),
+        values.values.to_numpy()[indptr[0] : indptr[-1]],
+        tokens.values.to_numpy()[indptr[0] : indptr[-1]],
+        indptr - indptr[0],
+        token_type,
+    )
+
+
+def export_dataset(dataset, output_dir: Path, embeddings: "list[str]" = (), file_format: str = "arrow"):
+    """Export the docs, segments, queries, and the given embeddings of an LsrBenchmarkDataset to output_dir."""
+    pa = _pyarrow()
+    if file_format not in FORMATS:
+        raise ValueError(f"The format must be one of {FORMATS}, got {file_format}.")
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    segment_type = pa.struct([("start", pa.int32()), ("end", pa.int32()), ("text", pa.string())])
+    docs_writer = _TableWriter(
+        output_dir / f"docs.{file_format}",
+        pa.schema([("doc_id", pa.string()), ("text", pa.string()), ("segments", pa.list_(segment_type))]),
+    )
+    segments_writer = _TableWriter(
+        output_dir / f"segments.{file_format}",
+        pa.schema(
+            [
+                ("doc_id", pa.string()),
+                ("parent_doc_id", pa.string()),
+                ("idx", pa.int32()),
+                ("start", pa.int32()),
+                ("end", pa.int32()),
+                ("text", pa.string()),
+            ]
+        ),
+    )
+    try:
+        for batch in _batched(dataset.docs_iter(), BATCH_SIZE):
+            docs_writer.write(
+                {
+                    "doc_id": [i.doc_id for i in batch],
+                    "text": [i.default_text() for i in batch],
+                    "segments": [
+                        [{"start": s.offset_start, "end": s.offset_end, "text": s.text} for s in i.segments]
+                        for i in batch
+                    ],
+                }
+            )
+            segments = [(doc.doc_id, idx, s) for doc in batch for idx, s in enumerate(doc.segments)]
+            segments_writer.write(
+                {
+                    "doc_id": [LsrBenchmarkSegmentedDocument.segment_id(d, idx) for d, idx, _ in segments],
+                    "parent_doc_id": [d for d, _, _ in segments],
+                    "idx": [idx for _, idx, _ in segments],
+                    "start": [s.offset_start for _, _, s in segments],
+                    "end": [s.offset_end for _, _, s in segments],
+                    "text": [s.text for _, _, s in segments],
+                }
+            )
+    finally:
+        docs_writer.close()
+        segments_writer.close()
+
+    queries = list(dataset.queries_iter())
+    queries_writer = _TableWriter(
+        output_dir / f"queries.{file_format}", pa.schema([("query_id", pa.string()), ("text", pa.string())])
+    )
+    queries_writer.write({"query_id": [i.query_id for i in queries], "text": [i.default_text() for i in queries]})
+    queries_writer.close()
+
+    if dataset.has_qrels():
+        with (output_dir / "qrels.txt").open("w") as f:
+            for qrel in dataset.qrels_iter():
+                f.write(f"{qrel.query_id} {qrel.iteration} {qrel.doc_id} {qrel.relevance}\n")
+
+    for model_name in embeddings:
+        embedding_dir = output_dir / "embeddings" / embedding_dir_name(model_name)
+        embedding_dir.mkdir(parents=True, exist_ok=True)
+        for text_type, matrix in [
+            ("doc", dataset.doc_embeddings(model_name)),
+            ("query", dataset.query_embeddings(model_name)),
+        ]:
+            table = sparse_embedding_table(matrix)
+            writer = _TableWriter(embedding_dir / f"{text_type}.{file_format}", table.schema)
+            writer.write_table(table)
+            writer.close()
+
+
+class LsrBenchmarkArrowDocuments(BaseDocs):
+    def __init__(self, directory: Path, segmented: bool):
+        self.__directory = directory
+        self.__segmented = segmented
+
+    def docs_table(self) -> "pa.Table":
+        """The (memory mapped) table of documents or segments, e.g., to query it with DuckDB or pandas."""
+        return read_table(_find_file(self.__directory, "segments" if self.__segmented else "docs"))
+
+    def docs_iter(self):
+        for batch in self.docs_table().to_batches(BATCH_SIZE):
+            for row in batch.to_pylist():
+                if self.__segmented:
+                    segment = Segment(row["start"], row["end"], row["text"])
+                    yield LsrBenchmarkSegmentedDocument(row["doc_id"], segment)
+                else:
+                    segments = [Segment(s["start"], s["end"], s["text"]) for s in row["segments"]]
+                    yield LsrBenchmarkDocument(row["doc_id"], segments, LsrBenchmarkDocument._default_text(segments))
+
+    def docs_cls(self):
+        return LsrBenchmarkSegmentedDocument if self.__segmented else LsrBenchmarkDocument
+
+    def docs_count(self):
+        return self.docs_table().num_rows
+
+
+class LsrBenchmarkArrowQueries(BaseQueries):
+    def __init__(self, directory: Path):
+        self.__directory = directory
+
+    def queries_iter(self):
+        for row in read_table(_find_file(self.__directory, "queries")).to_pylist():
+            yield GenericQuery(row["query_id"], row["text"])
+
+
+class LsrBenchmarkArrowDataset(Dataset):
+    def __init__(self, directory: str, segmented: bool = False, documentation=None):
+        self.__directory = Path(directory)
+        _pyarrow()
+
+        qrels_obj = None
+        if (self.__directory / "qrels.txt").is_file():
+            qrels_file = self.__directory / "qrels.txt"
+
+            class QrelsObj:
+                def stream(self):
+                    return qrels_file.open("rb")
+
+            qrels_obj = TrecQrels(QrelsObj(), {0: "Not Relevant", 1: "Relevant"})
+
+        docs = LsrBenchmarkArrowDocuments(self.__directory, segmented)
+        super().__init__(docs, LsrBenchmarkArrowQueries(self.__directory), qrels_obj, documentation)
+        self.metadata = MetadataComponent(str(directory), self)
+
+    def __embeddings(self, model_name, text_type, chunk_size, token_type):
+        embedding_dir = self.__directory / "embeddings" / embedding_dir_name(model_name)
+        ret = sparse_embedding_matrix(read_table(_find_file(embedding_dir, text_type)), token_type)
+        return ret if chunk_size is None else ret.chunks(chunk_size)
+
+    def query_embeddings(
+        self, model_name: str, chunk_size: "Optional[int]" = None, token_type: str = "int"
+    ) -> "SparseEmbeddingMatrix | Iterator[SparseEmbeddingMatrix]":
+        return self.__embeddings(model_name, "query", chunk_size, token_type)
+
+    def doc_embeddings(
+        self, model_name: str, chunk_size: "Optional[int]" = None, token_type: str = "int"
+    ) -> "SparseEmbeddingMatrix | Iterator[SparseEmbeddingMatrix]":
+        return self.__embeddings(model_name, "doc", chunk_size, token_type)
+
+    def doc_embedding_files(self, model_name: str) -> "list[Path]":
+        return [_find_file(self.__directory / "embeddings" / embedding_dir_name(model_name), "doc")]
+
+    def query_embedding_files(self, model_name: str) -> "list[Path]":
+        return [_find_file(self.__directory / "embeddings" / embedding_dir_name(model_name), "query")]
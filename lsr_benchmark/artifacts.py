@@ -0,0 +1,327 @@
+"""A content-addressed store of downloaded artifacts (datasets, embeddings, runs) that are linked instead of copied.
+
+Each file of an artifact is stored once under the sha256 of its content (objects/), a manifest lists the files of the
+artifact, and a ref maps the name of the artifact (e.g., "embeddings/webis-splade/<dataset>") to its manifest. A download
+is copied into the store once (the objects never share an inode with the download, e.g., the cache of TIRA), and the
+store materializes each manifest once as a tree of hardlinks to the objects, which is what get returns and what outputs
+are linked to (hardlinks, or symlinks if the output is on another file system), so that an artifact is downloaded once
+and never copied again:
+
+    store = artifact_store()
+    fetch = refreshable(lambda: tira.download_dataset("lsr-benchmark", dataset_id))
+    dataset_dir = store.get(f"datasets/{dataset_id}", fetch)
+    store.link(f"datasets/{dataset_id}", fetch, out)
+
+The objects are read-only (also via their hardlinks in outputs), the sizes of the files are verified on each access and
+their content via verify. Corrupted artifacts are fetched again with fetch(refresh=True), which bypasses the cache of the
+client. When the objects exceed the maximum size of the store (LSR_BENCHMARK_ARTIFACTS_MAX_SIZE, e.g., 100G), the least
+recently used artifacts are evicted (outputs that link to them keep their hardlinks).
+"""
+import errno
+import hashlib
+import json
+import os
+import shutil
+import stat
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    from typing import Any, Optional
+
+ARTIFACT_STORE_VERSION = 1
+# objects that are not (yet) referenced are only evicted after this many seconds, as they might be added concurrently
+EVICTION_GRACE_SECONDS = 60 * 60
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_size(size: str) -> int:
+    """The number of bytes of a size like 500M, 100G, or 1.5T (units are powers of 1024)."""
+    size = size.strip().upper().removesuffix("B")
+    unit = size[-1:] if size[-1:] in SIZE_UNITS else ""
+    return int(float(size[: len(size) - len(unit)]) * SIZE_UNITS[unit])
+
+
+def refreshable(
+    download: "Callable[[], Path]", cached: "Callable[[Path], Path]" = lambda path: path
+) -> "Callable[[bool], Path]":
+    """A fetch function for a download that its client caches (e.g., TIRA), refresh removes the cached download first.
+
+    cached maps the directory of the download to the directory that marks it as cached by the client.
+    """
+    def fetch(refresh: bool = False) -> Path:
+        ret = Path(download())
+        if refresh:
+            shutil.rmtree(cached(ret), ignore_errors=True)
+            ret = Path(download())
+        return ret
+
+    return fetch
+
+
+def _checksum(path: Path) -> str:
+    from lsr_benchmark.cache import file_checksum
+
+    return file_checksum(path)
+
+
+def _digest(name: str) -> str:
+    return hashlib.sha256(name.encode()).hexdigest()
+
+
+def _digest_of(manifest: "dict[str, Any]") -> str:
+    return _digest(json.dumps(manifest, sort_keys=True))
+
+
+def _write_json(path: Path, content: "Any"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_name(f".tmp-{os.getpid()}-{threading.get_ident()}-{path.name}")
+    tmp_file.write_text(json.dumps(content, sort_keys=True))
+    os.replace(tmp_file, path)
+
+
+def _link(source: Path, target: Path):
+    """Hardlink target to source, or symlink it if hardlinks are not possible (e.g., across file systems)."""
+    try:
+        os.link(source, target)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+        os.symlink(source.resolve(), target)
+
+
+class ArtifactStore:
+    def __init__(self, root: Path, max_bytes: "Optional[int]" = None, grace_seconds: float = EVICTION_GRACE_SECONDS):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.grace_seconds = grace_seconds
+        self.__lock = threading.Lock()
+
+    def __object(self, checksum: str) -> Path:
+        return self.root / "objects" / checksum[:2] / checksum
+
+    def __manifest(self, digest: str) -> Path:
+        return self.root / "manifests" / f"{digest}.json"
+
+    def __tree(self, digest: str) -> Path:
+        return self.root / "trees" / digest
+
+    def __ref(self, name: str) -> Path:
+        return self.root / "refs" / f"{_digest(name)}.json"
+
+    def __add_object(self, file: Path) -> "tuple[str, int]":
+        (self.root / "objects").mkdir(parents=True, exist_ok=True)
+        tmp_file = self.root / "objects" / f".tmp-{os.getpid()}-{threading.get_ident()}"
+        # the file is copied (never linked) into the store and hashed while copying, so that the object has the content
+        # of its checksum and changes of the download (e.g., a corrupted cache of the client) never reach the store
+        checksum, size = hashlib.sha256(), 0
+        try:
+            with open(file, "rb") as source, open(tmp_file, "wb") as target:
+                for block in iter(lambda: source.read(16 * 1024 * 1024), b""):
+                    checksum.update(block)
+                    target.write(block)
+                    size += len(block)
+            checksum = checksum.hexdigest()
+            target = self.__object(checksum)
+            if not target.is_file() or target.stat().st_size != size:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.chmod(tmp_file, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                os.replace(tmp_file, target)
+        finally:
+            tmp_file.unlink(missing_ok=True)
+        return checksum, size
+
+    def add(self, name: str, source: Path) -> Path:
+        """Add the files of the source directory (e.g., a download) to the store as artifact name, returns its tree."""
+        source = Path(source)
+        files, directories = {}, []
+        for path in sorted(source.rglob("*")):
+            relative = path.relative_to(source).as_posix()
+            if path.is_dir():
+                directories.append(relative)
+            elif path.is_file():
+                files[relative] = self.__add_object(path)
+
+        manifest = {"version": ARTIFACT_STORE_VERSION, "files": files, "directories": directories}
+        digest = _digest_of(manifest)
+        if not self.__manifest(digest).exists():
+            _write_json(self.__manifest(digest), manifest)
+        _write_json(self.__ref(name), {"name": name, "manifest": digest})
+        return self.__materialize(digest, manifest)
+
+    def __materialize(self, digest: str, manifest: "dict[str, Any]") -> Path:
+        from lsr_benchmark.cache import cached_directory
+
+        def build(target_dir: Path):
+            for directory in manifest["directories"]:
+                (target_dir / directory).mkdir(parents=True, exist_ok=True)
+            for relative, (checksum, _) in manifest["files"].items():
+                (target_dir / relative).parent.mkdir(parents=True, exist_ok=True)
+                _link(self.__object(checksum), target_dir / relative)
+
+        return cached_directory(self.__tree(digest), build)
+
+    def __lookup(self, name: str) -> "Optional[tuple[str, dict[str, Any]]]":
+        try:
+            digest = json.loads(self.__ref(name).read_text())["manifest"]
+            return digest, json.loads(self.__manifest(digest).read_text())
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def __intact(self, digest: str, manifest: "dict[str, Any]") -> bool:
+        tree = self.__tree(digest)
+        for relative, (_, size) in manifest["files"].items():
+            try:
+                if (tree / relative).stat().st_size != size:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def get(self, name: str, fetch: "Callable[[bool], Path]") -> Path:
+        """The tree of the artifact name, added from the directory that fetch(refresh) returns if it is not stored yet.
+
+        refresh is True if the artifact was stored but is corrupted, so that fetch bypasses the cache of its client.
+        """
+        entry, refresh = self.__lookup(name), self.__corrupted(name)
+        if entry is not None and not self.__intact(*entry):
+            # removes the corrupted objects (and all artifacts that use them)
+            self.verify(name)
+            entry, refresh = None, True
+
+        if entry is None:
+            ret = self.add(name, Path(fetch(refresh)))
+            if self.max_bytes is not None:
+                self.evict(self.max_bytes, keep=name)
+            return ret
+
+        # the modification time of the ref is the last access for the least recently used eviction
+        os.utime(self.__ref(name))
+        return self.__materialize(*entry)
+
+    def link(self, name: str, fetch: "Callable[[bool], Path]", target: Path) -> Path:
+        """Link the files of the artifact name into the (new) target directory."""
+        tree, target = self.get(name, fetch), Path(target)
+        target.mkdir(parents=True, exist_ok=False)
+        for path in sorted(tree.rglob("*")):
+            if path.is_dir():
+                (target / path.relative_to(tree)).mkdir(parents=True, exist_ok=True)
+            else:
+                _link(path, target / path.relative_to(tree))
+        return target
+
+    def verify(self, name: str) -> bool:
+        """Whether the content of all files of the artifact matches their checksum, corrupted objects are removed."""
+        entry = self.__lookup(name)
+        if entry is None:
+            return False
+        corrupted = set()
+        for checksum, _ in entry[1]["files"].values():
+            file = self.__object(checksum)
+            if not file.is_file() or _checksum(file) != checksum:
+                file.unlink(missing_ok=True)
+                corrupted.add(checksum)
+        if corrupted:
+            # the trees of all artifacts with a corrupted file link to the same (corrupted) inode
+            for _, other, manifest in self.__refs():
+                if any(checksum in corrupted for checksum, _ in manifest["files"].values()):
+                    self.remove(other, corrupted=True)
+            self.remove(name, corrupted=True)
+        return not corrupted
+
+    def __corrupted(self, name: str) -> bool:
+        try:
+            return json.loads(self.__ref(name).read_text()).get("corrupted", False)
+        except (OSError, ValueError):
+            return False
+
+    def remove(self, name: str, corrupted: bool = False):
+        """Remove the artifact name from the store (its objects are removed by evict if no other artifact uses them).
+
+        The ref of a corrupted artifact is kept as marker, so that the next get fetches it with refresh.
+        """
+        entry = self.__lookup(name)
+        if corrupted:
+            _write_json(self.__ref(name), {"name": name, "corrupted": True})
+        else:
+            self.__ref(name).unlink(missing_ok=True)
+        if entry is not None:
+            shutil.rmtree(self.__tree(entry[0]), ignore_errors=True)
+
+    def __refs(self) -> "list[tuple[float, str, dict[str, Any]]]":
+        ret = []
+        for ref in (self.root / "refs").glob("*.json"):
+            try:
+                name = json.loads(ref.read_text())["name"]
+                entry = self.__lookup(name)
+                if entry is not None:
+                    ret.append((ref.stat().st_mtime, name, entry[1]))
+            except (OSError, ValueError, KeyError):
+                continue
+        return sorted(ret, key=lambda i: i[0])
+
+    def size(self) -> int:
+        """The number of bytes of all objects in the store."""
+        return sum(i.stat().st_size for i in (self.root / "objects").glob("*/*") if not i.name.startswith(".tmp-"))
+
+    def evict(self, max_bytes: int, keep: "Optional[str]" = None) -> "list[str]":
+        """Remove the least recently used artifacts (except keep) until the objects fit into max_bytes."""
+        with self.__lock:
+            refs = self.__refs()
+            sizes: "dict[str, int]" = {}
+            for _, _, manifest in refs:
+                sizes.update({checksum: size for checksum, size in manifest["files"].values()})
+
+            evicted: "list[str]" = []
+            while refs:
+                live = {checksum for _, _, manifest in refs for checksum, _ in manifest["files"].values()}
+                if sum(sizes[i] for i in live) <= max_bytes:
+                    break
+                candidates = [i for i in refs if i[1] != keep]
+                if not candidates:
+                    break
+                refs.remove(candidates[0])
+                self.remove(candidates[0][1])
+                evicted.append(candidates[0][1])
+
+            if evicted:
+                self.__collect_garbage(refs)
+            return evicted
+
+    def __collect_garbage(self, refs: "list[tuple[float, str, dict[str, Any]]]"):
+        """Remove the objects and manifests that no ref uses."""
+        live = {checksum for _, _, manifest in refs for checksum, _ in manifest["files"].values()}
+        expired = time.time() - self.grace_seconds
+        for file in (self.root / "objects").glob("*/*"):
+            # the ctime of an object is the time it was added (via chmod)
+            if file.name not in live and not file.name.startswith(".tmp-") and file.stat().st_ctime <= expired:
+                file.unlink(missing_ok=True)
+
+        live_manifests = {f"{_digest_of(manifest)}.json" for _, _, manifest in refs}
+        for file in (self.root / "manifests").glob("*.json"):
+            if file.name not in live_manifests and file.stat().st_mtime <= expired:
+                file.unlink(missing_ok=True)
+
+
+def artifact_store() -> ArtifactStore:
+    """The artifact store in the cache_home (raises an OSError if there is no writable cache directory)."""
+    from lsr_benchmark.cache import cache_home
+
+    max_size = os.environ.get("LSR_BENCHMARK_ARTIFACTS_MAX_SIZE")
+    return ArtifactStore(cache_home() / "artifacts", parse_size(max_size) if max_size else None)
+
+
+def fetch_artifact(name: str, fetch: "Callable[[bool], Path]", target: "Optional[Path]" = None) -> Path:
+    """The directory of the artifact via the artifact store (linked into target if given), or fetch() without a store."""
+    try:
+        store = artifact_store()
+    except OSError:
+        # e.g., no writable cache directory in the sandbox
+        ret = Path(fetch(False))
+        if target is not None:
+            shutil.copytree(ret, target)
+            ret = Path(target)
+        return ret
+    return store.get(name, fetch) if target is None else store.link(name, fetch, target)
@@ -0,0 +1,82 @@
+"""Run the queries of a dataset against a retrieval engine with a pool of threads (or processes)."""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Callable, Iterable, NamedTuple, TYPE_CHECKING
+
+from lsr_benchmark.irds import SparseEmbedding
+
+if TYPE_CHECKING:
+    from typing import Optional
+
+EXECUTORS = ("thread", "process")
+# shards per worker, so that workers that got fast queries do not idle while others finish
+SHARDS_PER_WORKER = 4
+
+_ENGINE = None
+
+
+class QueryResult(NamedTuple):
+    query_id: str
+    results: Any
+    latency: float
+
+
+def _search_function(engine, k: int) -> "Callable[[SparseEmbedding], Any]":
+    if callable(engine):
+        return lambda query: engine(query, k)
+    return lambda query: engine.search(query.tokens, query.values, k)
+
+
+def _search_shard(search: "Callable[[SparseEmbedding], Any]", shard: "list[SparseEmbedding]") -> "list[QueryResult]":
+    ret = []
+    for query in shard:
+        start = time.perf_counter()
+        results = search(query)
+        ret.append(QueryResult(query.id, results, time.perf_counter() - start))
+    return ret
+
+
+def _search_shard_in_process(k: int, shard: "list[SparseEmbedding]") -> "list[QueryResult]":
+    # the engine is inherited from the parent process via fork instead of being pickled
+    return _search_shard(_search_function(_ENGINE, k), shard)
+
+
+def batch_search(
+    engine,
+    queries: "Iterable[SparseEmbedding]",
+    k: int = 10,
+    threads: "Optional[int]" = None,
+    executor: str = "thread",
+) -> "list[QueryResult]":
+    """Search all queries with the engine in parallel, returning the results and latencies in the order of the queries.
+
+    The engine is either an object with a search(tokens, values, k) method (e.g., lsr_benchmark.search.InvertedIndex)
+    or a function search(query, k) that gets the SparseEmbedding of a query, e.g., to wrap the api of seismic. Threads
+    only help engines that release the GIL (NumPy and most native engines do); otherwise, use executor="process",
+    which forks the current process so that the engine does not need to be picklable.
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f"The executor must be one of {EXECUTORS}, got {executor}.")
+    queries = [SparseEmbedding(*i) for i in queries]
+    threads = os.cpu_count() if threads is None else threads
+
+    if threads <= 1 or len(queries) <= 1:
+        return _search_shard(_search_function(engine, k), queries)
+
+    shard_size = max(1, len(queries) // (threads * SHARDS_PER_WORKER))
+    shards = [queries[i : i + shard_size] for i in range(0, len(queries), shard_size)]
+
+    if executor == "thread":
+        search = _search_function(engine, k)
+        with ThreadPoolExecutor(threads) as pool:
+            return [i for shard in pool.map(lambda s: _search_shard(search, s), shards) for i in shard]
+
+    global _ENGINE
+    _ENGINE = engine
+    try:
+        with ProcessPoolExecutor(threads, mp_context=get_context("fork")) as pool:
+            return [i for shard in pool.map(_search_shard_in_process, [k] * len(shards), shards) for i in shard]
+    finally:
+        _ENGINE = None
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+DEFAULT_TTL = 24 * 60 * 60
+
+
+def cache_home() -> Path:
+    """The directory where the lsr-benchmark caches derived resources (configurable via LSR_BENCHMARK_HOME)."""
+    ret = Path(os.environ.get("LSR_BENCHMARK_HOME", Path.home() / ".lsr-benchmark"))
+    ret.mkdir(parents=True, exist_ok=True)
+    return ret
+
+
+def file_checksum(path: Path) -> str:
+    checksum = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(16 * 1024 * 1024), b""):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+def cached_directory(cache_dir: Path, build: "Callable[[Path], None]") -> Path:
+    """Return cache_dir, populating it first via build(tmp_dir) if it does not exist.
+
+    The entry is built in a temporary directory that is renamed into place, so that concurrent processes never see
+    partial entries.
+    """
+    if not cache_dir.exists():
+        cache_dir.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=cache_dir.parent, prefix=".tmp-"))
+        try:
+            build(tmp_dir)
+            os.rename(tmp_dir, cache_dir)
+        except OSError:
+            # a concurrent process already created the cache entry
+            if not cache_dir.exists():
+                raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return cache_dir
+
+
+def cache_ttl() -> float:
+    """Seconds until cached metadata (e.g., the datasets in TIRA) is refreshed (configurable via LSR_BENCHMARK_CACHE_TTL)."""
+    return float(os.environ.get("LSR_BENCHMARK_CACHE_TTL", DEFAULT_TTL))
+
+
+def cached_json(name: str, compute: "Callable[[], Any]", ttl: "Optional[float]" = None, force_reload: bool = False):
+    """Return the result of compute(), cached as json file in the cache_home for ttl seconds.
+
+    If compute() fails (e.g., because we are offline), an expired cache entry is returned instead.
+    """
+    try:
+        cache_file = cache_home() / name
+    except OSError:
+        # e.g., no writable cache directory in the sandbox
+        return compute()
+
+    ttl = cache_ttl() if ttl is None else ttl
+    cached = None
+    if cache_file.is_file():
+        try:
+            cached = json.loads(cache_file.read_text())
+            if not force_reload and time.time() - cache_file.stat().st_mtime < ttl:
+                return cached
+        except ValueError:
+            cached = None
+
+    try:
+        ret = compute()
+    except Exception:
+        if cached is None:
+            raise
+        return cached
+
+    tmp_file = cache_file.with_name(f".tmp-{os.getpid()}-{name}")
+    try:
+        tmp_file.write_text(json.dumps(ret))
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        tmp_file.unlink(missing_ok=True)
+    return ret
+
+
+def add_resources_to_metadata(metadata_file: Path, key: str, resources: "dict[str, Any]"):
+    """Merge resources under resources.<key> into the ir_metadata yml file (created if it does not exist)."""
+    import yaml
+
+    metadata = yaml.safe_load(metadata_file.read_text()) if metadata_file.is_file() else {}
+    metadata.setdefault("resources", {})[key] = resources
+    metadata_file.write_text(yaml.safe_dump(metadata, sort_keys=False, allow_unicode=True))
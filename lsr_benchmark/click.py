@@ -1,9 +1,14 @@
 from lsr_benchmark.datasets import all_embeddings, all_datasets, IR_DATASET_TO_TIRA_DATASET, TIRA_DATASET_ID_TO_IR_DATASET_ID
+from functools import lru_cache
 from pathlib import Path
 import os
 
-def retrieve_command():
+
+@lru_cache(maxsize=None)
+def _param_types():
+    """The click types of datasets and embeddings (created on first use, as click is only imported when needed)."""
     import click
+
     class ClickParamTypeLsrDataset(click.ParamType):
         name = "dataset_or_dir"
 
@@ -28,6 +33,10 @@ def retrieve_command():
         name = "embedding_or_dir"
 
         def convert(self, value, param, ctx):
+            # a directory (e.g., passed by the local backend of lsr-benchmark retrieval) before the names with a /
+            if value and os.path.isdir(value):
+                return os.path.abspath(value)
+
             if value:
                 value = value.replace("/", "-")
 
@@ -44,7 +53,19 @@ def retrieve_command():
 
             self.fail(msg, param, ctx)
 
+    return ClickParamTypeLsrDataset, ClickParamTypeLsrEmbedding
+
+
+def embedding_param_type():
+    """The click type of an embedding: a name like naver/splade-v3 (as lightning-ir/naver-splade-v3) or a directory."""
+    return _param_types()[1]()
+
+
+def retrieve_command():
     """A decorator that wraps a Click command with standard retrieval options."""
+    import click
+    ClickParamTypeLsrDataset, ClickParamTypeLsrEmbedding = _param_types()
+
     def decorator(func):
         func = click.option(
             "--dataset",
@@ -1,6 +1,11 @@
 import json
+from functools import lru_cache
 from pathlib import Path
 
+MAPPING_OF_DATASET_IDS = {"clueweb09/en/trec-web-2009": "data/trec-18-web"}
+
+
+@lru_cache(maxsize=None)
 def lsr_overview():
     return json.loads((Path(__file__).parent / "overview.json").read_text())
 
@@ -0,0 +1,188 @@
+"""Vectorised effectiveness measures (nDCG@k incl. judged-only, P@k, RR, R@k) over columnar runs.
+
+The qrels are indexed once into sorted (query, document) keys, so that scoring a run is a few NumPy operations over its
+rows instead of building the dict-of-dicts that the backends of ir_measures evaluate. The measures follow trec_eval
+(and hence ir_measures): the documents of a query are ranked by descending score and then by descending doc_id (the
+ranks in the run file are ignored), and the measures are averaged over all queries of the qrels (queries without any
+retrieved document count as 0). Measures that are not supported here (see supports) are left to ir_measures:
+
+    qrels = QrelsIndex.from_dict(qrels)
+    scores = evaluate_runs(qrels, [read_run(i) for i in run_files], [nDCG@10, P@10, RR])
+"""
+from typing import TYPE_CHECKING, Iterable, NamedTuple
+
+import numpy as np
+
+from lsr_benchmark.runs import ColumnarRun
+
+if TYPE_CHECKING:
+    from ir_measures import Measure
+
+SUPPORTED_MEASURES = ("nDCG", "P", "RR", "R")
+
+
+def supports(measure: "Measure") -> bool:
+    """Whether the measure of ir_measures can be computed by evaluate_runs."""
+    params = dict(measure.params)
+    if measure.NAME not in SUPPORTED_MEASURES:
+        return False
+    if measure.NAME == "nDCG":
+        return params.get("dcg", "log2") == "log2" and params.get("gains") is None
+    if measure.NAME == "RR":
+        # ir_measures computes RR@k via the MS MARCO script, which breaks ties by ascending doc_id
+        return params.get("cutoff") is None
+    # precision without cutoff divides by the number of retrieved documents instead of the cutoff
+    return measure.NAME != "P" or params.get("cutoff") is not None
+
+
+class RankedRows(NamedTuple):
+    """The rows of a run that retrieved documents for queries of the qrels, ranked per query like trec_eval."""
+
+    queries: np.ndarray
+    ranks: np.ndarray
+    relevance: np.ndarray
+    judged: np.ndarray
+
+
+class QrelsIndex:
+    """The relevance judgments of a dataset as arrays: keys (query * num_docs + doc) sorted, with their relevance."""
+
+    def __init__(self, query_ids: "list[str]", doc_ids: "list[str]", keys: np.ndarray, relevance: np.ndarray):
+        self.query_ids = query_ids
+        self.doc_ids = doc_ids
+        self.keys = keys
+        self.relevance = relevance
+        self.__query_index = {query_id: i for i, query_id in enumerate(query_ids)}
+        self.__doc_index = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+
+    @staticmethod
+    def from_dict(qrels: "dict[str, dict[str, int]]") -> "QrelsIndex":
+        query_ids = list(qrels)
+        doc_index: "dict[str, int]" = {}
+        queries, docs, relevance = [], [], []
+        for query, judgments in enumerate(qrels.values()):
+            for doc_id, rel in judgments.items():
+                queries.append(query)
+                docs.append(doc_index.setdefault(doc_id, len(doc_index)))
+                relevance.append(rel)
+
+        keys = np.array(queries, dtype=np.int64) * max(1, len(doc_index)) + np.array(docs, dtype=np.int64)
+        order = np.argsort(keys, kind="stable")
+        return QrelsIndex(query_ids, list(doc_index), keys[order], np.array(relevance, dtype=np.int64)[order])
+
+    def __len__(self) -> int:
+        return len(self.query_ids)
+
+    def __getstate__(self):
+        return self.query_ids, self.doc_ids, self.keys, self.relevance
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def to_dict(self) -> "dict[str, dict[str, int]]":
+        """The qrels as {query_id: {doc_id: relevance}}, e.g., for ir_measures."""
+        num_docs = max(1, len(self.doc_ids))
+        ret: "dict[str, dict[str, int]]" = {query_id: {} for query_id in self.query_ids}
+        for key, relevance in zip(self.keys.tolist(), self.relevance.tolist()):
+            ret[self.query_ids[key // num_docs]][self.doc_ids[key % num_docs]] = relevance
+        return ret
+
+    def judgments(self, min_relevance: int = 1) -> "tuple[np.ndarray, np.ndarray]":
+        """The query of each judgment with a relevance of at least min_relevance and the relevance."""
+        relevant = self.relevance >= min_relevance
+        return self.keys[relevant] // max(1, len(self.doc_ids)), self.relevance[relevant]
+
+    def rank(self, run: ColumnarRun) -> RankedRows:
+        """Rank the rows of the run per query and look up their relevance (0 and not judged for unjudged documents)."""
+        queries = np.array([self.__query_index.get(i, -1) for i in run.query_ids.tolist()], dtype=np.int64)
+        docs = np.array([self.__doc_index.get(i, -1) for i in run.doc_ids.tolist()], dtype=np.int64)
+        # rows are sorted by query, descending score, and descending doc_id (the lexicographic order of the doc_ids)
+        doc_order = np.empty(len(run.doc_ids), dtype=np.int64)
+        doc_order[np.argsort(run.doc_ids, kind="stable")] = np.arange(len(run.doc_ids))
+
+        row_queries, row_docs = queries[run.query_codes], run.doc_codes
+        rows = np.flatnonzero(row_queries >= 0)
+        # a document that is retrieved twice for a query keeps its last score (as in the run dict of ir_measures)
+        pairs = row_queries[rows] * max(1, len(run.doc_ids)) + row_docs[rows]
+        _, last = np.unique(pairs[::-1], return_index=True)
+        rows = rows[len(rows) - 1 - last]
+
+        rows = rows[np.lexsort((-doc_order[row_docs[rows]], -run.scores[rows].astype(np.float64), row_queries[rows]))]
+        ranked_queries = row_queries[rows]
+
+        ranked_docs = docs[row_docs[rows]]
+        keys = ranked_queries * max(1, len(self.doc_ids)) + ranked_docs
+        relevance = np.zeros(len(rows), dtype=np.int64)
+        found = np.zeros(len(rows), dtype=bool)
+        if len(self.keys) > 0:
+            positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+            found = (ranked_docs >= 0) & (self.keys[positions] == keys)
+            relevance[found] = self.relevance[positions[found]]
+        return RankedRows(ranked_queries, _ranks(ranked_queries), relevance, found)
+
+
+def _ranks(queries: np.ndarray) -> np.ndarray:
+    """The 0-based rank of each row within its query (the rows of a query are contiguous)."""
+    if len(queries) == 0:
+        return np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.concatenate([[True], queries[1:] != queries[:-1]]))
+    return np.arange(len(queries)) - np.repeat(starts, np.diff(np.append(starts, len(queries))))
+
+
+def _judged_only(rows: RankedRows) -> RankedRows:
+    # like trec_eval, documents with a negative relevance label count as unjudged
+    judged = rows.judged & (rows.relevance >= 0)
+    queries = rows.queries[judged]
+    return RankedRows(queries, _ranks(queries), rows.relevance[judged], rows.judged[judged])
+
+
+def _ideal_dcg(qrels: QrelsIndex, cutoff: "int | None") -> np.ndarray:
+    queries, relevance = qrels.judgments(min_relevance=1)
+    order = np.lexsort((-relevance, queries))
+    queries, relevance = queries[order], relevance[order]
+    ranks = _ranks(queries)
+    top = ranks < cutoff if cutoff is not None else np.ones(len(ranks), dtype=bool)
+    return np.bincount(queries[top], relevance[top] / np.log2(ranks[top] + 2), minlength=len(qrels))
+
+
+def _per_query(measure: "Measure", qrels: QrelsIndex, rows: RankedRows, ideal: "dict") -> np.ndarray:
+    params = dict(measure.params)
+    cutoff = params.get("cutoff")
+    if params.get("judged_only", False):
+        rows = _judged_only(rows)
+    top = rows.ranks < cutoff if cutoff is not None else np.ones(len(rows.ranks), dtype=bool)
+    queries, ranks, relevance = rows.queries[top], rows.ranks[top], rows.relevance[top]
+
+    if measure.NAME == "nDCG":
+        if cutoff not in ideal:
+            ideal[cutoff] = _ideal_dcg(qrels, cutoff)
+        gains = np.where(relevance > 0, relevance, 0) / np.log2(ranks + 2)
+        dcg = np.bincount(queries, gains, minlength=len(qrels))
+        return np.divide(dcg, ideal[cutoff], out=np.zeros(len(qrels)), where=ideal[cutoff] > 0)
+
+    relevant = relevance >= params.get("rel", 1)
+    if measure.NAME == "RR":
+        first = np.full(len(qrels), np.inf)
+        np.minimum.at(first, queries[relevant], ranks[relevant])
+        return 1 / (first + 1)
+
+    retrieved = np.bincount(queries[relevant], minlength=len(qrels))
+    if measure.NAME == "P":
+        return retrieved / cutoff
+    num_relevant = np.bincount(qrels.judgments(params.get("rel", 1))[0], minlength=len(qrels))
+    return np.divide(retrieved, num_relevant, out=np.zeros(len(qrels)), where=num_relevant > 0)
+
+
+def evaluate_runs(qrels: QrelsIndex, runs: "Iterable[ColumnarRun]", measures: "Iterable[Measure]") -> "list[dict[str, float]]":
+    """The mean of each (supported) measure over the queries of the qrels for each run, keyed by the measure name."""
+    measures = list(measures)
+    unsupported = [str(i) for i in measures if not supports(i)]
+    if unsupported:
+        raise ValueError(f"The measures {unsupported} are not supported, please evaluate them via ir_measures.")
+
+    ideal: "dict[int | None, np.ndarray]" = {}
+    ret = []
+    for run in runs:
+        rows = qrels.rank(run)
+        ret.append({str(i): float(np.mean(_per_query(i, qrels, rows, ideal))) if len(qrels) else 0.0 for i in measures})
+    return ret
@@ -0,0 +1,203 @@
+"""Backends that execute retrieval approaches on a dataset (and embeddings), used by `lsr-benchmark retrieval`.
+
+Each approach directory describes how it is executed in an approach manifest (lsr-benchmark.yml):
+
+    name: native-search
+    command: /build-and-search-native-index.py --dataset $inputDataset --embedding naver/splade-v3
+      --output $outputDir
+    local-command: $python build-and-search-native-index.py --dataset $inputDataset --embedding $inputRun
+      --output $outputDir
+
+The command is executed in the docker image of the approach (built from its Dockerfile), either via TIRA (backend tira)
+or via a local container runtime (backends docker and podman) without a TIRA installation. The local-command is executed
+as process in the approach directory (backend local, without container startup and for nodes without container
+runtime), with $python being the interpreter of the lsr-benchmark, so the dependencies of the approach must be
+installed. Both substitute $inputDataset, $inputRun (the embeddings), and $outputDir.
+"""
+import abc
+import os
+import re
+import shlex
+import subprocess
+import sys
+from pathlib import Path
+from string import Template
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    from typing import Optional
+
+MANIFEST_FILE = "lsr-benchmark.yml"
+BACKENDS = ("tira", "local", "docker", "podman")
+# the mount points of TIRA, so that the same command works in both container backends
+CONTAINER_INPUT_DATASET = "/tira-data/input"
+CONTAINER_INPUT_RUN = "/tira-data/input-run"
+CONTAINER_OUTPUT_DIR = "/tira-data/output"
+THREAD_VARIABLES = (
+    "OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMBA_NUM_THREADS", "RAYON_NUM_THREADS"
+)
+
+
+class ApproachManifest(NamedTuple):
+    name: str
+    directory: Path
+    command: str
+    local_command: "Optional[str]" = None
+
+    @staticmethod
+    def load(directory: Path) -> "ApproachManifest":
+        """The manifest of the approach, or its tira-cli code-submission command in the README.md if it has none."""
+        import yaml
+
+        directory = Path(directory)
+        if (directory / MANIFEST_FILE).is_file():
+            manifest = yaml.safe_load((directory / MANIFEST_FILE).read_text())
+            for key in ("name", "command"):
+                if not manifest.get(key):
+                    raise ValueError(f"The approach manifest {directory / MANIFEST_FILE} has no {key}.")
+            return ApproachManifest(manifest["name"], directory, manifest["command"], manifest.get("local-command"))
+
+        try:
+            readme = (directory / "README.md").read_text()
+            command = readme.split("tira-cli code-submission")[1].split("--command")[1].split("'")[1]
+        except (OSError, IndexError):
+            raise ValueError(f"The approach {directory} has no {MANIFEST_FILE}.") from None
+        return ApproachManifest(directory.resolve().name, directory, command)
+
+
+def _command(command: str, variables: "dict[str, str]") -> "list[str]":
+    if "$inputRun" in command and "inputRun" not in variables:
+        raise ValueError(f"The command {command!r} needs embeddings ($inputRun), but was executed without embeddings.")
+    return shlex.split(Template(command).safe_substitute({k: shlex.quote(v) for k, v in variables.items()}))
+
+
+def _stream(args: "list[str]", cwd: "Optional[Path]" = None, env: "Optional[dict[str, str]]" = None):
+    """Run the process, printing its output (e.g., into the log of the job, see scheduler), fail on a non-zero exit."""
+    process = subprocess.Popen(args, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    for line in process.stdout:
+        print(line, end="")
+    if process.wait() != 0:
+        raise subprocess.CalledProcessError(process.returncode, args)
+
+
+class ExecutionBackend(abc.ABC):
+    """Prepares an approach once (e.g., builds its image) and then executes it on datasets."""
+
+    def prepare(self, approach: ApproachManifest):
+        pass
+
+    @abc.abstractmethod
+    def run(
+        self,
+        approach: ApproachManifest,
+        dataset_dir: Path,
+        embeddings_dir: "Optional[Path]",
+        output_dir: Path,
+        cpu_count: "Optional[int]" = None,
+        mem_limit: "Optional[str]" = None,
+    ):
+        """Execute the approach on the dataset (and its embeddings), writing the run to output_dir."""
+
+
+class TiraBackend(ExecutionBackend):
+    def __init__(self):
+        self.images: "dict[str, str]" = {}
+
+    def prepare(self, approach):
+        from tira.io_utils import log_message
+        from tira.rest_api_client import Client
+
+        docker_tag = Client().build_docker_image_from_code(approach.directory, log_message, False)[0]
+        assert docker_tag not in self.images.values()
+        self.images[approach.name] = docker_tag
+
+    def run(self, approach, dataset_dir, embeddings_dir, output_dir, cpu_count=None, mem_limit=None):
+        from tira.rest_api_client import Client
+
+        Client().local_execution.run(
+            image=self.images[approach.name],
+            command=approach.command,
+            input_dir=dataset_dir,
+            output_dir=output_dir,
+            allow_network=False,
+            input_run=embeddings_dir,
+            cpu_count=cpu_count,
+            mem_limit=mem_limit,
+        )
+
+
+class ContainerBackend(ExecutionBackend):
+    """Builds and runs the docker image of approaches with a local container runtime (docker or podman)."""
+
+    def __init__(self, runtime: str = "docker"):
+        self.runtime = runtime
+
+    def image(self, approach: ApproachManifest) -> str:
+        return "lsr-benchmark/" + re.sub(r"[^a-z0-9_.-]+", "-", approach.name.lower()) + ":local"
+
+    def prepare(self, approach):
+        _stream([self.runtime, "build", "-t", self.image(approach), str(approach.directory)])
+
+    def run(self, approach, dataset_dir, embeddings_dir, output_dir, cpu_count=None, mem_limit=None):
+        variables = {"inputDataset": CONTAINER_INPUT_DATASET, "outputDir": CONTAINER_OUTPUT_DIR}
+        mounts = [
+            f"{Path(dataset_dir).resolve()}:{CONTAINER_INPUT_DATASET}:ro",
+            f"{Path(output_dir).resolve()}:{CONTAINER_OUTPUT_DIR}",
+        ]
+        if embeddings_dir is not None:
+            variables["inputRun"] = CONTAINER_INPUT_RUN
+            mounts.append(f"{Path(embeddings_dir).resolve()}:{CONTAINER_INPUT_RUN}:ro")
+
+        args = [self.runtime, "run", "--rm", "--network", "none"]
+        for mount in mounts:
+            args += ["-v", mount]
+        # the variables of the TIRA sandbox, so that the approaches find their inputs (see irds.in_tira_sandbox)
+        for key, value in {"TIRA_INPUT_DATASET": CONTAINER_INPUT_DATASET, **variables}.items():
+            args += ["-e", f"{key}={value}"]
+        if cpu_count is not None:
+            args += ["--cpus", str(cpu_count)]
+        if mem_limit is not None:
+            args += ["--memory", mem_limit]
+
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        _stream(args + [self.image(approach)] + _command(approach.command, variables))
+
+
+class LocalProcessBackend(ExecutionBackend):
+    """Runs the local-command of approaches as process in their directory, i.e., without any container."""
+
+    def run(self, approach, dataset_dir, embeddings_dir, output_dir, cpu_count=None, mem_limit=None):
+        if not approach.local_command:
+            raise ValueError(
+                f"The approach {approach.name} has no local-command in {approach.directory / MANIFEST_FILE}."
+            )
+
+        variables = {"python": sys.executable, "inputDataset": str(dataset_dir), "outputDir": str(output_dir)}
+        if embeddings_dir is not None:
+            variables["inputRun"] = str(embeddings_dir)
+
+        env = dict(os.environ)
+        if cpu_count is not None:
+            # a soft limit: the thread pools of the usual libraries, processes are not pinned to CPUs
+            env.update({i: str(cpu_count) for i in THREAD_VARIABLES})
+
+        args = _command(approach.local_command, variables)
+        if mem_limit is not None:
+            from lsr_benchmark.artifacts import parse_size
+
+            # the data segment (heap) and not the address space, so that memory-mapped embeddings do not count. The
+            # shell sets the limit before it executes the approach (preexec_fn is not safe in the threads of run_jobs)
+            args = ["sh", "-c", 'ulimit -d "$1" && shift && exec "$@"', "sh", str(parse_size(mem_limit) // 1024)] + args
+
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        _stream(args, approach.directory.resolve(), env)
+
+
+def execution_backend(name: str) -> ExecutionBackend:
+    if name == "tira":
+        return TiraBackend()
+    if name == "local":
+        return LocalProcessBackend()
+    if name in ("docker", "podman"):
+        return ContainerBackend(name)
+    raise ValueError(f"Unknown backend {name}, use one of {', '.join(BACKENDS)}.")
@@ -0,0 +1,131 @@
+"""Indexes of retrieval engines that are built once and then reused across runs (e.g., of a parameter sweep).
+
+The indexes are stored in the cache_home under a content hash of the document embeddings, the engine, and the
+parameters that affect the index, so that runs that only change search-time parameters (k, query_cut, ef_search, ...)
+reuse the index. Usage in the step-03 scripts (track_index has to be the outer context, so that the metadata file of the
+tracking already exists when the cache hit/miss is added to it):
+
+    with track_index(output, "seismic", ir_dataset.doc_embedding_files(embedding), {"use_u32": use_u32}) as cache, \\
+            tracking(export_file_path=output / "index-metadata.yml", ...):
+        index_dir = cache.get(lambda target_dir: build_index(...).save(target_dir))
+"""
+import atexit
+import hashlib
+import json
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, TYPE_CHECKING
+
+from lsr_benchmark.cache import add_resources_to_metadata
+
+if TYPE_CHECKING:
+    from typing import Optional
+
+INDEX_CACHE_VERSION = 1
+METADATA_FILE = "index-metadata.yml"
+ENTRY_FILE = "index-cache.json"
+
+
+def embedding_fingerprint(files: "list[Path]") -> str:
+    """A content hash of the embedding files (cheap for npz archives, whose members carry a CRC32 checksum)."""
+    from lsr_benchmark.cache import file_checksum
+    from lsr_benchmark.irds import _embedding_cache_key
+
+    checksum = hashlib.sha256()
+    for file in files:
+        file = Path(file)
+        content = _embedding_cache_key(file) if file.suffix == ".npz" else file_checksum(file)
+        checksum.update(f"{file.name}:{content}\n".encode())
+    return checksum.hexdigest()
+
+
+def index_key(engine: str, embedding_files: "list[Path]", params: "dict[str, Any]") -> str:
+    key = {
+        "version": INDEX_CACHE_VERSION,
+        "engine": engine,
+        "embeddings": embedding_fingerprint(embedding_files),
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IndexCache:
+    def __init__(
+        self,
+        engine: str,
+        embedding_files: "list[Path]",
+        params: "Optional[dict[str, Any]]" = None,
+        enabled: bool = True,
+    ):
+        self.engine = engine
+        self.params = params or {}
+        self.key = index_key(engine, embedding_files, self.params)
+        self.enabled = enabled
+        self.directory: "Optional[Path]" = None
+        self.hit: "Optional[bool]" = None
+        self.build_seconds: "Optional[float]" = None
+
+    def __cache_dir(self) -> "Optional[Path]":
+        from lsr_benchmark.cache import cache_home
+
+        if not self.enabled:
+            return None
+        try:
+            return cache_home() / "indexes" / self.engine / self.key
+        except OSError:
+            # e.g., no writable cache directory in the sandbox
+            return None
+
+    def get(self, build: "Callable[[Path], None]") -> Path:
+        """The directory of the index, populated via build(target_dir) if the index is not cached yet."""
+        from lsr_benchmark.cache import cached_directory
+
+        def timed_build(target_dir: Path):
+            start = time.perf_counter()
+            build(target_dir)
+            entry = {"engine": self.engine, "params": self.params, "build_seconds": time.perf_counter() - start}
+            (target_dir / ENTRY_FILE).write_text(json.dumps(entry, default=str))
+
+        cache_dir = self.__cache_dir()
+        if cache_dir is None:
+            # the index is only built for this run and removed when the process exits
+            self.directory, self.hit = Path(tempfile.mkdtemp(prefix="lsr-benchmark-index-")), False
+            atexit.register(shutil.rmtree, self.directory, True)
+            timed_build(self.directory)
+        else:
+            self.hit = cache_dir.exists()
+            self.directory = cached_directory(cache_dir, timed_build)
+
+        self.build_seconds = json.loads((self.directory / ENTRY_FILE).read_text())["build_seconds"]
+        return self.directory
+
+    def summary(self) -> "dict[str, str | bool]":
+        """Whether the index was reused and how long building it took (formatted like the runtime of the tirex-tracker)."""
+        ret = {"key": self.key, "hit": bool(self.hit)}
+        if self.build_seconds is not None:
+            ret["build_time"] = f"{self.build_seconds * 1000:.3f} ms"
+        if self.directory is not None and self.__cache_dir() is not None:
+            ret["directory"] = str(self.directory)
+        return ret
+
+
+def add_index_cache_to_metadata(metadata_file: Path, summary: "dict[str, str | bool]"):
+    add_resources_to_metadata(metadata_file, "index_cache", summary)
+
+
+@contextmanager
+def track_index(
+    output: Path,
+    engine: str,
+    embedding_files: "list[Path]",
+    params: "Optional[dict[str, Any]]" = None,
+    enabled: bool = True,
+    metadata_file: str = METADATA_FILE,
+):
+    """Yield an IndexCache and add its cache hit/miss and build time to output/index-metadata.yml afterwards."""
+    cache = IndexCache(engine, embedding_files, params, enabled)
+    yield cache
+    add_index_cache_to_metadata(Path(output) / metadata_file, cache.summary())
@@ -1,30 +1,376 @@
+import gzip
+import hashlib
+import shutil
+import threading
 import zipfile
+import zlib
 from pathlib import Path
-from typing import List, NamedTuple, TYPE_CHECKING
+from typing import Iterator, List, NamedTuple, TYPE_CHECKING
 
 import numpy as np
 from ir_datasets.datasets.base import Dataset
 from ir_datasets.formats import BaseDocs, BaseQueries, GenericQuery, TrecQrels
+from ir_datasets.indices import Docstore
 from ir_datasets.util import MetadataComponent
-from tira.check_format import JsonlFormat, QueryProcessorFormat
-from tira.third_party_integrations import in_tira_sandbox
-from tqdm import tqdm
 import os
 from glob import glob
 
+from lsr_benchmark.cache import cached_json
+from lsr_benchmark.datasets import MAPPING_OF_DATASET_IDS
+
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
 if TYPE_CHECKING:
     from typing import Optional
 
-MAPPING_OF_DATASET_IDS = {"clueweb09/en/trec-web-2009": "data/trec-18-web"}
 TIRA_LSR_TASK_ID = "lsr-benchmark"
+EMBEDDING_CACHE_VERSION = 1
+EMBEDDING_ARRAYS = ("data", "indices", "indptr")
+ID_TABLE_ARRAYS = ("blob", "offsets", "index")
+TOKEN_TYPES = ("int", "str")
+CORPUS_INDEX_VERSION = 2
+CORPUS_INDEX_ARRAYS = ("block-offsets", "doc-blocks", "doc-starts", "doc-ends", "doc-segments")
+CORPUS_BLOCK_SIZE = 64 * 1024
+CORPUS_REQUIRED_FIELDS = ("doc_id", "segments")
 
 
 _IR_DATASETS_FROM_TIRA = None
+_TOKEN_STRINGS = np.empty(0, dtype="U30")
+_TOKEN_STRINGS_LOCK = threading.Lock()
 
-def embeddings(
-        dataset_id: str, model_name: str, text_type: str
-    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, list[str]]:
 
+def _token_strings(tokens: np.ndarray) -> np.ndarray:
+    """The string representation of integer token ids via a shared lookup table (much faster than astype per row)."""
+    global _TOKEN_STRINGS
+    # a local reference, as other threads (e.g., of batch_search) may replace the table concurrently
+    table = _TOKEN_STRINGS
+    if len(tokens) > 0 and tokens.max() >= len(table):
+        with _TOKEN_STRINGS_LOCK:
+            table = _TOKEN_STRINGS
+            if tokens.max() >= len(table):
+                table = np.arange(max(tokens.max() + 1, 2 * len(table))).astype("U30")
+                _TOKEN_STRINGS = table
+    return table[tokens]
+
+
+class IdTable:
+    """A compact, memory-mappable table of the (document or query) ids of the rows of an embedding matrix.
+
+    All ids are stored utf-8 encoded in one byte blob with the offsets of each row, plus an open-addressing hash
+    index from ids to rows, so that ids cost a few bytes instead of one Python str each while row_of is O(1).
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, index: "Optional[np.ndarray]" = None, base: int = 0):
+        self.blob = blob
+        self.offsets = offsets
+        self.__index = index
+        self.__base = base
+
+    @staticmethod
+    def from_ids(ids: "list[str]") -> "IdTable":
+        encoded = [i.encode("utf-8") for i in ids]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(i) for i in encoded], out=offsets[1:])
+        return IdTable(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    @staticmethod
+    def from_file(ids_file: Path) -> "IdTable":
+        """Parse a file with one id per line without creating one Python str per id."""
+        content = np.frombuffer(ids_file.read_bytes().strip(), dtype=np.uint8)
+        if len(content) == 0:
+            return IdTable(content, np.zeros(1, dtype=np.int64))
+        newlines = np.flatnonzero(content == ord("\n"))
+        offsets = np.empty(len(newlines) + 2, dtype=np.int64)
+        offsets[0] = 0
+        offsets[1:-1] = newlines - np.arange(len(newlines))
+        offsets[-1] = len(content) - len(newlines)
+        return IdTable(np.delete(content, newlines), offsets)
+
+    @staticmethod
+    def concatenate(tables: "list[IdTable]") -> "IdTable":
+        blobs, offsets, position = [], [np.zeros(1, dtype=np.int64)], 0
+        for table in tables:
+            blobs.append(table.blob[table.offsets[0] : table.offsets[-1]])
+            offsets.append(table.offsets[1:] - table.offsets[0] + position)
+            position += int(table.offsets[-1] - table.offsets[0])
+        return IdTable(np.concatenate(blobs or [np.empty(0, dtype=np.uint8)]), np.concatenate(offsets))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("Only contiguous slices are supported.")
+            stop = max(start, stop)
+            return IdTable(self.blob, self.offsets[start : stop + 1], self.__index, self.__base + start)
+
+        row = int(key)
+        if row < 0:
+            row += len(self)
+        if row < 0 or row >= len(self):
+            raise IndexError(f"Row {key} is out of range for {len(self)} ids.")
+        return self.__bytes(row).decode("utf-8")
+
+    def __iter__(self):
+        blob = self.blob[self.offsets[0] : self.offsets[-1]].tobytes()
+        offsets = (self.offsets - self.offsets[0]).tolist()
+        for begin, end in zip(offsets[:-1], offsets[1:]):
+            yield blob[begin:end].decode("utf-8")
+
+    def __contains__(self, row_id) -> bool:
+        return self.__find(row_id) is not None
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def __bytes(self, row: int) -> bytes:
+        return self.blob[self.offsets[row] : self.offsets[row + 1]].tobytes()
+
+    @staticmethod
+    def _hash(row_id: bytes) -> int:
+        return zlib.crc32(row_id)
+
+    def __hash_index(self) -> np.ndarray:
+        if self.__index is None:
+            # the index stores rows of the complete table, i.e., slices are re-based before building it
+            blob, offsets = self.blob.tobytes(), self.offsets.tolist()
+            mask = (1 << max(1, (2 * len(self)).bit_length())) - 1
+            index = [-1] * (mask + 1)
+            for row in range(len(self)):
+                slot = self._hash(blob[offsets[row] : offsets[row + 1]]) & mask
+                while index[slot] != -1:
+                    slot = (slot + 1) & mask
+                index[slot] = row
+            self.__index = np.array(index, dtype=np.int64)
+            self.__base = 0
+        return self.__index
+
+    def __find(self, row_id: str) -> "Optional[int]":
+        encoded = row_id.encode("utf-8")
+        index = self.__hash_index()
+        mask = len(index) - 1
+        slot = self._hash(encoded) & mask
+        while index[slot] != -1:
+            row = int(index[slot]) - self.__base
+            if 0 <= row < len(self) and self.__bytes(row) == encoded:
+                return row
+            slot = (slot + 1) & mask
+        return None
+
+    def row_of(self, row_id: str) -> int:
+        row = self.__find(row_id)
+        if row is None:
+            raise KeyError(f"The id {row_id} has no embedding.")
+        return row
+
+    def ids_of(self, rows) -> np.ndarray:
+        """Vectorised lookup of the ids of an array of rows."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0 or len(self.blob) == 0:
+            return np.full(len(rows), "", dtype="U1")
+        starts, ends = self.offsets[rows], self.offsets[rows + 1]
+        width = max(1, int((ends - starts).max()))
+        positions = starts[:, None] + np.arange(width)[None, :]
+        characters = np.where(positions < ends[:, None], self.blob[np.minimum(positions, len(self.blob) - 1)], 0)
+        return np.char.decode(np.ascontiguousarray(characters, dtype=np.uint8).view(f"S{width}").ravel(), "utf-8")
+
+    def save(self, directory: Path):
+        self.__hash_index()
+        arrays = {"blob": self.blob, "offsets": self.offsets, "index": self.__index}
+        for name in ID_TABLE_ARRAYS:
+            np.save(directory / f"id-{name}.npy", arrays[name])
+
+    @staticmethod
+    def load(directory: Path) -> "IdTable":
+        arrays = {name: np.load(directory / f"id-{name}.npy", mmap_mode="r") for name in ID_TABLE_ARRAYS}
+        return IdTable(arrays["blob"], arrays["offsets"], arrays["index"])
+
+
+class SparseEmbedding(NamedTuple):
+    id: str
+    tokens: np.ndarray
+    values: np.ndarray
+
+
+class SparseEmbeddingMatrix:
+    """The sparse embeddings of all documents (or queries) of a dataset in CSR format.
+
+    The data/indices/indptr arrays are kept exactly as loaded, rows are only exposed as views into them, so that
+    creating the matrix, slicing it, and iterating over it does not copy the embeddings. With token_type="str", the
+    tokens of the rows are converted to strings (lazily per row) for engines that expect string components.
+    """
+
+    def __init__(
+        self,
+        ids: "IdTable | list[str]",
+        data: np.ndarray,
+        indices: np.ndarray,
+        indptr: np.ndarray,
+        token_type: str = "int",
+    ):
+        if len(indptr) != len(ids) + 1:
+            raise ValueError(f"I expected {len(ids) + 1} entries in indptr for {len(ids)} ids, but got {len(indptr)}.")
+        if token_type not in TOKEN_TYPES:
+            raise ValueError(f"The token_type must be one of {TOKEN_TYPES}, got {token_type}.")
+        self.ids = ids if isinstance(ids, IdTable) else IdTable.from_ids(ids)
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.token_type = token_type
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("Only contiguous slices are supported.")
+            stop = max(start, stop)
+            begin, end = self.indptr[start], self.indptr[stop]
+            return SparseEmbeddingMatrix(
+                self.ids[start:stop],
+                self.data[begin:end],
+                self.indices[begin:end],
+                self.indptr[start : stop + 1] - begin,
+                self.token_type,
+            )
+
+        row = self.row_of(key) if isinstance(key, str) else int(key)
+        if row < 0:
+            row += len(self)
+        if row < 0 or row >= len(self):
+            raise IndexError(f"Row {key} is out of range for {len(self)} embeddings.")
+
+        begin, end = self.indptr[row], self.indptr[row + 1]
+        return SparseEmbedding(self.ids[row], self.__tokens(begin, end), self.data[begin:end])
+
+    def __iter__(self):
+        for row_id, begin, end in zip(self.ids, self.indptr[:-1], self.indptr[1:]):
+            yield SparseEmbedding(row_id, self.__tokens(begin, end), self.data[begin:end])
+
+    def __tokens(self, begin: int, end: int) -> np.ndarray:
+        tokens = self.indices[begin:end]
+        return tokens if self.token_type == "int" else _token_strings(tokens)
+
+    def __contains__(self, row_id) -> bool:
+        return row_id in self.ids
+
+    def row_of(self, row_id: str) -> int:
+        return self.ids.row_of(row_id)
+
+    def get(self, row_id: str) -> SparseEmbedding:
+        return self[self.row_of(row_id)]
+
+    def chunks(self, chunk_size: int) -> "Iterator[SparseEmbeddingMatrix]":
+        """Iterate over blocks of (at most) chunk_size consecutive rows."""
+        for start in range(0, len(self), chunk_size):
+            yield self[start : start + chunk_size]
+
+    def tuples(self):
+        """The legacy (id, tokens, values) iterator where the tokens are strings, converted lazily per row."""
+        for row_id, begin, end in zip(self.ids, self.indptr[:-1], self.indptr[1:]):
+            yield row_id, _token_strings(self.indices[begin:end]), self.data[begin:end]
+
+
+def _embedding_cache_key(npz_file: Path) -> str:
+    """A checksum of the arrays in the npz archive, derived from the CRC32 values that zip stores for each member."""
+    checksum = hashlib.sha256(f"v{EMBEDDING_CACHE_VERSION}".encode())
+    with zipfile.ZipFile(npz_file) as archive:
+        for entry in sorted(archive.infolist(), key=lambda i: i.filename):
+            checksum.update(f"{entry.filename}:{entry.CRC}:{entry.file_size}".encode())
+    return checksum.hexdigest()
+
+
+def _embedding_cache_dir(npz_file: Path) -> Path:
+    from lsr_benchmark.cache import cache_home
+
+    return cache_home() / "embeddings" / f"v{EMBEDDING_CACHE_VERSION}" / _embedding_cache_key(npz_file)
+
+
+def memory_mapped_embeddings(npz_file: Path) -> "dict[str, np.ndarray]":
+    """Load the CSR arrays of an embeddings npz archive as read-only memory maps.
+
+    The (usually compressed) archive is extracted once into raw .npy files in the cache directory, so that subsequent
+    loads start without decompression and all processes that load the same embeddings share the page cache.
+    """
+    from lsr_benchmark.cache import cached_directory
+
+    def extract(target_dir: Path):
+        with zipfile.ZipFile(npz_file) as archive:
+            for name in EMBEDDING_ARRAYS:
+                with archive.open(f"{name}.npy") as src, open(target_dir / f"{name}.npy", "wb") as target:
+                    shutil.copyfileobj(src, target, 16 * 1024 * 1024)
+
+    cache_dir = cached_directory(_embedding_cache_dir(npz_file), extract)
+    return {name: np.load(cache_dir / f"{name}.npy", mmap_mode="r") for name in EMBEDDING_ARRAYS}
+
+
+def memory_mapped_ids(ids_file: Path) -> IdTable:
+    """Load the ids of an embedding as memory-mapped IdTable, which is built once and then cached."""
+    from lsr_benchmark.cache import cache_home, cached_directory, file_checksum
+
+    cache_dir = cache_home() / "ids" / f"v{EMBEDDING_CACHE_VERSION}" / file_checksum(ids_file)
+    cached_directory(cache_dir, lambda target_dir: IdTable.from_file(ids_file).save(target_dir))
+    return IdTable.load(cache_dir)
+
+
+def _open_npy_member(archive: zipfile.ZipFile, name: str):
+    fp = archive.open(f"{name}.npy")
+    version = np.lib.format.read_magic(fp)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fp)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fp)
+    if fortran_order and len(shape) > 1:
+        raise ValueError(f"I can not stream the fortran ordered array {name}.")
+    return fp, dtype
+
+
+def _read_npy_values(member, count: int) -> np.ndarray:
+    fp, dtype = member
+    buffer = fp.read(int(count) * dtype.itemsize)
+    if len(buffer) != int(count) * dtype.itemsize:
+        raise ValueError("The embeddings archive is truncated.")
+    return np.frombuffer(buffer, dtype=dtype)
+
+
+def stream_embeddings(
+    npz_file: Path, ids: "IdTable | list[str]", chunk_size: int, token_type: str = "int"
+) -> "Iterator[SparseEmbeddingMatrix]":
+    """Stream blocks of chunk_size rows from an embeddings npz archive.
+
+    The arrays are decompressed incrementally, so that at most one block of the CSR arrays is held in memory.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"The chunk_size must be positive, got {chunk_size}.")
+
+    with zipfile.ZipFile(npz_file) as archive:
+        members = {name: _open_npy_member(archive, name) for name in EMBEDDING_ARRAYS}
+        try:
+            start = _read_npy_values(members["indptr"], 1)[0]
+            _read_npy_values(members["data"], start)
+            _read_npy_values(members["indices"], start)
+
+            for row in range(0, len(ids), chunk_size):
+                ends = _read_npy_values(members["indptr"], min(chunk_size, len(ids) - row))
+                indptr = np.concatenate(([start], ends)) - start
+                data = _read_npy_values(members["data"], indptr[-1])
+                indices = _read_npy_values(members["indices"], indptr[-1])
+                yield SparseEmbeddingMatrix(ids[row : row + chunk_size], data, indices, indptr, token_type)
+                start = ends[-1]
+        finally:
+            for fp, _ in members.values():
+                fp.close()
+
+
+def embedding_directory(dataset_id: str, model_name: str, text_type: str) -> Path:
+    """The directory with the embeddings npz archive and the ids of the documents or queries (text_type)."""
     if Path(model_name).is_dir() and (Path(model_name) / text_type).is_dir() and (Path(model_name) / text_type / f"{text_type}-embeddings.npz").exists():
         embedding_dir = Path(model_name) / text_type
     else:
@@ -41,8 +387,28 @@ def embeddings(
              embedding_dir = Path(embedding_dir) / text_type
         else:
             embedding_dir = tira.get_run_output(f"{TIRA_LSR_TASK_ID}/{team_name}/{model_name}", dataset_id) / text_type
+    return embedding_dir
+
+
+def embedding_files(dataset_id: str, model_name: str, text_type: str) -> "list[Path]":
+    """The files that contain the embeddings of the documents or queries (text_type), e.g., to fingerprint them."""
+    embedding_dir = embedding_directory(dataset_id, model_name, text_type)
+    return [embedding_dir / f"{text_type}-embeddings.npz", embedding_dir / f"{text_type}-ids.txt"]
 
-    embeddings = np.load(embedding_dir / f"{text_type}-embeddings.npz")
+
+def embeddings(
+    dataset_id: str, model_name: str, text_type: str, chunk_size: "Optional[int]" = None, token_type: str = "int"
+) -> "SparseEmbeddingMatrix | Iterator[SparseEmbeddingMatrix]":
+    """Load the embeddings of the documents or queries (text_type) of a dataset.
+
+    Without chunk_size, the complete embeddings are returned as memory-mapped SparseEmbeddingMatrix. With chunk_size,
+    an iterator over blocks of chunk_size rows is returned that holds only one block in memory at a time. The tokens
+    are the integer token ids (token_type="int") or their string representation (token_type="str").
+    """
+    if token_type not in TOKEN_TYPES:
+        raise ValueError(f"The token_type must be one of {TOKEN_TYPES}, got {token_type}.")
+
+    embedding_dir = embedding_directory(dataset_id, model_name, text_type)
 
     try:
         from tirex_tracker import register_file
@@ -51,31 +417,49 @@ def embeddings(
     except:
         pass
 
-    ids = (embedding_dir / f"{text_type}-ids.txt").read_text().strip().split("\n")
+    npz_file = embedding_dir / f"{text_type}-embeddings.npz"
+    try:
+        ids = memory_mapped_ids(embedding_dir / f"{text_type}-ids.txt")
+    except OSError:
+        ids = IdTable.from_file(embedding_dir / f"{text_type}-ids.txt")
+
+    if chunk_size is not None:
+        try:
+            is_cached = _embedding_cache_dir(npz_file).exists()
+        except OSError:
+            is_cached = False
+        if not is_cached:
+            return stream_embeddings(npz_file, ids, chunk_size, token_type)
+
+    try:
+        embeddings = memory_mapped_embeddings(npz_file)
+    except OSError:
+        # e.g., no writable cache directory in the sandbox
+        embeddings = np.load(npz_file)
+
+    ret = SparseEmbeddingMatrix(ids, embeddings["data"], embeddings["indices"], embeddings["indptr"], token_type)
+    return ret if chunk_size is None else ret.chunks(chunk_size)
 
-    ret = []
-    indices = embeddings["indices"].astype("U30")
-    data = embeddings["data"]
-
-    ptr_start = 0
-    for doc_id, ptr_end in tqdm(list(zip(ids, embeddings["indptr"][1:])), "load doc embeddings"):
-        tokens = indices[ptr_start:ptr_end]
-        values = data[ptr_start:ptr_end]
-        ptr_start = ptr_end
-        ret.append((doc_id, tokens, values))
-    return ret
+
+def in_tira_sandbox():
+    # same check as tira.third_party_integrations.in_tira_sandbox, which takes more than half a second to import
+    return "TIRA_INPUT_DATASET" in os.environ
 
 
 def ir_datasets_from_tira(force_reload=False):
+    """The ids of the datasets of the lsr-benchmark task in TIRA, cached on disk (see cache.cached_json)."""
     global _IR_DATASETS_FROM_TIRA
-    
+
     if in_tira_sandbox():
         return []
-    
+
     if _IR_DATASETS_FROM_TIRA is None or force_reload:
-        from tira.rest_api_client import Client
-        tira = Client()
-        _IR_DATASETS_FROM_TIRA = list(tira.datasets(TIRA_LSR_TASK_ID, force_reload).keys())
+        def fetch():
+            from tira.rest_api_client import Client
+            tira = Client()
+            return list(tira.datasets(TIRA_LSR_TASK_ID, force_reload).keys())
+
+        _IR_DATASETS_FROM_TIRA = cached_json("tira-datasets.json", fetch, force_reload=force_reload)
 
     return _IR_DATASETS_FROM_TIRA
 
@@ -132,6 +516,17 @@ class LsrBenchmarkSegmentedDocument(NamedTuple):
     def default_text(self):
         return self.segment.text
 
+    @staticmethod
+    def segment_id(doc_id: str, idx: int) -> str:
+        return f"{doc_id}___{idx}___"
+
+    @staticmethod
+    def parse_segment_id(segment_id: str) -> "tuple[str, int]":
+        doc_id, separator, rest = segment_id[:-3].rpartition("___")
+        if not separator or not segment_id.endswith("___") or not rest.isdigit():
+            raise KeyError(f"The id {segment_id} is not a valid segment id.")
+        return doc_id, int(rest)
+
 
 
 class LsrBenchmarkQueries(BaseQueries):
@@ -143,6 +538,8 @@ class LsrBenchmarkQueries(BaseQueries):
         if not self.__queries_file:
             self.__queries_file = _dowload_from_tira(self.__irds_id, False) / "queries.jsonl"
 
+        from tira.check_format import QueryProcessorFormat
+
         for l in QueryProcessorFormat().all_lines(self.__queries_file):
             yield GenericQuery(l["qid"], l["query"])
 
@@ -152,39 +549,305 @@ class LsrBenchmarkQueryEmbedding(NamedTuple):
     embedding: np.array
 
 
+def _build_corpus_index(corpus_file: Path, target_dir: Path):
+    """Re-compress the corpus into small, independently compressed gzip blocks and record the position of each doc.
+
+    The result is still a valid (multi-member) gzip file, but every document can be read by decompressing only the
+    block that contains it.
+    """
+    block_offsets, doc_blocks, doc_starts, doc_ends, doc_segments, ids = [0], [], [], [], [0], []
+    block = bytearray()
+
+    with gzip.open(corpus_file, "rb") as corpus, open(target_dir / "corpus.jsonl.gz", "wb") as target:
+
+        def flush():
+            compressor = zlib.compressobj(wbits=31)
+            target.write(compressor.compress(bytes(block)) + compressor.flush())
+            block_offsets.append(target.tell())
+            block.clear()
+
+        for line in corpus:
+            if not line.strip():
+                continue
+            json_doc = _json_loads(line)
+            ids.append(json_doc["doc_id"])
+            doc_segments.append(doc_segments[-1] + len(json_doc["segments"]))
+            doc_blocks.append(len(block_offsets) - 1)
+            doc_starts.append(len(block))
+            block.extend(line)
+            doc_ends.append(len(block))
+            if len(block) >= CORPUS_BLOCK_SIZE:
+                flush()
+        if block:
+            flush()
+
+    arrays = {
+        "block-offsets": np.array(block_offsets, dtype=np.int64),
+        "doc-blocks": np.array(doc_blocks, dtype=np.int64),
+        "doc-starts": np.array(doc_starts, dtype=np.int32),
+        "doc-ends": np.array(doc_ends, dtype=np.int32),
+        "doc-segments": np.array(doc_segments, dtype=np.int64),
+    }
+    for name in CORPUS_INDEX_ARRAYS:
+        np.save(target_dir / f"{name}.npy", arrays[name])
+    IdTable.from_ids(ids).save(target_dir)
+
+
+class LsrBenchmarkDocsStore(Docstore):
+    """Random access to the documents of a corpus.jsonl.gz via an offset index that is built once and then cached."""
+
+    def __init__(self, corpus_file: Path):
+        super().__init__(LsrBenchmarkDocument, "doc_id")
+        self.__corpus_file = corpus_file
+        self.__index_dir = None
+        self.__ids = None
+        self.__arrays = None
+
+    def __cache_dir(self) -> Path:
+        from lsr_benchmark.cache import cache_home, file_checksum
+
+        if self.__index_dir is None:
+            self.__index_dir = (
+                cache_home() / "corpus" / f"v{CORPUS_INDEX_VERSION}" / file_checksum(self.__corpus_file)
+            )
+        return self.__index_dir
+
+    def built(self) -> bool:
+        return self.__cache_dir().exists()
+
+    def build(self):
+        from lsr_benchmark.cache import cached_directory
+
+        if self.__arrays is None:
+            cache_dir = cached_directory(
+                self.__cache_dir(), lambda target_dir: _build_corpus_index(self.__corpus_file, target_dir)
+            )
+            self.__ids = IdTable.load(cache_dir)
+            self.__arrays = {name: np.load(cache_dir / f"{name}.npy", mmap_mode="r") for name in CORPUS_INDEX_ARRAYS}
+
+    def count(self) -> int:
+        self.build()
+        return len(self.__ids)
+
+    def segment_count(self) -> int:
+        self.build()
+        return int(self.__arrays["doc-segments"][-1])
+
+    def segments_of(self, doc_id: str) -> int:
+        self.build()
+        row = self.__ids.row_of(doc_id)
+        return int(self.__arrays["doc-segments"][row + 1] - self.__arrays["doc-segments"][row])
+
+    def get_many_iter(self, doc_ids):
+        self.build()
+        rows = sorted(self.__ids.row_of(i) for i in set(doc_ids) if i in self.__ids)
+        block_offsets = self.__arrays["block-offsets"]
+        block_id, block = None, None
+
+        with open(self.__cache_dir() / "corpus.jsonl.gz", "rb") as corpus:
+            for row in rows:
+                if self.__arrays["doc-blocks"][row] != block_id:
+                    block_id = self.__arrays["doc-blocks"][row]
+                    corpus.seek(block_offsets[block_id])
+                    block = zlib.decompress(corpus.read(block_offsets[block_id + 1] - block_offsets[block_id]), 31)
+                line = block[self.__arrays["doc-starts"][row] : self.__arrays["doc-ends"][row]]
+                yield LsrBenchmarkDocument._from_json(_json_loads(line))
+
+
+def _parse_corpus_lines(lines: "list[bytes]", validate: bool) -> "list[LsrBenchmarkDocument]":
+    ret = []
+    for line in lines:
+        if not line.strip():
+            continue
+        json_doc = _json_loads(line)
+        if validate and (not isinstance(json_doc, dict) or any(i not in json_doc for i in CORPUS_REQUIRED_FIELDS)):
+            raise ValueError(f"The document {line[:100]} does not have the required fields {CORPUS_REQUIRED_FIELDS}.")
+        ret.append(LsrBenchmarkDocument._from_json(json_doc))
+    return ret
+
+
+def _corpus_batches(corpus_file: Path, batch_size: int) -> "Iterator[list[bytes]]":
+    with gzip.open(corpus_file, "rb") as corpus:
+        batch = []
+        for line in corpus:
+            batch.append(line)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def _count_corpus_lines(corpus_file: Path) -> int:
+    """The number of (non-empty) lines, i.e., documents, of the corpus.jsonl.gz."""
+    with gzip.open(corpus_file, "rb") as corpus:
+        return sum(1 for line in corpus if line.strip())
+
+
+def _prefetch(iterator: Iterator, size: int) -> Iterator:
+    """Consume the iterator in a background thread, holding at most size elements in memory."""
+    import queue
+    import threading
+
+    buffer, done, stop = queue.Queue(maxsize=size), object(), threading.Event()
+    failure = []
+
+    def put(item) -> bool:
+        # a full buffer is retried until the consumer stops (e.g., a closed docs_iter), so the thread does not block
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for i in iterator:
+                if not put(i):
+                    return
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            put(done)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while (i := buffer.get()) is not done:
+            yield i
+    finally:
+        stop.set()
+        producer.join()
+        while not buffer.empty():
+            buffer.get_nowait()
+        if hasattr(iterator, "close"):
+            iterator.close()
+    if failure:
+        raise failure[0]
+
+
+def parse_corpus(
+    corpus_file: Path, workers: int = 1, validate: bool = True, batch_size: int = 1000
+) -> "Iterator[LsrBenchmarkDocument]":
+    """Stream the documents of a corpus.jsonl.gz in order.
+
+    With workers > 1, the corpus is decompressed in a background thread while batches of lines are parsed (with
+    orjson, if installed) in a pool of worker processes.
+    """
+    if workers <= 1:
+        for batch in _corpus_batches(corpus_file, batch_size):
+            yield from _parse_corpus_lines(batch, validate)
+        return
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for batch in _prefetch(_corpus_batches(corpus_file, batch_size), 2 * workers):
+            pending.append(pool.submit(_parse_corpus_lines, batch, validate))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+class LsrBenchmarkSegmentedDocsStore(Docstore):
+    """Random access to the segments of documents via the segment table of the LsrBenchmarkDocsStore."""
+
+    def __init__(self, docs_store: LsrBenchmarkDocsStore):
+        super().__init__(LsrBenchmarkSegmentedDocument, "doc_id")
+        self.__docs_store = docs_store
+
+    def built(self) -> bool:
+        return self.__docs_store.built()
+
+    def build(self):
+        self.__docs_store.build()
+
+    def count(self) -> int:
+        return self.__docs_store.segment_count()
+
+    def get_many_iter(self, doc_ids):
+        doc_to_segments = {}
+        for segment_id in doc_ids:
+            try:
+                doc_id, idx = LsrBenchmarkSegmentedDocument.parse_segment_id(segment_id)
+            except KeyError:
+                continue
+            doc_to_segments.setdefault(doc_id, set()).add(idx)
+
+        for doc in self.__docs_store.get_many_iter(doc_to_segments.keys()):
+            for idx in sorted(doc_to_segments[doc.doc_id]):
+                if idx < len(doc.segments):
+                    yield LsrBenchmarkSegmentedDocument(
+                        LsrBenchmarkSegmentedDocument.segment_id(doc.doc_id, idx), doc.segments[idx]
+                    )
+
+
 class LsrBenchmarkDocuments(BaseDocs):
     def __init__(self, irds_id):
         self.__corpus_file = None
         self.__docs = None
+        self.__docs_store = None
         self.__irds_id = irds_id
 
-    def docs_iter(self):
-        for l in self.docs():
-            yield LsrBenchmarkDocument._from_json(l)
+    def docs_iter(self, workers: int = 1, validate: bool = True):
+        return parse_corpus(self.corpus_file(), workers, validate)
+
+    def corpus_file(self) -> Path:
+        if not self.__corpus_file:
+            self.__corpus_file = _dowload_from_tira(self.__irds_id, False) / "corpus.jsonl.gz"
+        return self.__corpus_file
 
     def docs(self):
         if not self.__docs:
-            if not self.__corpus_file:
-                self.__corpus_file = _dowload_from_tira(self.__irds_id, False) / "corpus.jsonl.gz"
+            from tira.check_format import JsonlFormat
+
             reader = JsonlFormat()
             reader.apply_configuration_and_throw_if_invalid(
                 {"required_fields": ["doc_id", "segments"], "max_size_mb": 2500}
             )
-            self.__docs = reader.all_lines(self.__corpus_file)
+            self.__docs = reader.all_lines(self.corpus_file())
         return self.__docs
 
+    def docs_cls(self):
+        return LsrBenchmarkDocument
+
+    def docs_store(self, field="doc_id", options=None):
+        if self.__docs_store is None:
+            self.__docs_store = LsrBenchmarkDocsStore(self.corpus_file())
+        return self.__docs_store
+
     def docs_count(self):
-        return len([1 for i in self.docs_iter()])
+        # counting the lines is much cheaper than building the random access index, so it is only used if already built
+        if self.docs_store().built():
+            return self.docs_store().count()
+        return _count_corpus_lines(self.corpus_file())
 
 
 class LsrBenchmarkSegmentedDocuments(LsrBenchmarkDocuments):
-    def docs_iter(self, embedding=None):
-        for doc in super().docs_iter(embedding):
-            for idx, segment in zip(range(len(doc.segments)), doc.segments):
-                yield LsrBenchmarkSegmentedDocument(f"{doc.doc_id}___{idx}___", segment)
+    def __init__(self, irds_id):
+        super().__init__(irds_id)
+        self.__segmented_docs_store = None
+
+    def docs_iter(self, workers: int = 1, validate: bool = True):
+        for doc in super().docs_iter(workers, validate):
+            for idx, segment in enumerate(doc.segments):
+                yield LsrBenchmarkSegmentedDocument(LsrBenchmarkSegmentedDocument.segment_id(doc.doc_id, idx), segment)
+
+    def docs_cls(self):
+        return LsrBenchmarkSegmentedDocument
+
+    def docs_store(self, field="doc_id", options=None):
+        if self.__segmented_docs_store is None:
+            self.__segmented_docs_store = LsrBenchmarkSegmentedDocsStore(super().docs_store())
+        return self.__segmented_docs_store
 
     def docs_count(self):
-        return len([1 for i in self.docs_iter()])
+        return self.docs_store().count()
 
 
 class LsrBenchmarkDataset(Dataset):
@@ -211,11 +874,21 @@ class LsrBenchmarkDataset(Dataset):
         super().__init__(docs, queries, qrels_obj, documentation)
         self.metadata = MetadataComponent(ir_datasets_id, self)
 
-    def query_embeddings(self, model_name: str) -> tuple[np.ndarray, np.ndarray, np.ndarray, list[str]]:
-        return embeddings(self.__irds_id, model_name, "query")
+    def query_embeddings(
+        self, model_name: str, chunk_size: "Optional[int]" = None, token_type: str = "int"
+    ) -> "SparseEmbeddingMatrix | Iterator[SparseEmbeddingMatrix]":
+        return embeddings(self.__irds_id, model_name, "query", chunk_size, token_type)
+
+    def doc_embeddings(
+        self, model_name: str, chunk_size: "Optional[int]" = None, token_type: str = "int"
+    ) -> "SparseEmbeddingMatrix | Iterator[SparseEmbeddingMatrix]":
+        return embeddings(self.__irds_id, model_name, "doc", chunk_size, token_type)
 
-    def doc_embeddings(self, model_name: str) -> tuple[np.ndarray, np.ndarray, np.ndarray, list[str]]:
-        return embeddings(self.__irds_id, model_name, "doc")
+    def doc_embedding_files(self, model_name: str) -> "list[Path]":
+        return embedding_files(self.__irds_id, model_name, "doc")
+
+    def query_embedding_files(self, model_name: str) -> "list[Path]":
+        return embedding_files(self.__irds_id, model_name, "query")
 
 
 def extract_zip(zip_file: Path, target_directory: Path):
@@ -230,13 +903,20 @@ def extract_zip(zip_file: Path, target_directory: Path):
         zip_ref.extractall(target_directory)
 
 
-def build_dataset(ir_datasets_id: str, segmented: bool):
+def build_dataset(ir_datasets_id: str, segmented: bool, format: str = "jsonl"):
+    if format not in ("jsonl", "arrow"):
+        raise ValueError(f"The format must be jsonl or arrow, got {format}.")
     try:
         from tirex_tracker import register_metadata
         register_metadata({"data": {"test collection": {"name": ir_datasets_id}}})
     except:
         pass
 
+    if format == "arrow":
+        from lsr_benchmark.arrow import LsrBenchmarkArrowDataset
+
+        return LsrBenchmarkArrowDataset(ir_datasets_id, segmented=segmented)
+
     return LsrBenchmarkDataset(
         ir_datasets_id=ir_datasets_id,
         segmented=segmented,
@@ -0,0 +1,92 @@
+"""Per-query latencies of retrieval engines, in addition to the aggregated runtime tracked by the tirex-tracker.
+
+Usage in the step-03 scripts (track_latency has to be the outer context, so that the metadata file of the tracking
+already exists when the latencies are added to it):
+
+    with track_latency(output) as latency, tracking(export_file_path=output / "retrieval-metadata.yml", ...):
+        for query_id, tokens, values in query_embeddings:
+            with latency.query(query_id):
+                ...
+"""
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, TYPE_CHECKING
+
+import numpy as np
+
+from lsr_benchmark.cache import add_resources_to_metadata
+
+if TYPE_CHECKING:
+    from lsr_benchmark.batch import QueryResult
+
+LATENCY_FILE = "query-latencies.tsv"
+METADATA_FILE = "retrieval-metadata.yml"
+PERCENTILES = (50, 90, 99)
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self.query_ids: "list[str]" = []
+        self.latencies: "list[float]" = []
+        self.__start = time.perf_counter()
+        self.__end = self.__start
+
+    def record(self, query_id: str, seconds: float):
+        self.query_ids.append(query_id)
+        self.latencies.append(seconds)
+        self.__end = time.perf_counter()
+
+    @contextmanager
+    def query(self, query_id: str):
+        start = time.perf_counter()
+        yield
+        self.record(query_id, time.perf_counter() - start)
+
+    @contextmanager
+    def batch(self, query_ids: "Iterable[str]"):
+        """For engines that only search batches of queries: each query of the batch gets the amortized latency."""
+        query_ids = list(query_ids)
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        for query_id in query_ids:
+            self.record(query_id, elapsed / max(1, len(query_ids)))
+
+    def extend(self, results: "list[QueryResult]") -> "list[QueryResult]":
+        """Record the latencies measured by lsr_benchmark.batch.batch_search and return its results."""
+        for i in results:
+            self.record(i.query_id, i.latency)
+        return results
+
+    def summary(self) -> "dict[str, str | int | float]":
+        """Percentiles and maximum of the latencies (formatted like the runtime of the tirex-tracker) and the QPS."""
+        if not self.latencies:
+            return {"queries": 0}
+        latencies = np.array(self.latencies) * 1000
+        ret = {"queries": len(latencies)}
+        for percentile, value in zip(PERCENTILES, np.percentile(latencies, PERCENTILES)):
+            ret[f"p{percentile}"] = f"{value:.3f} ms"
+        ret["max"] = f"{latencies.max():.3f} ms"
+        wallclock = self.__end - self.__start
+        ret["qps"] = round(len(latencies) / wallclock, 3) if wallclock > 0 else None
+        return ret
+
+    def write(self, latency_file: Path):
+        with open(latency_file, "w") as f:
+            f.write("query_id\tlatency_ms\n")
+            for query_id, seconds in zip(self.query_ids, self.latencies):
+                f.write(f"{query_id}\t{seconds * 1000:.3f}\n")
+
+
+def add_latencies_to_metadata(metadata_file: Path, summary: "dict[str, str | int | float]"):
+    add_resources_to_metadata(metadata_file, "latency", summary)
+
+
+@contextmanager
+def track_latency(output: Path, metadata_file: str = METADATA_FILE):
+    """Write the per-query latencies to output/query-latencies.tsv and their summary to the retrieval metadata."""
+    recorder = LatencyRecorder()
+    yield recorder
+    recorder.write(Path(output) / LATENCY_FILE)
+    add_latencies_to_metadata(Path(output) / metadata_file, recorder.summary())
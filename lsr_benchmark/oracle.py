@@ -0,0 +1,155 @@
+"""The exact top-k of each query by brute force over the CSR embeddings, to measure the fidelity of approximate engines.
+
+The oracle shares no code with the retrieval engines: the documents are transposed chunk by chunk into token-major
+order, the scores of all documents of the chunk that share a token with the query are summed up without any pruning,
+and a running top-k per query is merged across chunks. The exact runs are cached per dataset, embedding, and k (keyed by
+a content hash of the embeddings), so that ann_recall@k of many runs only computes the oracle once.
+"""
+import hashlib
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, TYPE_CHECKING
+
+import numpy as np
+
+from lsr_benchmark.irds import SparseEmbeddingMatrix
+from lsr_benchmark.runs import RunRows, read_trec_run, top_k_rows, write_trec_run
+
+if TYPE_CHECKING:
+    from typing import Optional
+
+ORACLE_VERSION = 1
+# number of documents that are transposed at once, and number of queries per task of the thread pool
+DOC_CHUNK_SIZE = 1_000_000
+QUERY_BATCH_SIZE = 32
+
+
+def _top_k(scores: np.ndarray, rows: np.ndarray, k: int) -> "tuple[np.ndarray, np.ndarray]":
+    """The top-k scores (and their rows) of each line, sorted by descending score and ascending row."""
+    if scores.shape[1] > k:
+        # the candidates are all scores of at least the k-th largest score, so that ties with the k-th score are
+        # broken by the row (and not by argpartition)
+        kth = np.partition(scores, scores.shape[1] - k, axis=1)[:, scores.shape[1] - k, None]
+        candidates = scores >= kth
+        width = int(candidates.sum(axis=1).max())
+        if width < scores.shape[1]:
+            keep = np.argpartition(~candidates, width - 1, axis=1)[:, :width]
+            scores, rows = np.take_along_axis(scores, keep, axis=1), np.take_along_axis(rows, keep, axis=1)
+    order = np.lexsort((rows, -scores), axis=1)[:, :k]
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(rows, order, axis=1)
+
+
+def _transpose(chunk: SparseEmbeddingMatrix, vocabulary: int) -> "tuple[np.ndarray, np.ndarray, np.ndarray]":
+    """The token offsets, documents, and values of the chunk in token-major order (CSC)."""
+    tokens = np.asarray(chunk.indices, dtype=np.int64)
+    docs = np.repeat(np.arange(len(chunk), dtype=np.int64), np.diff(np.asarray(chunk.indptr)))
+    order = np.argsort(tokens, kind="stable")
+    offsets = np.zeros(vocabulary + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tokens, minlength=vocabulary), out=offsets[1:])
+    return offsets, docs[order], np.asarray(chunk.data, dtype=np.float32)[order]
+
+
+def _search_batch(
+    postings: "tuple[np.ndarray, np.ndarray, np.ndarray]", num_docs: int, queries: SparseEmbeddingMatrix, k: int
+) -> "tuple[np.ndarray, np.ndarray]":
+    """The top-k scores and rows of the documents of one chunk for a batch of queries."""
+    offsets, docs, values = postings
+    width = min(k, num_docs)
+    ret_scores = np.full((len(queries), width), -np.inf, dtype=np.float32)
+    ret_rows = np.full((len(queries), width), -1, dtype=np.int64)
+    for i, query in enumerate(queries):
+        matches = [slice(offsets[t], offsets[t + 1]) for t in np.asarray(query.tokens, dtype=np.int64)]
+        if width == 0 or not matches:
+            continue
+        # only documents that share a token with the query can have a score other than zero
+        candidates, positions = np.unique(np.concatenate([docs[m] for m in matches]), return_inverse=True)
+        weights = np.concatenate([values[m] * w for m, w in zip(matches, np.asarray(query.values, dtype=np.float32))])
+        scores = np.bincount(positions, weights, minlength=len(candidates)).astype(np.float32)
+        top_scores, top_rows = _top_k(scores[None, :], candidates[None, :], width)
+        ret_scores[i, : top_scores.shape[1]], ret_rows[i, : top_rows.shape[1]] = top_scores[0], top_rows[0]
+    return ret_scores, ret_rows
+
+
+def exact_top_k(
+    doc_embeddings: SparseEmbeddingMatrix,
+    query_embeddings: SparseEmbeddingMatrix,
+    k: int = 10,
+    threads: "Optional[int]" = None,
+    doc_chunk_size: int = DOC_CHUNK_SIZE,
+) -> RunRows:
+    """The exact top-k documents of all queries (documents with a score of zero are not retrieved)."""
+    if k < 1:
+        raise ValueError(f"The k must be positive, got {k}.")
+    vocabulary = 1 + max(
+        int(np.max(doc_embeddings.indices, initial=0)), int(np.max(query_embeddings.indices, initial=0))
+    )
+    batches = list(query_embeddings.chunks(QUERY_BATCH_SIZE))
+    best = [(np.empty((len(i), 0), np.float32), np.empty((len(i), 0), np.int64)) for i in batches]
+
+    threads = os.cpu_count() if threads is None else threads
+    with ThreadPoolExecutor(max(1, threads)) as pool:
+        for start in range(0, len(doc_embeddings), doc_chunk_size):
+            chunk = doc_embeddings[start : start + doc_chunk_size]
+            postings = _transpose(chunk, vocabulary)
+
+            def search(batch: int) -> "tuple[np.ndarray, np.ndarray]":
+                scores, rows = _search_batch(postings, len(chunk), batches[batch], k)
+                # merge with the top-k of the previous chunks
+                return _top_k(
+                    np.concatenate([best[batch][0], scores], axis=1),
+                    np.concatenate([best[batch][1], np.where(rows >= 0, rows + start, -1)], axis=1),
+                    k,
+                )
+
+            best = list(pool.map(search, range(len(batches))))
+
+    return RunRows.concatenate(
+        top_k_rows(queries.ids, scores, rows, doc_embeddings.ids) for queries, (scores, rows) in zip(batches, best)
+    )
+
+
+def exact_run(dataset, embedding: str, k: int = 10, threads: "Optional[int]" = None) -> RunRows:
+    """The exact top-k run of the embeddings of the dataset, cached in the cache_home."""
+    from lsr_benchmark.cache import cache_home, cached_directory
+    from lsr_benchmark.index_cache import embedding_fingerprint
+
+    def compute() -> RunRows:
+        doc_embeddings = dataset.doc_embeddings(model_name=embedding)
+        return exact_top_k(doc_embeddings, dataset.query_embeddings(model_name=embedding), k, threads)
+
+    def build(target_dir: Path):
+        write_trec_run(target_dir / "run.txt.gz", compute(), "exact")
+
+    files = dataset.doc_embedding_files(embedding) + dataset.query_embedding_files(embedding)
+    key = hashlib.sha256(f"v{ORACLE_VERSION}:{embedding_fingerprint(files)}:{k}".encode()).hexdigest()
+    try:
+        cache_dir = cached_directory(cache_home() / "oracle" / key, build)
+    except OSError:
+        # e.g., no writable cache directory in the sandbox
+        return compute()
+    return read_trec_run(cache_dir / "run.txt.gz")
+
+
+def ann_recall(run: "Iterable[tuple[str, str, float]]", exact: RunRows, k: int) -> "Optional[float]":
+    """The fraction of the exact top-k documents that the top-k of the run contains, averaged over the queries.
+
+    The run is an iterable of (query_id, doc_id, score) tuples, e.g., the ScoredDocs of ir_measures. Queries without
+    any exact result (i.e., no document shares a token with the query) are skipped.
+    """
+    expected: "dict[str, set[str]]" = defaultdict(set)
+    for query_id, doc_id, rank in zip(exact.query_ids.tolist(), exact.doc_ids.tolist(), exact.ranks.tolist()):
+        if rank <= k:
+            expected[query_id].add(doc_id)
+
+    retrieved: "dict[str, list[tuple[float, str]]]" = defaultdict(list)
+    for query_id, doc_id, score in run:
+        if query_id in expected:
+            retrieved[query_id].append((-float(score), doc_id))
+
+    recalls = []
+    for query_id, docs in expected.items():
+        top_k = {doc_id for _, doc_id in sorted(retrieved[query_id])[:k]}
+        recalls.append(len(top_k & docs) / len(docs))
+    return float(np.mean(recalls)) if recalls else None
@@ -0,0 +1,369 @@
+"""Runs of retrieval engines: turn top-k arrays into run rows, and write and read them in the TREC format.
+
+Runs are written in blocks (via pyarrow, if installed, otherwise via f-strings) with a faster gzip level than the
+default of gzip.open, or with zstd for files that end with .zst. Runs are read in blocks into a ColumnarRun, whose query
+and document ids are dictionary encoded, so that deep runs (e.g., k=1000) cost a few bytes per row instead of one
+ScoredDoc object per row. The scores are read as float64 (as trec_eval does), so that scores of other engines that only
+differ beyond the precision of float32 are not tied. Usage in the step-03 scripts:
+
+    with RunWriter(output / "run.txt.gz", "my-engine") as run:
+        for query_id, doc_ids, scores in results:
+            run.add(query_id, doc_ids, scores)
+"""
+import gzip
+import io
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Iterable, Iterator, NamedTuple, Union
+
+import numpy as np
+
+from lsr_benchmark.irds import IdTable
+
+if TYPE_CHECKING:
+    from typing import Optional
+
+# zlib's default level: about 3x faster than level 9 of gzip.open for runs that are only 0.5% larger
+DEFAULT_COMPRESSLEVEL = 6
+# number of rows that are formatted/parsed at once
+BLOCK_SIZE = 100_000
+
+RunFile = Union[Path, str, IO[bytes]]
+
+
+class RunRows(NamedTuple):
+    """The rows of a run as parallel arrays (one entry per retrieved document)."""
+
+    query_ids: np.ndarray
+    doc_ids: np.ndarray
+    ranks: np.ndarray
+    scores: np.ndarray
+
+    @staticmethod
+    def concatenate(runs: "Iterable[RunRows]") -> "RunRows":
+        runs = list(runs)
+        if not runs:
+            return RunRows(np.empty(0, "U1"), np.empty(0, "U1"), np.empty(0, np.int64), np.empty(0, np.float32))
+        return RunRows(*(np.concatenate([getattr(i, field) for i in runs]) for field in RunRows._fields))
+
+    def __len__(self) -> int:
+        return len(self.query_ids)
+
+
+class ColumnarRun(NamedTuple):
+    """A run with dictionary encoded ids: the i-th row retrieved doc_ids[doc_codes[i]] for query_ids[query_codes[i]]."""
+
+    query_ids: np.ndarray
+    doc_ids: np.ndarray
+    query_codes: np.ndarray
+    doc_codes: np.ndarray
+    ranks: np.ndarray
+    scores: np.ndarray
+
+    @staticmethod
+    def from_rows(rows: RunRows) -> "ColumnarRun":
+        query_ids, query_codes = np.unique(np.asarray(rows.query_ids, dtype=str), return_inverse=True)
+        doc_ids, doc_codes = np.unique(np.asarray(rows.doc_ids, dtype=str), return_inverse=True)
+        return ColumnarRun(
+            query_ids,
+            doc_ids,
+            query_codes.astype(np.int32),
+            doc_codes.astype(np.int32),
+            np.asarray(rows.ranks, dtype=np.int32),
+            np.asarray(rows.scores, dtype=np.float64),
+        )
+
+    @staticmethod
+    def concatenate(runs: "Iterable[ColumnarRun]") -> "ColumnarRun":
+        """Concatenate the rows of the runs (the ids of the runs are merged into one dictionary)."""
+        runs = list(runs)
+        if not runs:
+            return ColumnarRun.from_rows(RunRows.concatenate([]))
+        if len(runs) == 1:
+            return runs[0]
+
+        def merge(ids: "list[np.ndarray]", codes: "list[np.ndarray]") -> "tuple[np.ndarray, np.ndarray]":
+            merged, positions = np.unique(np.concatenate(ids), return_inverse=True)
+            starts = np.cumsum([0] + [len(i) for i in ids[:-1]])
+            return merged, np.concatenate([positions[start:][c] for start, c in zip(starts, codes)]).astype(np.int32)
+
+        query_ids, query_codes = merge([i.query_ids for i in runs], [i.query_codes for i in runs])
+        doc_ids, doc_codes = merge([i.doc_ids for i in runs], [i.doc_codes for i in runs])
+        return ColumnarRun(
+            query_ids,
+            doc_ids,
+            query_codes,
+            doc_codes,
+            np.concatenate([i.ranks for i in runs]),
+            np.concatenate([i.scores for i in runs]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.query_codes)
+
+    def rows(self) -> RunRows:
+        return RunRows(self.query_ids[self.query_codes], self.doc_ids[self.doc_codes], self.ranks, self.scores)
+
+    def scored_docs(self) -> "Iterator[tuple[str, str, float]]":
+        """The (query_id, doc_id, score) of each row, e.g., for ir_measures or lsr_benchmark.oracle.ann_recall."""
+        rows = self.rows()
+        return zip(rows.query_ids.tolist(), rows.doc_ids.tolist(), rows.scores.tolist())
+
+    def to_dict(self) -> "dict[str, dict[str, float]]":
+        """The run as {query_id: {doc_id: score}}, the format that ir_measures evaluates fastest."""
+        order = np.argsort(self.query_codes, kind="stable")
+        codes = self.query_codes[order]
+        boundaries = np.flatnonzero(np.diff(codes)) + 1
+        doc_ids, scores = self.doc_ids[self.doc_codes[order]].tolist(), self.scores[order].tolist()
+        ret = {}
+        for start, end in zip(np.concatenate([[0], boundaries]).tolist(), np.concatenate([boundaries, [len(codes)]]).tolist()):
+            if end > start:
+                ret[str(self.query_ids[codes[start]])] = dict(zip(doc_ids[start:end], scores[start:end]))
+        return ret
+
+
+def top_k_rows(query_ids: "IdTable | Iterable[str]", scores, rows, doc_ids: IdTable) -> RunRows:
+    """Convert the top-k scores and document rows of a batch of queries (two num_queries x k arrays) into run rows.
+
+    The i-th row of scores/rows belongs to the i-th query id, i.e., pass the ids of exactly the queries of the batch.
+    Hits with a score of zero (or -inf/NaN) or a negative row (padding) are dropped, ranks start at 1 per query.
+    """
+    scores, rows = np.asarray(scores), np.asarray(rows)
+    query_ids = np.asarray(list(query_ids))
+    if scores.shape != rows.shape or scores.ndim != 2 or len(query_ids) != scores.shape[0]:
+        raise ValueError(
+            f"I expected scores and rows of shape ({len(query_ids)}, k), but got {scores.shape} and {rows.shape}."
+        )
+
+    valid = np.isfinite(scores) & (scores != 0) & (rows >= 0)
+    ranks = np.cumsum(valid, axis=1)
+    return RunRows(
+        np.repeat(query_ids, valid.sum(axis=1)),
+        doc_ids.ids_of(rows[valid]),
+        ranks[valid],
+        scores[valid],
+    )
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute  # noqa: F401
+        import pyarrow.csv  # noqa: F401
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _open(run_file: "Path | str", mode: str, compresslevel: int = DEFAULT_COMPRESSLEVEL) -> "IO[bytes]":
+    """Open the (gzip or zstd compressed, depending on the suffix) run file in binary mode."""
+    if str(run_file).endswith(".gz"):
+        return gzip.open(run_file, mode + "b", compresslevel=compresslevel)
+    if str(run_file).endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("Runs compressed with zstd require zstandard. Please install it via 'pip3 install zstandard'.")
+        return zstandard.open(run_file, mode + "b", cctx=zstandard.ZstdCompressor(level=compresslevel))
+    return open(run_file, mode + "b")
+
+
+def _format_rows(rows: RunRows, tag: str) -> bytes:
+    """The rows in the TREC format, the scores in the shortest format that parses to the same float32 (if the scores are
+    float32) or float64 score (otherwise, e.g., the sums of DuckDB), so that no ties are introduced."""
+    pa = _pyarrow()
+    scores = np.asarray(rows.scores)
+    if scores.dtype != np.float32:
+        scores = scores.astype(np.float64)
+    if pa is None:
+        # str of a NumPy float32 is its shortest representation, str of a Python float the one of the float64
+        return "".join(
+            f"{query_id} Q0 {doc_id} {rank} {score} {tag}\n"
+            for query_id, doc_id, rank, score in zip(
+                np.asarray(rows.query_ids).tolist(),
+                np.asarray(rows.doc_ids).tolist(),
+                np.asarray(rows.ranks).tolist(),
+                map(str, scores if scores.dtype == np.float32 else scores.tolist()),
+            )
+        ).encode("utf-8")
+
+    # all rows are joined into one string array (without nulls), whose data buffer is the content of the file
+    lines = pa.compute.binary_join_element_wise(
+        pa.array(np.asarray(rows.query_ids, dtype=str), pa.string()),
+        "Q0",
+        pa.array(np.asarray(rows.doc_ids, dtype=str), pa.string()),
+        pa.compute.cast(pa.array(np.asarray(rows.ranks)), pa.string()),
+        pa.compute.cast(pa.array(scores), pa.string()),
+        f"{tag}\n",
+        " ",
+    )
+    offsets = np.frombuffer(lines.buffers()[1], dtype=np.int32, count=len(lines) + 1, offset=lines.offset * 4)
+    return lines.buffers()[2].to_pybytes()[offsets[0] : offsets[-1]]
+
+
+class RunWriter:
+    """Write a run in the TREC format in blocks (gzip compressed if the file name ends with .gz, zstd for .zst)."""
+
+    def __init__(self, run_file: "Path | str", tag: str, compresslevel: int = DEFAULT_COMPRESSLEVEL):
+        self.run_file = run_file
+        self.tag = tag
+        self.compresslevel = compresslevel
+        self.__file: "Optional[IO[bytes]]" = None
+        self.__blocks: "list[RunRows]" = []
+        self.__rows = 0
+
+    def __enter__(self) -> "RunWriter":
+        self.__file = _open(self.run_file, "w", self.compresslevel)
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+        self.__file.close()
+
+    def add(self, query_id: str, doc_ids: "Iterable[str]", scores: "Iterable[float]"):
+        """Add the ranking of one query (ranks start at 1 in the order of the doc_ids)."""
+        doc_ids, scores = np.asarray(list(doc_ids), dtype=str), np.asarray(list(scores))
+        if len(doc_ids) != len(scores):
+            raise ValueError(f"I expected as many doc_ids as scores, but got {len(doc_ids)} and {len(scores)}.")
+        self.add_rows(RunRows(np.full(len(doc_ids), query_id), doc_ids, np.arange(1, len(doc_ids) + 1), scores))
+
+    def add_rows(self, rows: RunRows):
+        self.__blocks.append(rows)
+        self.__rows += len(rows)
+        if self.__rows >= BLOCK_SIZE:
+            self.flush()
+
+    def flush(self):
+        rows = RunRows.concatenate(self.__blocks)
+        self.__blocks, self.__rows = [], 0
+        for start in range(0, len(rows), BLOCK_SIZE):
+            self.__file.write(_format_rows(RunRows(*(i[start : start + BLOCK_SIZE] for i in rows)), self.tag))
+
+
+def write_trec_run(run_file: "Path | str", run: RunRows, tag: str, compresslevel: int = DEFAULT_COMPRESSLEVEL):
+    """Write the run in the TREC format (gzipped if the file name ends with .gz, zstd for .zst)."""
+    with RunWriter(run_file, tag, compresslevel) as writer:
+        writer.add_rows(run)
+
+
+def _parse_lines(lines: "list[bytes]", query_ids: "dict[bytes, int]", doc_ids: "dict[bytes, int]") -> "list[list]":
+    """The query codes, doc codes, ranks, and scores of the lines (ids are encoded via and added to the dictionaries)."""
+    ret: "list[list]" = [[], [], [], []]
+    for line in lines:
+        if fields := line.split():
+            ret[0].append(query_ids.setdefault(fields[0], len(query_ids)))
+            ret[1].append(doc_ids.setdefault(fields[2], len(doc_ids)))
+            ret[2].append(fields[3])
+            ret[3].append(fields[4])
+    return ret
+
+
+def _parse_stream(stream: "IO[bytes]", blocks: bool) -> "Iterator[ColumnarRun]":
+    """Parse the stream line by line into one ColumnarRun per block of lines (or one for all lines)."""
+    query_ids: "dict[bytes, int]" = {}
+    doc_ids: "dict[bytes, int]" = {}
+    columns: "list[list]" = [[], [], [], []]
+    while True:
+        lines = list(islice(stream, BLOCK_SIZE))
+        for column, values in zip(columns, _parse_lines(lines, query_ids, doc_ids)):
+            column.extend(values)
+        if (blocks or not lines) and columns[0]:
+            yield ColumnarRun(
+                np.array([i.decode("utf-8") for i in query_ids], dtype=str),
+                np.array([i.decode("utf-8") for i in doc_ids], dtype=str),
+                np.array(columns[0], dtype=np.int32),
+                np.array(columns[1], dtype=np.int32),
+                np.array(columns[2], dtype=np.int32),
+                np.array(columns[3], dtype=np.float64),
+            )
+            query_ids, doc_ids, columns = {}, {}, [[], [], [], []]
+        if not lines:
+            return
+
+
+def _arrow_batches(pa, stream: "IO[bytes]"):
+    columns = ["query_id", "q0", "doc_id", "rank", "score", "tag"]
+    return pa.csv.open_csv(
+        stream,
+        read_options=pa.csv.ReadOptions(column_names=columns, block_size=64 * BLOCK_SIZE),
+        parse_options=pa.csv.ParseOptions(delimiter=" ", quote_char=False, ignore_empty_lines=True),
+        convert_options=pa.csv.ConvertOptions(
+            include_columns=["query_id", "doc_id", "rank", "score"],
+            column_types={
+                "query_id": pa.large_string(),
+                "doc_id": pa.large_string(),
+                "rank": pa.int32(),
+                "score": pa.float64(),
+            },
+        ),
+    )
+
+
+def _from_arrow(pa, columns) -> ColumnarRun:
+    """The ColumnarRun of a record batch (or of a table with one chunk per column)."""
+
+    def column(name: str):
+        ret = columns.column(name)
+        return ret.chunk(0) if isinstance(ret, pa.ChunkedArray) else ret
+
+    query_ids, doc_ids = pa.compute.dictionary_encode(column("query_id")), pa.compute.dictionary_encode(column("doc_id"))
+    return ColumnarRun(
+        query_ids.dictionary.to_numpy(zero_copy_only=False).astype(str),
+        doc_ids.dictionary.to_numpy(zero_copy_only=False).astype(str),
+        query_ids.indices.to_numpy().astype(np.int32),
+        doc_ids.indices.to_numpy().astype(np.int32),
+        column("rank").to_numpy(),
+        column("score").to_numpy(),
+    )
+
+
+def _peek_format(stream: "IO[bytes]") -> "tuple[IO[bytes], Any]":
+    """The stream (with support for peeking) and pyarrow if the run can be parsed via pyarrow, else None."""
+    if not hasattr(stream, "peek"):
+        stream = io.BufferedReader(stream)
+    # the fast path needs single spaces between the fields, which is checked on the first line
+    fields = stream.peek(4096).split(b"\n", 1)[0].rstrip(b"\r").split(b" ")
+    pa = _pyarrow()
+    return stream, pa if pa is not None and len(fields) == 6 and all(fields) else None
+
+
+@contextmanager
+def _open_run(run_file: RunFile) -> "Iterator[IO[bytes]]":
+    if isinstance(run_file, (str, Path)):
+        with _open(run_file, "r") as f:
+            yield f
+    else:
+        yield run_file
+
+
+def iter_run(run_file: RunFile) -> "Iterator[ColumnarRun]":
+    """Stream the run in blocks of rows (from a path, compressed depending on its suffix, or an uncompressed stream).
+
+    Runs are parsed via pyarrow if it is installed and the fields are separated by single spaces (as written by the
+    RunWriter), and line by line otherwise. Each block has its own dictionaries of ids.
+    """
+    with _open_run(run_file) as f:
+        stream, pa = _peek_format(f)
+        if pa is None:
+            yield from _parse_stream(stream, blocks=True)
+        else:
+            yield from (_from_arrow(pa, i) for i in _arrow_batches(pa, stream))
+
+
+def read_run(run_file: RunFile) -> ColumnarRun:
+    """Read the run into one ColumnarRun (see iter_run)."""
+    with _open_run(run_file) as f:
+        stream, pa = _peek_format(f)
+        if pa is None:
+            return ColumnarRun.concatenate(_parse_stream(stream, blocks=False))
+        table = pa.Table.from_batches(list(_arrow_batches(pa, stream)))
+        if table.num_rows == 0:
+            return ColumnarRun.concatenate([])
+        # the ids are dictionary encoded once for the whole run instead of merging the dictionaries of the blocks
+        return _from_arrow(pa, table.combine_chunks())
+
+
+def read_trec_run(run_file: "Path | str") -> RunRows:
+    """Read a run in the TREC format (gzipped if the file name ends with .gz, zstd for .zst)."""
+    return read_run(run_file).rows()
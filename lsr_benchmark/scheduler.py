@@ -0,0 +1,182 @@
+"""Run a matrix of jobs (e.g., retrieval approaches x datasets x embeddings) concurrently and resumably.
+
+Each state change of a job (running, done, failed) is appended to a ledger (a json-lines file), so that an interrupted
+run of the matrix skips the finished jobs when it is started again. Failed jobs are retried with exponential backoff,
+and everything that a job prints (e.g., the logs of its docker container) plus the traceback of failed attempts is
+written to its own log file instead of being interleaved on the console:
+
+    ledger = JobLedger(out / ".jobs" / "ledger.jsonl")
+    results = run_jobs(jobs, execute, ledger, out / ".jobs" / "logs", workers=4, retries=2)
+    failed = [i for i in results if i.state == "failed"]
+"""
+import json
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Callable, Iterable, NamedTuple
+
+if TYPE_CHECKING:
+    from typing import Any, Optional
+
+RUNNING, DONE, FAILED = "running", "done", "failed"
+
+
+class Job(NamedTuple):
+    dataset: str
+    embedding: str
+    approach: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.dataset}/{self.embedding}/{self.approach.strip('/')}"
+
+
+class JobResult(NamedTuple):
+    job: Job
+    state: str
+    attempts: int
+    error: "Optional[str]"
+    log_file: "Optional[Path]"
+
+
+class JobLedger:
+    """An append-only json-lines file with one entry per state change of a job, the last entry of a job is its state."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.__lock = threading.Lock()
+        self.__states: "dict[str, dict[str, Any]]" = {}
+        if self.path.is_file():
+            for line in self.path.read_text().splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # e.g., the last line of a ledger whose process was killed while writing
+                    continue
+                self.__states[entry["job"]] = entry
+
+    def state(self, job: Job) -> "Optional[dict[str, Any]]":
+        return self.__states.get(job.key)
+
+    def is_done(self, job: Job) -> bool:
+        return (self.state(job) or {}).get("state") == DONE
+
+    def record(self, job: Job, state: str, **fields):
+        entry = {"job": job.key, "state": state, "time": time.time(), **fields}
+        with self.__lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a") as f:
+                f.write(json.dumps(entry) + "\n")
+            self.__states[job.key] = entry
+
+
+class _ThreadLocalOutput:
+    """A replacement of sys.stdout/sys.stderr that writes to the log file of the job of the current thread (if any)."""
+
+    def __init__(self, default: "IO[str]"):
+        self.default = default
+        self.local = threading.local()
+
+    def __target(self) -> "IO[str]":
+        return getattr(self.local, "file", None) or self.default
+
+    def write(self, text: str) -> int:
+        return self.__target().write(text)
+
+    def flush(self):
+        self.__target().flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self.default, name)
+
+
+@contextmanager
+def _capture_output():
+    """Replace sys.stdout and sys.stderr, so that the output of each job can be redirected to its log file."""
+    stdout, stderr = _ThreadLocalOutput(sys.stdout), _ThreadLocalOutput(sys.stderr)
+    sys.stdout, sys.stderr = stdout, stderr
+    try:
+        yield stdout, stderr
+    finally:
+        sys.stdout, sys.stderr = stdout.default, stderr.default
+
+
+def _run_job(
+    job: Job,
+    execute: "Callable[[Job], Any]",
+    ledger: JobLedger,
+    log_file: Path,
+    outputs: "tuple[_ThreadLocalOutput, _ThreadLocalOutput]",
+    retries: int,
+    backoff: float,
+) -> JobResult:
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    error = None
+    for attempt in range(1, retries + 2):
+        ledger.record(job, RUNNING, attempt=attempt, log=str(log_file))
+        with log_file.open("a") as log:
+            log.write(f"=== attempt {attempt} of {job.key} at {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+            for output in outputs:
+                output.local.file = log
+            try:
+                execute(job)
+                ledger.record(job, DONE, attempt=attempt, log=str(log_file))
+                return JobResult(job, DONE, attempt, None, log_file)
+            except Exception as e:
+                traceback.print_exc(file=log)
+                error = f"{type(e).__name__}: {e}"
+            finally:
+                for output in outputs:
+                    output.local.file = None
+
+        ledger.record(job, FAILED, attempt=attempt, log=str(log_file), error=error)
+        if attempt <= retries:
+            time.sleep(backoff * 2 ** (attempt - 1))
+    return JobResult(job, FAILED, retries + 1, error, log_file)
+
+
+def run_jobs(
+    jobs: "Iterable[Job]",
+    execute: "Callable[[Job], Any]",
+    ledger: JobLedger,
+    log_dir: Path,
+    workers: int = 1,
+    retries: int = 2,
+    backoff: float = 30.0,
+    on_result: "Optional[Callable[[JobResult], None]]" = None,
+) -> "list[JobResult]":
+    """Execute the jobs that are not done according to the ledger with the given number of concurrent workers.
+
+    A job fails if execute raises an exception, it is retried up to retries times, waiting backoff, 2 * backoff, ...
+    seconds in between. The output of each job goes to log_dir/<dataset>/<embedding>/<approach>.log. Returns the result
+    of each job in the order of the jobs (jobs that were already done have 0 attempts).
+    """
+    jobs = list(jobs)
+    results: "dict[Job, JobResult]" = {}
+    for job in jobs:
+        if ledger.is_done(job):
+            results[job] = JobResult(job, DONE, 0, None, None)
+
+    def run(job: Job) -> JobResult:
+        ret = _run_job(job, execute, ledger, Path(log_dir) / f"{job.key}.log", outputs, retries, backoff)
+        if on_result is not None:
+            on_result(ret)
+        return ret
+
+    pending = [i for i in jobs if i not in results]
+    with _capture_output() as outputs:
+        pool = ThreadPoolExecutor(max(1, workers))
+        try:
+            for job, result in zip(pending, pool.map(run, pending)):
+                results[job] = result
+        except BaseException:
+            # e.g., on ctrl+c, do not start the queued jobs (the ledger marks the running ones to be executed again)
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+        pool.shutdown(wait=True)
+
+    return [results[i] for i in jobs]
@@ -0,0 +1,218 @@
+"""A dependency-light reference engine for learned sparse retrieval that only needs NumPy.
+
+The InvertedIndex is built directly from the CSR arrays of the document embeddings: postings are stored per token
+(sorted by document) in flat arrays, and each posting list is split into blocks of block_size postings with the
+maximum value of each block. Queries are evaluated term-at-a-time in the order of decreasing score upper bounds with
+MaxScore-style dynamic pruning: as soon as the remaining terms can not lift an unseen document above the current
+k-th best score, only the current candidates are scored further, by looking them up in the remaining posting lists,
+and candidates whose upper bound (via the block maxima) falls below the k-th best score are dropped. The top-k is
+exact for non-negative weights (as produced by all models in the benchmark); for negative weights, all postings of
+the query terms are scored.
+"""
+import threading
+from pathlib import Path
+from typing import Iterable, NamedTuple, TYPE_CHECKING
+
+import numpy as np
+
+from lsr_benchmark.irds import IdTable, SparseEmbeddingMatrix
+
+if TYPE_CHECKING:
+    from typing import Optional
+
+BLOCK_SIZE = 128
+INDEX_ARRAYS = ("term-offsets", "docs", "values", "term-max", "block-offsets", "block-max")
+
+
+class SearchResult(NamedTuple):
+    doc_id: str
+    score: float
+
+
+class InvertedIndex:
+    def __init__(self, doc_ids: IdTable, arrays: "dict[str, np.ndarray]", block_size: int = BLOCK_SIZE):
+        self.doc_ids = doc_ids
+        self.block_size = block_size
+        self.term_offsets = arrays["term-offsets"]
+        self.docs = arrays["docs"]
+        self.values = arrays["values"]
+        self.term_max = arrays["term-max"]
+        self.block_offsets = arrays["block-offsets"]
+        self.block_max = arrays["block-max"]
+        self.__nonnegative = len(self.values) == 0 or float(np.min(self.values)) >= 0
+        self.__buffers = threading.local()
+
+    @staticmethod
+    def from_embeddings(
+        embeddings: "SparseEmbeddingMatrix | Iterable[SparseEmbeddingMatrix]", block_size: int = BLOCK_SIZE
+    ) -> "InvertedIndex":
+        """Build the index from a SparseEmbeddingMatrix or from the chunks of one (see embeddings(chunk_size=...))."""
+        chunks = [embeddings] if isinstance(embeddings, SparseEmbeddingMatrix) else list(embeddings)
+        doc_ids = IdTable.concatenate([i.ids for i in chunks])
+        counts = np.concatenate([np.diff(i.indptr) for i in chunks] or [np.empty(0, dtype=np.int64)])
+        terms = np.concatenate([np.asarray(i.indices) for i in chunks] or [np.empty(0, dtype=np.int64)])
+        values = np.concatenate([np.asarray(i.data) for i in chunks] or [np.empty(0, dtype=np.float32)])
+        docs = np.repeat(np.arange(len(doc_ids), dtype=np.int32), counts)
+
+        # transpose the CSR arrays: the stable sort keeps the postings of each term sorted by document
+        order = np.argsort(terms, kind="stable")
+        terms, docs, values = terms[order], docs[order], values[order].astype(np.float32)
+        if len(terms) > 1:
+            # sum up duplicate tokens within one document so that documents are unique within each posting list
+            starts = np.flatnonzero(np.concatenate([[True], (terms[1:] != terms[:-1]) | (docs[1:] != docs[:-1])]))
+            terms, docs, values = terms[starts], docs[starts], np.add.reduceat(values, starts)
+
+        vocabulary = int(terms.max()) + 1 if len(terms) > 0 else 0
+        term_offsets = np.zeros(vocabulary + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=vocabulary), out=term_offsets[1:])
+
+        lengths = np.diff(term_offsets)
+        block_offsets = np.zeros(vocabulary + 1, dtype=np.int64)
+        np.cumsum((lengths + block_size - 1) // block_size, out=block_offsets[1:])
+        positions = np.arange(len(terms)) - term_offsets[terms]
+        block_starts = np.flatnonzero(positions % block_size == 0)
+        block_max = np.maximum.reduceat(values, block_starts) if len(values) > 0 else np.empty(0, dtype=np.float32)
+
+        term_max = np.zeros(vocabulary, dtype=np.float32)
+        non_empty = lengths > 0
+        term_max[non_empty] = np.maximum.reduceat(block_max, block_offsets[:-1][non_empty])
+
+        arrays = {
+            "term-offsets": term_offsets,
+            "docs": docs,
+            "values": values,
+            "term-max": term_max,
+            "block-offsets": block_offsets,
+            "block-max": block_max.astype(np.float32),
+        }
+        return InvertedIndex(doc_ids, arrays, block_size)
+
+    def save(self, directory: Path):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.doc_ids.save(directory)
+        arrays = self.__arrays()
+        for name in INDEX_ARRAYS:
+            np.save(directory / f"{name}.npy", arrays[name])
+        (directory / "block-size.txt").write_text(str(self.block_size))
+
+    @staticmethod
+    def load(directory: Path) -> "InvertedIndex":
+        """Load a saved index, memory mapped."""
+        directory = Path(directory)
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in INDEX_ARRAYS}
+        return InvertedIndex(IdTable.load(directory), arrays, int((directory / "block-size.txt").read_text()))
+
+    def __arrays(self) -> "dict[str, np.ndarray]":
+        return {
+            "term-offsets": self.term_offsets,
+            "docs": self.docs,
+            "values": self.values,
+            "term-max": self.term_max,
+            "block-offsets": self.block_offsets,
+            "block-max": self.block_max,
+        }
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def __accumulator(self) -> "tuple[np.ndarray, np.ndarray]":
+        # one dense accumulator per thread that is reset after each query, i.e., searching is thread-safe
+        if getattr(self.__buffers, "scores", None) is None:
+            self.__buffers.scores = np.zeros(len(self), dtype=np.float32)
+            self.__buffers.seen = np.zeros(len(self), dtype=bool)
+        return self.__buffers.scores, self.__buffers.seen
+
+    def __postings(self, term: int) -> "tuple[np.ndarray, np.ndarray]":
+        begin, end = self.term_offsets[term], self.term_offsets[term + 1]
+        return self.docs[begin:end], self.values[begin:end]
+
+    def search_rows(self, tokens, values, k: int = 10, pruning: bool = True) -> "tuple[np.ndarray, np.ndarray]":
+        """The rows and scores of the top-k documents for the query, sorted by descending score."""
+        tokens = np.asarray(tokens, dtype=np.int64)
+        weights = np.asarray(values, dtype=np.float32)
+        known = (tokens >= 0) & (tokens < len(self.term_max)) & (weights != 0)
+        tokens, weights = tokens[known], weights[known]
+        if len(tokens) == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        pruning = pruning and self.__nonnegative and bool(np.all(weights > 0))
+        upper_bounds = weights * self.term_max[tokens]
+        order = np.argsort(-upper_bounds, kind="stable")
+        tokens, weights, upper_bounds = tokens[order], weights[order], upper_bounds[order]
+        # remaining[i] is the maximal score that terms i, i+1, ... can add to a document
+        remaining = np.append(np.cumsum(upper_bounds[::-1])[::-1], np.float32(0))
+
+        scores, seen = self.__accumulator()
+        touched, threshold = [], -np.inf
+        try:
+            for i in range(len(tokens)):
+                if pruning and remaining[i] < threshold:
+                    # no unseen document can enter the top-k anymore, only candidates are scored from here on
+                    break
+                docs, doc_values = self.__postings(tokens[i])
+                scores[docs] += weights[i] * doc_values
+                touched.append(docs[~seen[docs]])
+                seen[touched[-1]] = True
+                if pruning and remaining[i + 1] < remaining[0] - remaining[i + 1]:
+                    # otherwise, the k-th best score can not exceed what the remaining terms could add anyway
+                    threshold = self.__kth_score(scores, np.concatenate(touched), k)
+            else:
+                i = len(tokens)
+
+            candidates = np.concatenate(touched)
+            for i in range(i, len(tokens)):
+                candidates = candidates[scores[candidates] + remaining[i] >= threshold]
+                candidates = self.__score_candidates(candidates, tokens[i], weights[i], remaining[i + 1], threshold)
+                threshold = max(threshold, self.__kth_score(scores, candidates, k))
+
+            top_k = candidates[np.lexsort((candidates, -scores[candidates]))[:k]]
+            return top_k.astype(np.int64), scores[top_k].copy()
+        finally:
+            for docs in touched:
+                scores[docs] = 0
+                seen[docs] = False
+
+    def __score_candidates(
+        self, candidates: np.ndarray, term: int, weight: float, remaining: float, threshold: float
+    ) -> np.ndarray:
+        """Add the scores of term to the candidates and drop candidates that can not reach the threshold anymore."""
+        docs, doc_values = self.__postings(term)
+        if len(candidates) == 0 or len(docs) == 0:
+            return candidates
+        candidates = np.sort(candidates)
+        positions = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+        blocks = self.block_offsets[term] + positions // self.block_size
+        scores, _ = self.__accumulator()
+        upper_bounds = scores[candidates] + weight * self.block_max[blocks] + remaining
+        keep = upper_bounds >= threshold
+        candidates, positions = candidates[keep], positions[keep]
+        matches = docs[positions] == candidates
+        scores[candidates[matches]] += weight * doc_values[positions[matches]]
+        return candidates
+
+    @staticmethod
+    def __kth_score(scores: np.ndarray, candidates: np.ndarray, k: int) -> float:
+        if len(candidates) < k:
+            return -np.inf
+        kth = float(np.partition(scores[candidates], len(candidates) - k)[len(candidates) - k])
+        # a little slack, as float32 scores that are summed up in different orders can differ in the last bits
+        return kth - 1e-5 * abs(kth)
+
+    def search(self, tokens, values, k: int = 10, pruning: bool = True) -> "list[SearchResult]":
+        rows, scores = self.search_rows(tokens, values, k, pruning)
+        return [SearchResult(doc_id, float(score)) for doc_id, score in zip(self.doc_ids.ids_of(rows), scores)]
+
+
+def build_index(
+    embeddings: "SparseEmbeddingMatrix | Iterable[SparseEmbeddingMatrix]",
+    block_size: int = BLOCK_SIZE,
+    directory: "Optional[Path]" = None,
+) -> InvertedIndex:
+    """Build an InvertedIndex from document embeddings, loading it from (or saving it to) directory if passed."""
+    if directory is not None and (Path(directory) / "block-size.txt").is_file():
+        return InvertedIndex.load(directory)
+    ret = InvertedIndex.from_embeddings(embeddings, block_size)
+    if directory is not None:
+        ret.save(directory)
+    return ret
@@ -0,0 +1,311 @@
+"""Parameter sweeps: run a grid of search-time parameters against indexes that are loaded and built only once.
+
+The document and query embeddings are loaded once per sweep, each distinct combination of index parameters is built
+once (and persisted in the index cache, see lsr_benchmark.index_cache), and all search parameters of the grid are then
+run against the loaded index. Each point of the grid gets its own run directory (run.txt.gz, query-latencies.tsv,
+retrieval-metadata.yml, and index-metadata.yml) like the step-03 scripts produce them, plus one row in the table of
+recall and latency whose Pareto-optimal points (in terms of ann_recall@k against the exact top-k, see
+lsr_benchmark.oracle, and the median latency) are marked.
+"""
+import abc
+import itertools
+import shutil
+from pathlib import Path
+from typing import Any, Callable, Iterable, TYPE_CHECKING
+
+import numpy as np
+
+from lsr_benchmark.batch import batch_search
+from lsr_benchmark.index_cache import IndexCache, add_index_cache_to_metadata
+from lsr_benchmark.irds import IdTable, SparseEmbedding, SparseEmbeddingMatrix
+from lsr_benchmark.latency import LatencyRecorder, add_latencies_to_metadata
+from lsr_benchmark.oracle import ann_recall, exact_run
+from lsr_benchmark.runs import RunRows, write_trec_run
+
+if TYPE_CHECKING:
+    from typing import Optional
+
+    from lsr_benchmark.batch import QueryResult
+
+# number of document embeddings that are loaded into memory at once while building an index
+CHUNK_SIZE = 10_000
+PARETO_FILE = "pareto.tsv"
+
+
+class SweepEngine(abc.ABC):
+    """A retrieval engine that can be swept: index_params are fixed when building, search_params vary per search."""
+
+    name: str = None
+    index_params: "dict[str, Any]" = {}
+    search_params: "dict[str, Any]" = {}
+
+    @abc.abstractmethod
+    def build(self, doc_embeddings: SparseEmbeddingMatrix, target_dir: Path, **index_params):
+        """Write the index of the doc_embeddings with the index_params to target_dir."""
+
+    @abc.abstractmethod
+    def load(self, index_dir: Path, **index_params) -> Any:
+        """The index that build wrote to index_dir with the index_params (or a step-03 script with the same key)."""
+
+    @abc.abstractmethod
+    def search(self, index, query: SparseEmbedding, k: int, **search_params) -> "tuple[np.ndarray, np.ndarray]":
+        """The doc ids and scores of the top-k documents for the query."""
+
+
+class NativeEngine(SweepEngine):
+    name = "native-search"
+    index_params = {"block_size": 128}
+    search_params = {"pruning": True}
+
+    def build(self, doc_embeddings, target_dir, block_size):
+        from lsr_benchmark.search import InvertedIndex
+
+        InvertedIndex.from_embeddings(doc_embeddings.chunks(CHUNK_SIZE), block_size).save(target_dir)
+
+    def load(self, index_dir, block_size):
+        from lsr_benchmark.search import InvertedIndex
+
+        return InvertedIndex.load(index_dir)
+
+    def search(self, index, query, k, pruning):
+        rows, scores = index.search_rows(query.tokens, query.values, k, pruning)
+        return index.doc_ids.ids_of(rows), scores
+
+
+class SeismicEngine(SweepEngine):
+    name = "seismic"
+    index_params = {"use_u32": False}
+    search_params = {"query_cut": 10, "heap_factor": 0.8}
+
+    def __seismic(self, use_u32: bool):
+        try:
+            from seismic import SeismicDataset, SeismicDatasetLV, SeismicIndex, SeismicIndexLV
+        except ImportError:
+            raise ValueError("The seismic engine requires seismic. Please install it via 'pip3 install pyseismic-lsr'.")
+        return (SeismicDatasetLV, SeismicIndexLV) if use_u32 else (SeismicDataset, SeismicIndex)
+
+    def build(self, doc_embeddings, target_dir, use_u32):
+        dataset_class, index_class = self.__seismic(use_u32)
+        dataset = dataset_class()
+        for chunk in doc_embeddings.chunks(CHUNK_SIZE):
+            for doc_id, tokens, values in chunk.tuples():
+                dataset.add_document(doc_id, tokens, values)
+        index_class.build_from_dataset(dataset).save(str(target_dir / "index"))
+
+    def load(self, index_dir, use_u32):
+        # the index cache of the step-03 seismic script uses the same key and layout
+        _, index_class = self.__seismic(use_u32)
+        # seismic appends its own suffix to the file name of the saved index
+        return index_class.load(str(next(index_dir.glob("index.*"))))
+
+    def search(self, index, query, k, query_cut, heap_factor):
+        tokens = np.asarray(query.tokens).astype(str)
+        results = index.search(
+            query_id=query.id, query_components=tokens, query_values=np.asarray(query.values, dtype=np.float32),
+            k=k, query_cut=query_cut, heap_factor=heap_factor,
+        )
+        return np.array([doc_id for _, _, doc_id in results], dtype=str), np.array([s for _, s, _ in results])
+
+
+class KannoloEngine(SweepEngine):
+    name = "kannolo"
+    index_params = {"m": 32, "ef_construction": 200, "metric": "ip"}
+    search_params = {"ef_search": 200}
+
+    def __kannolo(self):
+        try:
+            from kannolo import SparsePlainHNSW
+        except ImportError:
+            raise ValueError("The kannolo engine requires kannolo. Please install it via 'pip3 install kannolo'.")
+        return SparsePlainHNSW
+
+    def build(self, doc_embeddings, target_dir, m, ef_construction, metric):
+        tokens = np.ascontiguousarray(doc_embeddings.indices, dtype=np.int32)
+        values = np.ascontiguousarray(doc_embeddings.data, dtype=np.float32)
+        offsets = np.ascontiguousarray(doc_embeddings.indptr, dtype=np.int32)
+        d = int(tokens.max()) - 1
+        index = self.__kannolo().build_from_arrays(tokens, values, offsets, d, m, ef_construction, metric)
+        index.save(str(target_dir / "index.kannolo"))
+        doc_embeddings.ids.save(target_dir)
+        (target_dir / "dimension.txt").write_text(str(d))
+
+    def load(self, index_dir, m, ef_construction, metric):
+        index = self.__kannolo().load(str(index_dir / "index.kannolo"))
+        return index, IdTable.load(index_dir), int((index_dir / "dimension.txt").read_text())
+
+    def search(self, index, query, k, ef_search):
+        index, doc_ids, d = index
+        scores, rows = index.search(np.asarray(query.tokens, dtype=np.int32), query.values, d=d, k=k, ef_search=ef_search)
+        return doc_ids.ids_of(rows), np.asarray(scores)
+
+
+ENGINES: "dict[str, Callable[[], SweepEngine]]" = {
+    NativeEngine.name: NativeEngine,
+    SeismicEngine.name: SeismicEngine,
+    KannoloEngine.name: KannoloEngine,
+}
+
+
+def parse_grid(params: "Iterable[str]", defaults: "dict[str, Any]") -> "dict[str, list]":
+    """Parse name=value1,value2 pairs into a grid, values are converted to the type of the default of the parameter."""
+    ret = {name: [value] for name, value in defaults.items()}
+    for param in params:
+        name, sep, values = param.partition("=")
+        name = name.strip().replace("-", "_")
+        if not sep or name not in defaults:
+            raise ValueError(f"I expected a parameter name=value1,value2,... with a name in {list(defaults)}, got {param}.")
+        ret[name] = [_convert(i.strip(), defaults[name]) for i in values.split(",")]
+    return ret
+
+
+def _convert(value: str, default: Any) -> Any:
+    if isinstance(default, bool):
+        if value.lower() not in ("true", "false", "1", "0"):
+            raise ValueError(f"I expected a boolean, got {value}.")
+        return value.lower() in ("true", "1")
+    return type(default)(value)
+
+
+def grid_points(grid: "dict[str, list]") -> "list[dict[str, Any]]":
+    return [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+
+
+def point_name(engine: str, params: "dict[str, Any]") -> str:
+    return "-".join([engine] + [f"{name.replace('_', '-')}-{value}" for name, value in params.items()])
+
+
+def pareto_optimal(recall: "list[float]", latency: "list[float]") -> "list[bool]":
+    """Whether each point is Pareto-optimal, i.e., no other point has a higher (or equal) recall at a lower latency."""
+    ret = []
+    for r, l in zip(recall, latency):
+        ret.append(not any(r2 >= r and l2 <= l and (r2 > r or l2 < l) for r2, l2 in zip(recall, latency)))
+    return ret
+
+
+def _run_rows(results: "list[QueryResult]") -> RunRows:
+    runs = []
+    for query_id, (doc_ids, scores), _ in results:
+        runs.append(
+            RunRows(
+                np.repeat(np.array([query_id]), len(doc_ids)),
+                np.asarray(doc_ids, dtype=str),
+                np.arange(1, len(doc_ids) + 1),
+                np.asarray(scores, dtype=np.float32),
+            )
+        )
+    return RunRows.concatenate(runs)
+
+
+def _recall(run: RunRows, qrels: "Optional[dict[str, set[str]]]", k: int) -> "Optional[float]":
+    if qrels is None:
+        return None
+    retrieved: "dict[str, set[str]]" = {}
+    for query_id, doc_id in zip(run.query_ids.tolist(), run.doc_ids.tolist()):
+        retrieved.setdefault(query_id, set()).add(doc_id)
+    recalls = [len(retrieved.get(q, set()) & relevant) / len(relevant) for q, relevant in qrels.items() if relevant]
+    return float(np.mean(recalls)) if recalls else None
+
+
+def _relevant_docs(dataset) -> "Optional[dict[str, set[str]]]":
+    if not dataset.has_qrels():
+        return None
+    ret: "dict[str, set[str]]" = {}
+    for qrel in dataset.qrels_iter():
+        ret.setdefault(qrel.query_id, set())
+        if qrel.relevance > 0:
+            ret[qrel.query_id].add(qrel.doc_id)
+    return ret
+
+
+def _tracking(metadata_file: Path, tag: str):
+    from tirex_tracker import ExportFormat, register_metadata, tracking
+
+    register_metadata({"actor": {"team": "reneuir-baselines"}, "tag": tag})
+    return tracking(export_file_path=metadata_file, export_format=ExportFormat.IR_METADATA)
+
+
+def sweep(
+    dataset,
+    embedding: str,
+    engine: SweepEngine,
+    index_grid: "dict[str, list]",
+    search_grid: "dict[str, list]",
+    output: Path,
+    k: int = 10,
+    threads: "Optional[int]" = None,
+    index_cache: bool = True,
+) -> "list[dict[str, Any]]":
+    """Run all points of the grid of index and search parameters, returning one row per point for the Pareto table."""
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    doc_embeddings = dataset.doc_embeddings(model_name=embedding)
+    query_embeddings = list(dataset.query_embeddings(model_name=embedding))
+    doc_files = dataset.doc_embedding_files(embedding)
+    qrels = _relevant_docs(dataset)
+    exact = exact_run(dataset, embedding, k, threads)
+
+    rows = []
+    for index_params in grid_points(index_grid):
+        cache = IndexCache(engine.name, doc_files, index_params, index_cache)
+        index_metadata = output / f".{point_name(engine.name, index_params)}-index-metadata.yml"
+        index_metadata.unlink(missing_ok=True)
+        with _tracking(index_metadata, point_name(engine.name, index_params)):
+            index_dir = cache.get(lambda target_dir: engine.build(doc_embeddings, target_dir, **index_params))
+            index = engine.load(index_dir, **index_params)
+        shutil.rmtree(output / ".tirex-tracker", ignore_errors=True)
+        add_index_cache_to_metadata(index_metadata, cache.summary())
+
+        for search_params in grid_points(search_grid):
+            params = {**index_params, **search_params}
+            run_dir = output / point_name(engine.name, params)
+            run_dir.mkdir(parents=True, exist_ok=True)
+            shutil.copy(index_metadata, run_dir / "index-metadata.yml")
+
+            (run_dir / "retrieval-metadata.yml").unlink(missing_ok=True)
+            with _tracking(run_dir / "retrieval-metadata.yml", run_dir.name):
+                latency = LatencyRecorder()
+                results = latency.extend(
+                    batch_search(lambda q, k: engine.search(index, q, k, **search_params), query_embeddings, k, threads)
+                )
+            shutil.rmtree(output / ".tirex-tracker", ignore_errors=True)
+            shutil.rmtree(run_dir / ".tirex-tracker", ignore_errors=True)
+            latency.write(run_dir / "query-latencies.tsv")
+            add_latencies_to_metadata(run_dir / "retrieval-metadata.yml", latency.summary())
+
+            run = _run_rows(results)
+            write_trec_run(run_dir / "run.txt.gz", run, point_name(engine.name, params))
+
+            latencies = np.array(latency.latencies) * 1000
+            rows.append(
+                {
+                    "run": run_dir.name,
+                    **params,
+                    f"recall@{k}": _recall(run, qrels, k),
+                    f"ann_recall@{k}": ann_recall(zip(run.query_ids.tolist(), run.doc_ids.tolist(), run.scores.tolist()), exact, k),
+                    "p50 ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+                    "p99 ms": float(np.percentile(latencies, 99)) if len(latencies) else None,
+                    "qps": latency.summary().get("qps"),
+                    "index hit": cache.hit,
+                }
+            )
+        index_metadata.unlink(missing_ok=True)
+
+    recall = [-np.inf if i[f"ann_recall@{k}"] is None else i[f"ann_recall@{k}"] for i in rows]
+    for row, optimal in zip(rows, pareto_optimal(recall, [i["p50 ms"] for i in rows])):
+        row["pareto"] = optimal
+    write_pareto_table(output / PARETO_FILE, rows)
+    return rows
+
+
+def write_pareto_table(pareto_file: Path, rows: "list[dict[str, Any]]"):
+    columns = list(rows[0].keys()) if rows else []
+    with open(pareto_file, "w") as f:
+        f.write("\t".join(columns) + "\n")
+        for row in rows:
+            f.write("\t".join(_format_value(row[c]) for c in columns) + "\n")
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.4f}"
+    return "" if value is None else str(value)
@@ -3,68 +3,96 @@ import duckdb
 import ir_datasets
 import lsr_benchmark
 import click
-from tqdm import tqdm
+import numpy as np
+import os
+import pyarrow as pa
 from tirex_tracker import tracking, ExportFormat, register_metadata
 from shutil import rmtree
 from pathlib import Path
+from lsr_benchmark.arrow import id_array
 from lsr_benchmark.click import retrieve_command
-import gzip
-import pandas as pd
+from lsr_benchmark.latency import track_latency
+from lsr_benchmark.runs import RunRows, write_trec_run
+
+# all queries are scored in one set-based query: the window keeps the top-k documents per query
+SEARCH_QUERY = """
+    SELECT query_row, doc_id, rank, score FROM (
+        SELECT
+            queries.query_row,
+            postings.doc_row,
+            SUM(postings.score * queries.score) AS score,
+            ROW_NUMBER() OVER (PARTITION BY queries.query_row ORDER BY SUM(postings.score * queries.score) DESC, postings.doc_row) AS rank
+        FROM postings
+        JOIN queries USING (term_id)
+        GROUP BY queries.query_row, postings.doc_row
+        QUALIFY rank <= ?
+    )
+    JOIN doc_ids USING (doc_row)
+    ORDER BY query_row, rank
+"""
+
+
+def postings_table(matrix, row_column, quantize=False):
+    """The CSR arrays as (row, term_id, score) table, built from the arrays without per-row copies."""
+    counts = np.diff(np.asarray(matrix.indptr))
+    scores = np.asarray(matrix.data, dtype=np.float32)
+    return pa.table({
+        row_column: np.repeat(np.arange(len(matrix), dtype=np.int32), counts),
+        "term_id": np.asarray(matrix.indices, dtype=np.int32),
+        "score": np.round(scores * 100).astype(np.int32) if quantize else scores,
+    })
+
+
+def has_index(conn, index_key):
+    tables = {i for (i,) in conn.execute("SELECT table_name FROM duckdb_tables()").fetchall()}
+    if not {"postings", "doc_ids", "index_key"} <= tables:
+        return False
+    return conn.execute("SELECT key FROM index_key").fetchone() == (index_key,)
 
 
 @retrieve_command()
 @click.option('--quantize', is_flag=True, help="Whether to quantize the index scores to integers.")
-def main(dataset, embedding, output, quantize, k):
+@click.option('--database', type=Path, required=False, default=None, help="A DuckDB file to persist the index to (and to reuse it from in later runs). Default is in-memory.")
+@click.option('--threads', type=int, required=False, default=os.cpu_count(), help="Number of threads of DuckDB.")
+def main(dataset, embedding, output, quantize, k, database, threads):
     output.mkdir(parents=True, exist_ok=True)
     lsr_benchmark.register_to_ir_datasets(dataset)
     ir_dataset = ir_datasets.load(f"lsr-benchmark/{dataset}")
     register_metadata({"actor": {"team": "reneuir-baselines"}, "tag": f"duckdb-{embedding.replace('/', '-')}-{'quantize-' if quantize else ''}{k}"})
 
-    res = []
-    for (doc_id, tokens, values) in tqdm(ir_dataset.doc_embeddings(model_name=embedding), "create documents dataframe"):
-        res.append(pd.DataFrame({"doc_id": doc_id, "term_id": tokens, "score": values}))
-
-    df = pd.concat(res)
-    if quantize:
-        df["score"] = (df["score"] * 100).round().astype(int)
+    conn = duckdb.connect(":memory:" if database is None else str(database))
+    conn.execute(f"SET threads = {int(threads)}")
+    index_key = f"{dataset}/{embedding}/{'quantize' if quantize else 'float'}"
 
-    # Default is in-memory, may be adjusted if the index becomes too large
-    conn = duckdb.connect(":memory:")
-
-    print("Documents added to the DataFrame. Now indexing..")
     with tracking(export_file_path=output / "index-metadata.yml", export_format=ExportFormat.IR_METADATA, ):
-        conn.execute("CREATE OR REPLACE TABLE index AS FROM df ORDER BY term_id, doc_id;")
+        if has_index(conn, index_key):
+            print(f"Reuse the index in {database}.")
+        else:
+            doc_matrix = ir_dataset.doc_embeddings(model_name=embedding, token_type="int")
+            doc_postings = postings_table(doc_matrix, "doc_row", quantize)
+            doc_id_table = pa.table({"doc_row": np.arange(len(doc_matrix), dtype=np.int32), "doc_id": id_array(doc_matrix.ids)})
+            conn.execute("CREATE OR REPLACE TABLE postings AS FROM doc_postings ORDER BY term_id, doc_row")
+            conn.execute("CREATE OR REPLACE TABLE doc_ids AS FROM doc_id_table")
+            conn.execute("CREATE OR REPLACE TABLE index_key AS SELECT ? AS key", [index_key])
 
-    queries_dfs = []
-    for (query_id, tokens, values) in tqdm(ir_dataset.query_embeddings(model_name=embedding), "create queries dataframe"):
-        queries_dfs.append(pd.DataFrame({"query_id": query_id, "term_id": tokens, "score": values}))
+    query_matrix = ir_dataset.query_embeddings(model_name=embedding, token_type="int")
+    conn.register("queries", postings_table(query_matrix, "query_row"))
 
     rmtree(output / ".tirex-tracker")
-    results = []
-
-    with tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
-        for queries in queries_dfs:
-            result = conn.query(
-                """
-                SELECT query_id, SUM(index.score * queries.score) AS score, doc_id
-                FROM index
-                JOIN queries USING (term_id)
-                GROUP BY query_id, doc_id
-                ORDER BY score DESC
-                LIMIT ?
-                """,
-                params=[k]
-            )
 
-            results.append(result.fetchall())
+    with track_latency(output) as latency, tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
+        with latency.batch(query_matrix.ids):
+            result = conn.execute(SEARCH_QUERY, [k]).fetchnumpy()
 
     rmtree(output / ".tirex-tracker")
-    with gzip.open(output/"run.txt.gz", "wt") as f:
-        for ranking_for_query in results:
-            rank = 1
-            for qid, score, docno in ranking_for_query:
-                f.write(f"{qid} Q0 {docno} {rank} {score} duckdb\n")
-                rank += 1
+    conn.close()
+    run = RunRows(
+        query_matrix.ids.ids_of(result["query_row"]),
+        np.asarray(result["doc_id"], dtype=str),
+        np.asarray(result["rank"]),
+        np.asarray(result["score"]),
+    )
+    write_trec_run(output / "run.txt.gz", run, "duckdb")
 
 if __name__ == "__main__":
     main()
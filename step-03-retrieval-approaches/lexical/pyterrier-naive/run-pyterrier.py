@@ -10,6 +10,7 @@ import pandas as pd
 from tira.third_party_integrations import ensure_pyterrier_is_loaded,  normalize_run
 import ir_datasets
 from lsr_benchmark.utils import ClickParamTypeLsrDataset
+from lsr_benchmark.latency import track_latency
 
 @click.command()
 @click.option(
@@ -22,14 +23,15 @@ from lsr_benchmark.utils import ClickParamTypeLsrDataset
 )
 @click.option("--retrieval", type=str, required=False, default="BM25", help="The retrieval model.")
 @click.option("--k", type=int, required=False, default=10, help="The retrieval depth.")
-def main(dataset, output, retrieval, k):
+@click.option("--workers", type=int, required=False, default=1, help="Number of processes that parse the corpus (1 parses in the main process).")
+def main(dataset, output, retrieval, k, workers):
     output.mkdir(parents=True, exist_ok=True)
     lsr_benchmark.register_to_ir_datasets(dataset)
     ir_dataset = ir_datasets.load(f"lsr-benchmark/{dataset}")
     ensure_pyterrier_is_loaded(boot_packages=())
 
     register_metadata({"actor": {"team": "reneuir-baselines"}, "tag": f"pyterrier-naive-{retrieval.lower()}-top-{k}"})
-    documents = [{"docno": i.doc_id, "text": i.default_text()} for i in ir_dataset.docs_iter()]
+    documents = [{"docno": i.doc_id, "text": i.default_text()} for i in ir_dataset.docs_iter(workers=workers)]
 
     with tracking(export_file_path=output / "index-metadata.yml", export_format=ExportFormat.IR_METADATA):
         index = pt.IterDictIndexer("ignored", meta= {'docno' : 100}, type=pt.IndexingType.MEMORY).index(tqdm(documents, "Index docs"))
@@ -45,8 +47,9 @@ def main(dataset, output, retrieval, k):
         queries.extend([{"qid": i.query_id, "query": pt_tokenize(i.default_text())}])
 
     pipeline = pt.terrier.Retriever(index, wmodel=retrieval)
-    with tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
-        run = pipeline(pd.DataFrame(queries))
+    with track_latency(output) as latency, tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
+        with latency.batch([i["qid"] for i in queries]):
+            run = pipeline(pd.DataFrame(queries))
 
     pt.io.write_results(normalize_run(run, retrieval, k), f'{output}/run.txt')
 
@@ -10,6 +10,8 @@ import pandas as pd
 from tira.third_party_integrations import ensure_pyterrier_is_loaded,  normalize_run
 import ir_datasets
 from lsr_benchmark.utils import ClickParamTypeLsrDataset
+from lsr_benchmark.latency import track_latency
+from lsr_benchmark.index_cache import track_index
 from math import floor
 from pyterrier_pisa import PisaIndex
 
@@ -19,7 +21,9 @@ from pyterrier_pisa import PisaIndex
 @click.option("--precompute-impact", type=bool, is_flag=True, default=False, required=False, help="Pre-compute impact scores. This speeds up retrieval..")
 @click.option("--output", required=True, type=Path, help="The directory where the output should be stored.")
 @click.option("--k", type=int, required=False, default=10, help="The retrieval depth.")
-def main(dataset, output, k, precompute_impact):
+@click.option("--workers", type=int, required=False, default=1, help="Number of processes that parse the corpus (1 parses in the main process).")
+@click.option("--index-cache/--no-index-cache", default=True, help="Whether to reuse (and persist) the index across runs.")
+def main(dataset, output, k, precompute_impact, workers, index_cache):
     output.mkdir(parents=True, exist_ok=True)
     lsr_benchmark.register_to_ir_datasets(dataset)
     ir_dataset = ir_datasets.load(f"lsr-benchmark/{dataset}")
@@ -27,12 +31,14 @@ def main(dataset, output, k, precompute_impact):
     tag = f"pyterrier-splade-top-{k}"
     register_metadata({"actor": {"team": "reneuir-baselines"}, "tag": tag})
 
-    documents = [{"docno": i.doc_id, "text": i.default_text()} for i in ir_dataset.docs_iter()]
+    def build(target_dir):
+        documents = [{"docno": i.doc_id, "text": i.default_text()} for i in ir_dataset.docs_iter(workers=workers)]
+        PisaIndex(str(target_dir / "pisa")).index(tqdm(documents, "Index docs"))
 
-    with tracking(export_file_path=output / "index-metadata.yml", export_format=ExportFormat.IR_METADATA):
-        rmtree("/tmp/.ignored", ignore_errors=True)
-        index = PisaIndex("/tmp/.ignored")
-        index.index(tqdm(documents, "Index docs"))
+    # the pre-computed impacts are stored in the index directory, so they are part of the key
+    params = {"stemmer": "porter2", "stops": "terrier", "precompute_impact": precompute_impact}
+    with track_index(output, "pyterrier-pisa-bm25", [ir_dataset.docs_handler().corpus_file()], params, index_cache) as cache, tracking(export_file_path=output / "index-metadata.yml", export_format=ExportFormat.IR_METADATA):
+        index = PisaIndex(str(cache.get(build) / "pisa"))
         pipeline = index.bm25(precompute_impact=precompute_impact)
 
     rmtree(output / ".tirex-tracker")
@@ -41,8 +47,9 @@ def main(dataset, output, k, precompute_impact):
     for i in ir_dataset.queries_iter():
         queries.extend([{"qid": i.query_id, "query": i.default_text()}])
 
-    with tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
-        run = pipeline(pd.DataFrame(queries))
+    with track_latency(output) as latency, tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
+        with latency.batch([i["qid"] for i in queries]):
+            run = pipeline(pd.DataFrame(queries))
 
     pt.io.write_results(normalize_run(run, tag, k), f'{output}/run.txt')
 
@@ -8,41 +8,46 @@ from tirex_tracker import tracking, ExportFormat, register_metadata
 from shutil import rmtree
 from pathlib import Path
 from lsr_benchmark.click import retrieve_command
-import gzip
+from lsr_benchmark.batch import batch_search
+from lsr_benchmark.latency import track_latency
+from lsr_benchmark.runs import RunWriter
+import os
+
+# number of document embeddings that are loaded into memory at once while building the dataset
+CHUNK_SIZE = 10_000
 
 
 @retrieve_command()
 @click.option("--use-u32", type=bool, required=False, default=False, help="Whether to use u32 for component ids, required for datasets with many components..")
-def main(dataset, embedding, output, k, use_u32):
+@click.option("--threads", type=int, required=False, default=os.cpu_count(), help="Number of threads that search queries in parallel.")
+def main(dataset, embedding, output, k, use_u32, threads):
     output.mkdir(parents=True, exist_ok=True)
     lsr_benchmark.register_to_ir_datasets(dataset)
     ir_dataset = ir_datasets.load(f"lsr-benchmark/{dataset}")
     seismic_dataset = SeismicDatasetLV() if use_u32 else SeismicDataset()
     register_metadata({"actor": {"team": "reneuir-baselines"}, "tag": f"naive_search-{embedding.replace('/', '-')}-{k}"})
     
-    for (doc_id, tokens, values) in tqdm(ir_dataset.doc_embeddings(model_name=embedding), "create seismic dataset for naive search"):
-        seismic_dataset.add_document(doc_id, tokens, values)
+    for chunk in tqdm(ir_dataset.doc_embeddings(model_name=embedding, chunk_size=CHUNK_SIZE, token_type="str"), "create seismic dataset for naive search"):
+        for (doc_id, tokens, values) in chunk:
+            seismic_dataset.add_document(doc_id, tokens, values)
 
     with tracking(export_file_path=output / "index-metadata.yml", export_format=ExportFormat.IR_METADATA, ):
         print("There is no indexing with this technique.")
 
-    query_embeddings = ir_dataset.query_embeddings(model_name=embedding)
+    query_embeddings = ir_dataset.query_embeddings(model_name=embedding, token_type="str")
 
     rmtree(output / ".tirex-tracker")
-    results = []
 
-    with tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
-        for query_id, query_components, query_values in query_embeddings:
-            current_res = seismic_dataset.search(query_id=query_id, query_components=query_components, query_values=query_values, k=k)
-            results.append(current_res)
+    def search(query, k):
+        return seismic_dataset.search(query_id=query.id, query_components=query.tokens, query_values=query.values, k=k)
+
+    with track_latency(output) as latency, tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
+        results = [(i.query_id, i.results) for i in latency.extend(batch_search(search, query_embeddings, k, threads))]
 
     rmtree(output / ".tirex-tracker")
-    with gzip.open(output/"run.txt.gz", "wt") as f:
-        for ranking_for_query in results:
-            rank = 1
-            for qid, score, docno in ranking_for_query:
-                f.write(f"{qid} Q0 {docno} {rank} {score} naive_search\n")
-                rank += 1
+    with RunWriter(output / "run.txt.gz", "naive_search") as run:
+        for qid, ranking_for_query in results:
+            run.add(qid, [docno for _, _, docno in ranking_for_query], [score for _, score, _ in ranking_for_query])
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import ir_datasets
+import lsr_benchmark
+import click
+from lsr_benchmark.click import retrieve_command
+from lsr_benchmark.search import InvertedIndex, BLOCK_SIZE
+from lsr_benchmark.batch import batch_search
+from lsr_benchmark.latency import track_latency
+from lsr_benchmark.index_cache import track_index
+from lsr_benchmark.runs import RunWriter
+from tqdm import tqdm
+from tirex_tracker import tracking, ExportFormat, register_metadata
+from shutil import rmtree
+import os
+
+# number of document embeddings that are loaded into memory at once while building the index
+CHUNK_SIZE = 10_000
+
+
+@retrieve_command()
+@click.option("--block-size", type=int, required=False, default=BLOCK_SIZE, help="Number of postings per block for the block-max pruning.")
+@click.option("--pruning", type=bool, required=False, default=True, help="Whether to use dynamic pruning (the top-k is exact either way).")
+@click.option("--threads", type=int, required=False, default=os.cpu_count(), help="Number of threads that search queries in parallel.")
+@click.option("--index-cache/--no-index-cache", default=True, help="Whether to reuse (and persist) the index across runs.")
+def main(dataset, embedding, output, k, block_size, pruning, threads, index_cache):
+    output.mkdir(parents=True, exist_ok=True)
+    lsr_benchmark.register_to_ir_datasets(dataset)
+    ir_dataset = ir_datasets.load(f"lsr-benchmark/{dataset}")
+    register_metadata({"actor": {"team": "reneuir-baselines"}, "tag": f"native-search-{embedding.replace('/', '-')}-{block_size}-{pruning}-{k}"})
+
+    def build(target_dir):
+        chunks = ir_dataset.doc_embeddings(model_name=embedding, chunk_size=CHUNK_SIZE)
+        InvertedIndex.from_embeddings(tqdm(chunks, "build inverted index"), block_size).save(target_dir)
+
+    with track_index(output, "native-search", ir_dataset.doc_embedding_files(embedding), {"block_size": block_size}, index_cache) as cache, tracking(export_file_path=output / "index-metadata.yml", export_format=ExportFormat.IR_METADATA):
+        index = InvertedIndex.load(cache.get(build))
+
+    query_embeddings = ir_dataset.query_embeddings(model_name=embedding)
+
+    rmtree(output / ".tirex-tracker")
+
+    def search(query, k):
+        return index.search(query.tokens, query.values, k, pruning)
+
+    with track_latency(output) as latency, tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
+        results = [(i.query_id, i.results) for i in latency.extend(batch_search(search, query_embeddings, k, threads))]
+
+    rmtree(output / ".tirex-tracker")
+    with RunWriter(output / "run.txt.gz", "native_search") as run:
+        for qid, ranking_for_query in results:
+            run.add(qid, [docno for docno, _ in ranking_for_query], [score for _, score in ranking_for_query])
+
+if __name__ == "__main__":
+    main()
@@ -9,8 +9,10 @@ from shutil import rmtree
 from more_itertools import chunked
 import ir_datasets
 from lsr_benchmark.click import retrieve_command
+from lsr_benchmark.latency import track_latency
+from lsr_benchmark.index_cache import track_index
+from lsr_benchmark.runs import RunWriter
 from math import floor
-import gzip
 
 import itertools
 import json
@@ -123,7 +125,8 @@ def clean_docid(docid):
     return str(docid)
 
 @retrieve_command()
-def main(dataset, output, embedding, k):
+@click.option("--index-cache/--no-index-cache", default=True, help="Whether to reuse (and persist) the index across runs.")
+def main(dataset, output, embedding, k, index_cache):
     output.mkdir(parents=True, exist_ok=True)
     lsr_benchmark.register_to_ir_datasets(dataset)
     ir_dataset = ir_datasets.load(f"lsr-benchmark/{dataset}")
@@ -131,24 +134,26 @@ def main(dataset, output, embedding, k):
     register_metadata({"actor": {"team": "reneuir-baselines"}, "tag": tag})
     index = AnseriniIndex(output)
 
-    documents = ({"id": doc_id, "vector": quantize_vector(convert_w_to_features(tokens,values)), "content": ""} for (doc_id, tokens, values) in tqdm(ir_dataset.doc_embeddings(model_name=embedding), "transform dataset"))
-    index.create_files(documents)
-
-    with tracking(export_file_path=output / "index-metadata.yml", export_format=ExportFormat.IR_METADATA):
+    def build(target_dir):
+        documents = ({"id": doc_id, "vector": quantize_vector(convert_w_to_features(tokens,values)), "content": ""} for (doc_id, tokens, values) in tqdm(ir_dataset.doc_embeddings(model_name=embedding, token_type="int"), "transform dataset"))
+        index.create_files(documents)
+        index.index_path = str(target_dir / "lucene")
         index.create_index()
+        index.reset_state()
+
+    with track_index(output, "pyserini", ir_dataset.doc_embedding_files(embedding), {"quantization": 100}, index_cache) as cache, tracking(export_file_path=output / "index-metadata.yml", export_format=ExportFormat.IR_METADATA):
+        index.index_path = str(cache.get(build) / "lucene")
 
     rmtree(output / ".tirex-tracker")
-    queries = ({"qid": query_id, "query_toks": quantize_vector(convert_w_to_features(query_components, query_values))} for (query_id, query_components, query_values) in  ir_dataset.query_embeddings(model_name=embedding))
+    queries = [{"qid": query_id, "query_toks": quantize_vector(convert_w_to_features(query_components, query_values))} for (query_id, query_components, query_values) in  ir_dataset.query_embeddings(model_name=embedding, token_type="int")]
 
-    with tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
-        run = index.search_batch(queries, k)
+    with track_latency(output) as latency, tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
+        with latency.batch([i["qid"] for i in queries]):
+            run = index.search_batch(queries, k)
 
-    with gzip.open(output/"run.txt.gz", "wt") as f:
+    with RunWriter(output / "run.txt.gz", "pyserini") as writer:
         for qid, query_result in run.items():
-            rank = 1
-            for docno, score in query_result.items():
-                f.write(f"{qid} Q0 {docno} {rank} {score} pyserini\n")
-                rank += 1
+            writer.add(qid, query_result.keys(), query_result.values())
 
 
 if __name__ == "__main__":
@@ -10,6 +10,8 @@ import pandas as pd
 from tira.third_party_integrations import ensure_pyterrier_is_loaded,  normalize_run
 import ir_datasets
 from lsr_benchmark.click import retrieve_command
+from lsr_benchmark.latency import track_latency
+from lsr_benchmark.index_cache import track_index
 from math import floor
 from pyterrier_pisa import PisaIndex
 
@@ -21,7 +23,8 @@ def splade_query_to_pyterrier_query(toks):
     return ' '.join( _matchop(k, v) for k, v in sorted(toks.items(), key=lambda x: (-x[1], x[0])))
 
 @retrieve_command()
-def main(dataset, output, embedding, k):
+@click.option("--index-cache/--no-index-cache", default=True, help="Whether to reuse (and persist) the index across runs.")
+def main(dataset, output, embedding, k, index_cache):
     output.mkdir(parents=True, exist_ok=True)
     lsr_benchmark.register_to_ir_datasets(dataset)
     ir_dataset = ir_datasets.load(f"lsr-benchmark/{dataset}")
@@ -29,25 +32,27 @@ def main(dataset, output, embedding, k):
     tag = f"pyterrier-splade-top-{k}"
     register_metadata({"actor": {"team": "reneuir-baselines"}, "tag": tag})
 
-    documents = []
+    def build(target_dir):
+        documents = []
 
-    for (doc_id, tokens, values) in tqdm(ir_dataset.doc_embeddings(model_name=embedding), "transform dataset"):
-        documents.append({'docno' : doc_id, 'toks': pyt_splade_encode(tokens, values)})
+        for (doc_id, tokens, values) in tqdm(ir_dataset.doc_embeddings(model_name=embedding, token_type="int"), "transform dataset"):
+            documents.append({'docno' : doc_id, 'toks': pyt_splade_encode(tokens, values)})
 
-    with tracking(export_file_path=output / "index-metadata.yml", export_format=ExportFormat.IR_METADATA):
-        rmtree("/tmp/.ignored", ignore_errors=True)
-        index = PisaIndex("/tmp/.ignored", stemmer='none')
-        index.index(tqdm(documents, "Index docs"))
+        PisaIndex(str(target_dir / "pisa"), stemmer='none').index(tqdm(documents, "Index docs"))
+
+    with track_index(output, "pyterrier-pisa", ir_dataset.doc_embedding_files(embedding), {"scale": 100}, index_cache) as cache, tracking(export_file_path=output / "index-metadata.yml", export_format=ExportFormat.IR_METADATA):
+        index = PisaIndex(str(cache.get(build) / "pisa"), stemmer='none')
 
     rmtree(output / ".tirex-tracker")
     queries = []
 
-    for query_id, query_components, query_values in  ir_dataset.query_embeddings(model_name=embedding):
+    for query_id, query_components, query_values in  ir_dataset.query_embeddings(model_name=embedding, token_type="int"):
         queries.extend([{"qid": query_id, "query_toks": pyt_splade_encode(query_components, query_values)}])
 
     pipeline =  index.quantized()
-    with tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
-        run = pipeline(pd.DataFrame(queries))
+    with track_latency(output) as latency, tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
+        with latency.batch([i["qid"] for i in queries]):
+            run = pipeline(pd.DataFrame(queries))
 
     pt.io.write_results(normalize_run(run, tag, k), f'{output}/run.txt')
 
@@ -10,6 +10,7 @@ import pandas as pd
 from tira.third_party_integrations import ensure_pyterrier_is_loaded,  normalize_run
 import ir_datasets
 from lsr_benchmark.click import retrieve_command
+from lsr_benchmark.latency import track_latency
 from math import floor
 
 def pyt_splade_encode(tokens, values, scale=100):
@@ -30,7 +31,7 @@ def main(dataset, output, embedding, k):
 
     documents = []
 
-    for (doc_id, tokens, values) in tqdm(ir_dataset.doc_embeddings(model_name=embedding), "transform dataset"):
+    for (doc_id, tokens, values) in tqdm(ir_dataset.doc_embeddings(model_name=embedding, token_type="int"), "transform dataset"):
         documents.append({'docno' : doc_id, 'toks': pyt_splade_encode(tokens, values)})
 
     with tracking(export_file_path=output / "index-metadata.yml", export_format=ExportFormat.IR_METADATA):
@@ -39,12 +40,13 @@ def main(dataset, output, embedding, k):
     rmtree(output / ".tirex-tracker")
     queries = []
 
-    for query_id, query_components, query_values in  ir_dataset.query_embeddings(model_name=embedding):
+    for query_id, query_components, query_values in  ir_dataset.query_embeddings(model_name=embedding, token_type="int"):
         queries.extend([{"qid": query_id, "query_toks": pyt_splade_encode(query_components, query_values)}])
 
     pipeline =  pt.terrier.Retriever(index, wmodel="Tf")
-    with tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
-        run = pipeline(pd.DataFrame(queries))
+    with track_latency(output) as latency, tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
+        with latency.batch([i["qid"] for i in queries]):
+            run = pipeline(pd.DataFrame(queries))
 
     pt.io.write_results(normalize_run(run, tag, k), f'{output}/run.txt')
 
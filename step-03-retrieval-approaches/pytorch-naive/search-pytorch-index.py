@@ -1,5 +1,4 @@
 #!/usr/bin/env python3
-import gzip
 from array import array
 from pathlib import Path
 from shutil import rmtree
@@ -12,6 +11,16 @@ from tirex_tracker import ExportFormat, register_metadata, tracking
 
 import lsr_benchmark
 from lsr_benchmark.click import retrieve_command
+from lsr_benchmark.latency import track_latency
+from lsr_benchmark.runs import RunRows, top_k_rows, write_trec_run
+
+# number of documents whose scores are materialized at once per query batch
+DOC_CHUNK_SIZE = 100_000
+
+
+def _tensor(buffer: array, dtype: torch.dtype) -> torch.Tensor:
+    # torch.frombuffer fails on empty buffers, e.g., for a batch of queries or documents without any token
+    return torch.frombuffer(buffer, dtype=dtype) if len(buffer) > 0 else torch.empty(0, dtype=dtype)
 
 
 class EmbeddingsToSparseTensor:
@@ -21,6 +30,15 @@ class EmbeddingsToSparseTensor:
         self.indices = array("i")
         self.indptr = array("L", [0])
 
+    @staticmethod
+    def from_matrix(matrix) -> "EmbeddingsToSparseTensor":
+        ret = EmbeddingsToSparseTensor()
+        ret.data.frombytes(np.ascontiguousarray(matrix.data, dtype=np.float32).tobytes())
+        ret.indices.frombytes(np.ascontiguousarray(matrix.indices, dtype=np.int32).tobytes())
+        ret.indptr = array("L")
+        ret.indptr.frombytes(np.ascontiguousarray(matrix.indptr - matrix.indptr[0], dtype=np.uint64).tobytes())
+        return ret
+
     def add(self, components: np.ndarray, values: np.ndarray) -> None:
         self.data.extend(values)
         self.indices.extend(components.astype(np.int32))
@@ -29,9 +47,9 @@ class EmbeddingsToSparseTensor:
     def to_tensor(self, device: torch.device | None = None, size: tuple[int, int] | None = None) -> torch.Tensor:
         return (
             torch.sparse_csr_tensor(
-                crow_indices=torch.frombuffer(self.indptr, dtype=torch.int64),
-                col_indices=torch.frombuffer(self.indices, dtype=torch.int32),
-                values=torch.frombuffer(self.data, dtype=torch.float32),
+                crow_indices=_tensor(self.indptr, torch.int64),
+                col_indices=_tensor(self.indices, torch.int32),
+                values=_tensor(self.data, torch.float32),
                 size=size if size else (len(self.indptr) - 1, max(self.indices) + 1 if self.indices else 0),
                 device=device,
             )
@@ -39,10 +57,31 @@ class EmbeddingsToSparseTensor:
             .to_sparse_csr()  # needed for some reason to work on GPU
         )
 
+def search_chunked(index: "list[torch.Tensor]", query_tensor: torch.Tensor, k: int) -> "tuple[torch.Tensor, torch.Tensor]":
+    """Top-k scores and document rows for a batch of dense queries against an index split into sparse document chunks.
+
+    The top-k of each chunk is merged into the running top-k, so memory is bounded by batch x (chunk + k) scores.
+    """
+    best_scores = torch.full((query_tensor.shape[0], 0), -torch.inf, device=query_tensor.device)
+    best_indices = torch.zeros((query_tensor.shape[0], 0), dtype=torch.int64, device=query_tensor.device)
+    offset = 0
+    for chunk in index:
+        scores = chunk.matmul(query_tensor.T).T
+        chunk_scores, chunk_indices = torch.topk(scores, k=min(k, scores.shape[1]), dim=-1)
+        candidate_scores = torch.cat([best_scores, chunk_scores], dim=-1)
+        candidate_indices = torch.cat([best_indices, chunk_indices + offset], dim=-1)
+        best_scores, positions = torch.topk(candidate_scores, k=min(k, candidate_scores.shape[1]), dim=-1)
+        best_indices = torch.gather(candidate_indices, -1, positions)
+        offset += chunk.shape[0]
+    return best_scores, best_indices
+
+
 @retrieve_command()
 @click.option("--use_gpu", is_flag=True, help="Whether to use a GPU if available.")
 @click.option("--batch_size", type=int, required=False, default=32, help="Batch size for processing.")
-def main(dataset, embedding, output, k, use_gpu, batch_size):
+@click.option("--doc_chunk_size", type=int, required=False, default=DOC_CHUNK_SIZE, help="Number of documents that are scored at once.")
+@click.option("--threads", type=int, required=False, default=None, help="Number of CPU threads for torch (default: all cores).")
+def main(dataset, embedding, output, k, use_gpu, batch_size, doc_chunk_size, threads):
     output.mkdir(parents=True, exist_ok=True)
     lsr_benchmark.register_to_ir_datasets(dataset)
     ir_dataset = ir_datasets.load(f"lsr-benchmark/{dataset}")
@@ -57,47 +96,39 @@ def main(dataset, embedding, output, k, use_gpu, batch_size):
         raise ValueError("No GPU available, but --use_gpu was set.")
     device = torch.device("cuda" if torch.cuda.is_available() and use_gpu else "cpu")
 
-    doc_embeddings = EmbeddingsToSparseTensor()
-    doc_ids = []
-    for doc_id, tokens, values in ir_dataset.doc_embeddings(model_name=embedding):
-        doc_ids.append(doc_id)
-        doc_embeddings.add(tokens, values)
+    doc_matrix = ir_dataset.doc_embeddings(model_name=embedding, token_type="int")
+    doc_ids = doc_matrix.ids
+    query_matrix = ir_dataset.query_embeddings(model_name=embedding, token_type="int")
+    vocabulary = int(max(doc_matrix.indices.max(initial=0), query_matrix.indices.max(initial=0))) + 1
 
-    with tracking(export_file_path=output / "index-metadata.yml", export_format=ExportFormat.IR_METADATA):
-        index = doc_embeddings.to_tensor(device=device)
+    if threads is not None:
+        torch.set_num_threads(threads)
 
-    query_embeddings = ir_dataset.query_embeddings(model_name=embedding)
+    with tracking(export_file_path=output / "index-metadata.yml", export_format=ExportFormat.IR_METADATA):
+        # the index is split into chunks of documents, so that scores are only materialized for one chunk at a time
+        index = [
+            EmbeddingsToSparseTensor.from_matrix(chunk).to_tensor(device=device, size=(len(chunk), vocabulary))
+            for chunk in doc_matrix.chunks(doc_chunk_size)
+        ]
 
     rmtree(output / ".tirex-tracker")
 
-    query_embeddings = EmbeddingsToSparseTensor()
-    query_ids = []
-    for query_id, tokens, values in ir_dataset.query_embeddings(model_name=embedding):
-        query_ids.append(query_id)
-        query_embeddings.add(tokens, values)
-
-    with tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
-        query_tensor = query_embeddings.to_tensor(device=device, size=(len(query_ids), index.shape[1])).to_dense()
+    with track_latency(output) as latency, tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
         results = []
 
-        for _query_tensor in query_tensor.split(batch_size):
-            scores = index.matmul(_query_tensor.T).T
-            topk_scores, topk_indices = torch.topk(scores, k=min(k, scores.shape[1]), dim=-1)
-            for query_id, scores, indices in zip(query_ids, topk_scores.cpu().numpy(), topk_indices.cpu().numpy()):
-                ranking_for_query = []
-                for score, doc_idx in zip(scores, indices):
-                    if score == 0:
-                        continue
-                    ranking_for_query.append((query_id, float(score), doc_ids[doc_idx]))
-                results.append(ranking_for_query)
+        for query_batch in query_matrix.chunks(batch_size):
+            with latency.batch(query_batch.ids):
+                # only the queries of the batch are dense
+                query_tensor = EmbeddingsToSparseTensor.from_matrix(query_batch).to_tensor(
+                    device=device, size=(len(query_batch), vocabulary)
+                ).to_dense()
+                topk_scores, topk_indices = search_chunked(index, query_tensor, k)
+                # copying to the cpu waits for the gpu, i.e., is part of the latency
+                topk_scores, topk_indices = topk_scores.cpu().numpy(), topk_indices.cpu().numpy()
+            results.append(top_k_rows(query_batch.ids, topk_scores, topk_indices, doc_ids))
 
     rmtree(output / ".tirex-tracker")
-    with gzip.open(output / "run.txt.gz", "wt") as f:
-        for ranking_for_query in results:
-            rank = 1
-            for qid, score, docno in ranking_for_query:
-                f.write(f"{qid} Q0 {docno} {rank} {score} seismic\n")
-                rank += 1
+    write_trec_run(output / "run.txt.gz", RunRows.concatenate(results), "pytorch")
 
 
 if __name__ == "__main__":
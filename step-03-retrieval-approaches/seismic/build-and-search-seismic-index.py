@@ -2,51 +2,62 @@
 import ir_datasets
 import lsr_benchmark
 from lsr_benchmark.click import retrieve_command
+from lsr_benchmark.batch import batch_search
+from lsr_benchmark.latency import track_latency
+from lsr_benchmark.index_cache import track_index
+from lsr_benchmark.runs import RunWriter
 import click
 from seismic import SeismicIndex, SeismicDataset, SeismicDatasetLV, SeismicIndexLV
 from tqdm import tqdm
 from tirex_tracker import tracking, ExportFormat, register_metadata
 from shutil import rmtree
 from pathlib import Path
-import gzip
+import os
+
+# number of document embeddings that are loaded into memory at once while building the dataset
+CHUNK_SIZE = 10_000
 
 
 @retrieve_command()
 @click.option("--heap-factor", type=float, required=False, default=0.8, help="TBD.")
 @click.option("--query-cut", type=int, required=False, default=10, help="Number of posting lists to explore when searching for candidates.")
 @click.option("--use-u32", type=bool, required=False, default=False, help="Whether to use u32 for component ids, required for datasets with many components..")
-def main(dataset, embedding, output, heap_factor, query_cut, k, use_u32):
+@click.option("--threads", type=int, required=False, default=os.cpu_count(), help="Number of threads that search queries in parallel.")
+@click.option("--index-cache/--no-index-cache", default=True, help="Whether to reuse (and persist) the index across runs.")
+def main(dataset, embedding, output, heap_factor, query_cut, k, use_u32, threads, index_cache):
     output.mkdir(parents=True, exist_ok=True)
     lsr_benchmark.register_to_ir_datasets(dataset)
     ir_dataset = ir_datasets.load(f"lsr-benchmark/{dataset}")
-    seismic_dataset = SeismicDatasetLV() if use_u32 else SeismicDataset()
-    
     index_class = SeismicIndexLV if use_u32 else SeismicIndex
     register_metadata({"actor": {"team": "reneuir-baselines"}, "tag": f"seismic-{embedding.replace('/', '-')}-{heap_factor}-{query_cut}-{k}"})
-    for (doc_id, tokens, values) in tqdm(ir_dataset.doc_embeddings(model_name=embedding), "create seismic dataset"):
-        seismic_dataset.add_document(doc_id, tokens, values)
 
-    print("Documents added to the SeismicDataset. Now indexing..")
-    with tracking(export_file_path=output / "index-metadata.yml", export_format=ExportFormat.IR_METADATA, ):
-        index = index_class.build_from_dataset(seismic_dataset)
+    def build(target_dir):
+        seismic_dataset = SeismicDatasetLV() if use_u32 else SeismicDataset()
+        for chunk in tqdm(ir_dataset.doc_embeddings(model_name=embedding, chunk_size=CHUNK_SIZE, token_type="str"), "create seismic dataset"):
+            for (doc_id, tokens, values) in chunk:
+                seismic_dataset.add_document(doc_id, tokens, values)
+
+        print("Documents added to the SeismicDataset. Now indexing..")
+        index_class.build_from_dataset(seismic_dataset).save(str(target_dir / "index"))
 
-    query_embeddings = ir_dataset.query_embeddings(model_name=embedding)
+    with track_index(output, "seismic", ir_dataset.doc_embedding_files(embedding), {"use_u32": use_u32}, index_cache) as cache, tracking(export_file_path=output / "index-metadata.yml", export_format=ExportFormat.IR_METADATA, ):
+        # seismic appends its own suffix to the file name of the saved index
+        index = index_class.load(str(next(cache.get(build).glob("index.*"))))
+
+    query_embeddings = ir_dataset.query_embeddings(model_name=embedding, token_type="str")
 
     rmtree(output / ".tirex-tracker")
-    results = []
 
-    with tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
-        for query_id, query_components, query_values in query_embeddings:
-            current_res = index.search(query_id=query_id, query_components=query_components, query_values=query_values, k=k, query_cut=query_cut, heap_factor=heap_factor)
-            results.append(current_res)
+    def search(query, k):
+        return index.search(query_id=query.id, query_components=query.tokens, query_values=query.values, k=k, query_cut=query_cut, heap_factor=heap_factor)
+
+    with track_latency(output) as latency, tracking(export_file_path=output / "retrieval-metadata.yml", export_format=ExportFormat.IR_METADATA):
+        results = [(i.query_id, i.results) for i in latency.extend(batch_search(search, query_embeddings, k, threads))]
 
     rmtree(output / ".tirex-tracker")
-    with gzip.open(output/"run.txt.gz", "wt") as f:
-        for ranking_for_query in results:
-            rank = 1
-            for qid, score, docno in ranking_for_query:
-                f.write(f"{qid} Q0 {docno} {rank} {score} seismic\n")
-                rank += 1
+    with RunWriter(output / "run.txt.gz", "seismic") as run:
+        for qid, ranking_for_query in results:
+            run.add(qid, [docno for _, _, docno in ranking_for_query], [score for _, score, _ in ranking_for_query])
 
 if __name__ == "__main__":
     main()
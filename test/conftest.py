@@ -0,0 +1,12 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def lsr_benchmark_home(tmp_path, monkeypatch):
+    """Each test caches (embeddings, docs stores, indexes, evaluations, ...) into its own LSR_BENCHMARK_HOME.
+
+    The unittest classes access the directory via lsr_benchmark.cache.cache_home().
+    """
+    home = tmp_path / "lsr-benchmark-home"
+    monkeypatch.setenv("LSR_BENCHMARK_HOME", str(home))
+    return home
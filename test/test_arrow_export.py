@@ -0,0 +1,89 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from lsr_benchmark import load
+from lsr_benchmark.arrow import export_dataset, id_array, sparse_embedding_matrix, sparse_embedding_table
+from lsr_benchmark.irds import IdTable, SparseEmbeddingMatrix
+
+RESOURCE_DIR = Path(__file__).parent / "resources"
+DATASET_DIR = str(RESOURCE_DIR / "example-dataset")
+EMBEDDING_DIR = str(RESOURCE_DIR / "example-embeddings")
+
+
+class TestArrowExport(unittest.TestCase):
+    def setUp(self):
+        self.out = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.out.cleanup()
+
+    def export(self, file_format="arrow"):
+        export_dataset(load(DATASET_DIR), self.out.name, [EMBEDDING_DIR], file_format)
+        return load(self.out.name, format="arrow")
+
+    def test_docs_are_identical(self):
+        expected = list(load(DATASET_DIR).docs_iter())
+        actual = list(self.export().docs_iter())
+
+        self.assertEqual(expected, actual)
+
+    def test_queries_and_qrels_are_identical(self):
+        expected = load(DATASET_DIR)
+        actual = self.export()
+
+        self.assertEqual(list(expected.queries_iter()), list(actual.queries_iter()))
+        self.assertEqual(list(expected.qrels_iter()), list(actual.qrels_iter()))
+
+    def test_docs_table_can_be_scanned(self):
+        table = self.export().docs_table()
+
+        self.assertEqual(["doc_id", "text", "segments"], table.column_names)
+        self.assertIn("92c8f82d-c8f9-4565-b273-6c1fea175861", table.column("doc_id").to_pylist())
+
+    def test_embeddings_are_identical(self):
+        expected = load(DATASET_DIR).doc_embeddings(EMBEDDING_DIR)
+        actual = self.export().doc_embeddings(EMBEDDING_DIR)
+
+        self.assertEqual(list(expected.ids), list(actual.ids))
+        np.testing.assert_array_equal(expected.indptr, actual.indptr)
+        np.testing.assert_array_equal(expected.indices, actual.indices)
+        np.testing.assert_array_equal(expected.data, actual.data)
+        self.assertEqual([2, 7, 11], actual[0].tokens.tolist())
+
+    def test_chunked_query_embeddings_with_string_tokens(self):
+        chunks = list(self.export().query_embeddings(EMBEDDING_DIR, chunk_size=2, token_type="str"))
+
+        self.assertEqual([2, 1], [len(i) for i in chunks])
+        self.assertEqual(np.str_, type(chunks[0][0].tokens[0]))
+
+    def test_parquet_export(self):
+        expected = load(DATASET_DIR)
+        actual = self.export("parquet")
+
+        self.assertTrue((Path(self.out.name) / "docs.parquet").is_file())
+        self.assertEqual(list(expected.docs_iter()), list(actual.docs_iter()))
+        self.assertEqual(len(expected.doc_embeddings(EMBEDDING_DIR)), len(actual.doc_embeddings(EMBEDDING_DIR)))
+
+    def test_id_array_shares_the_blob_of_the_id_table(self):
+        ids = IdTable.from_ids(["d1", "document-2", "", "d-ä"])
+
+        self.assertEqual(["d1", "document-2", "", "d-ä"], id_array(ids).to_pylist())
+        self.assertEqual(["document-2", ""], id_array(ids[1:3]).to_pylist())
+
+    def test_sparse_embedding_table_round_trip(self):
+        ids = IdTable.from_ids(["d1", "d2", "d-ä"])
+        data, indices = np.array([0.5, 1.5], np.float32), np.array([3, 4], np.int32)
+        matrix = SparseEmbeddingMatrix(ids[1:], data, indices, np.array([0, 1, 2]), "int")
+
+        actual = sparse_embedding_matrix(sparse_embedding_table(matrix))
+
+        self.assertEqual(["d2", "d-ä"], list(actual.ids))
+        self.assertEqual([0, 1, 2], actual.indptr.tolist())
+        self.assertEqual([4], actual[1].tokens.tolist())
+
+        empty = sparse_embedding_matrix(sparse_embedding_table(matrix[:0]))
+        self.assertEqual(0, len(empty))
+        self.assertEqual(np.int64, empty.indptr.dtype)
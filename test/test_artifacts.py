@@ -0,0 +1,162 @@
+import hashlib
+import os
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from lsr_benchmark.artifacts import ArtifactStore, fetch_artifact, parse_size, refreshable
+
+
+def write_download(directory: Path, files: "dict[str, str]") -> Path:
+    for name, content in files.items():
+        (directory / name).parent.mkdir(parents=True, exist_ok=True)
+        (directory / name).write_text(content)
+    return directory
+
+
+class TestArtifactStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.tmp = Path(self.directory.name)
+        self.store = ArtifactStore(self.tmp / "store", grace_seconds=0)
+        self.fetched = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def fetch(self, name: str, files: "dict[str, str]"):
+        def fetch(refresh=False):
+            self.fetched.append(name)
+            return write_download(self.tmp / "downloads" / f"{name}-{len(self.fetched)}", files)
+
+        return fetch
+
+    def test_artifacts_are_fetched_once(self):
+        fetch = self.fetch("a", {"queries.jsonl": "q", "corpus/docs.jsonl": "docs"})
+
+        tree = self.store.get("datasets/a", fetch)
+
+        self.assertEqual(tree, self.store.get("datasets/a", fetch))
+        self.assertEqual(["a"], self.fetched)
+        self.assertEqual("docs", (tree / "corpus" / "docs.jsonl").read_text())
+        self.assertEqual(tree, ArtifactStore(self.tmp / "store").get("datasets/a", fetch))
+
+    def test_files_are_stored_once(self):
+        tree_a = self.store.get("datasets/a", self.fetch("a", {"docs.jsonl": "docs", "queries.jsonl": "a"}))
+        tree_b = self.store.get("datasets/b", self.fetch("b", {"docs.jsonl": "docs", "queries.jsonl": "b"}))
+
+        self.assertEqual((tree_a / "docs.jsonl").stat().st_ino, (tree_b / "docs.jsonl").stat().st_ino)
+        self.assertEqual(len("docs") + 2, self.store.size())
+
+    def test_downloads_are_copied(self):
+        tree = self.store.get("datasets/a", self.fetch("a", {"docs.jsonl": "docs"}))
+        download = self.tmp / "downloads" / "a-1" / "docs.jsonl"
+
+        self.assertNotEqual(download.stat().st_ino, (tree / "docs.jsonl").stat().st_ino)
+        download.write_text("DOCS")
+        self.assertEqual("docs", (tree / "docs.jsonl").read_text())
+        self.assertTrue(self.store.verify("datasets/a"))
+
+    def test_corrupted_artifacts_bypass_the_cache_of_the_client(self):
+        cache = self.tmp / "client-cache" / "a"
+
+        def download():
+            # a client that downloads once and then returns its cached directory
+            if not cache.is_dir():
+                self.fetched.append("a")
+                write_download(cache, {"docs.jsonl": "docs"})
+            return cache
+
+        fetch = refreshable(download)
+        self.store.get("datasets/a", fetch)
+        (cache / "docs.jsonl").write_text("DOCS")
+        tree = self.store.get("datasets/a", fetch)
+        os.chmod(tree / "docs.jsonl", 0o644)
+        (tree / "docs.jsonl").write_text("D0CS")
+
+        self.assertFalse(self.store.verify("datasets/a"))
+        self.assertEqual("docs", (self.store.get("datasets/a", fetch) / "docs.jsonl").read_text())
+        self.assertTrue(self.store.verify("datasets/a"))
+        self.assertEqual(["a", "a"], self.fetched)
+
+    def test_link_into_outputs(self):
+        fetch = self.fetch("a", {"run.txt": "run"})
+        (self.tmp / "downloads" / "a-1" / "empty").mkdir(parents=True)
+
+        out = self.store.link("runs/a", fetch, self.tmp / "out" / "a")
+
+        self.assertEqual("run", (out / "run.txt").read_text())
+        self.assertTrue((out / "empty").is_dir())
+        tree = self.store.get("runs/a", fetch)
+        self.assertEqual((tree / "run.txt").stat().st_ino, (out / "run.txt").stat().st_ino)
+        if os.geteuid() != 0:
+            with self.assertRaises(PermissionError):
+                (out / "run.txt").write_text("modified")
+
+    def test_corrupted_artifacts_are_fetched_again(self):
+        fetch = self.fetch("a", {"docs.jsonl": "docs"})
+        tree = self.store.get("datasets/a", fetch)
+        os.chmod(tree / "docs.jsonl", 0o644)
+        (tree / "docs.jsonl").write_text("DOCS")
+
+        self.assertFalse(self.store.verify("datasets/a"))
+        self.assertEqual("docs", (self.store.get("datasets/a", fetch) / "docs.jsonl").read_text())
+        self.assertTrue(self.store.verify("datasets/a"))
+        self.assertEqual(["a", "a"], self.fetched)
+
+    def test_truncated_files_are_detected_on_access(self):
+        fetch = self.fetch("a", {"docs.jsonl": "docs"})
+        tree = self.store.get("datasets/a", fetch)
+        os.chmod(tree / "docs.jsonl", 0o644)
+        (tree / "docs.jsonl").write_text("do")
+
+        self.assertEqual("docs", (self.store.get("datasets/a", fetch) / "docs.jsonl").read_text())
+        self.assertEqual(["a", "a"], self.fetched)
+
+    def test_least_recently_used_artifacts_are_evicted(self):
+        self.store.max_bytes = 10
+        fetch_a, fetch_b = self.fetch("a", {"docs": "aaaa"}), self.fetch("b", {"docs": "bbbb"})
+        self.store.get("a", fetch_a)
+        self.store.get("b", fetch_b)
+        # a was accessed more recently than b
+        os.utime(self.tmp / "store" / "refs" / f"{hashlib.sha256(b'b').hexdigest()}.json", (0, 0))
+        self.store.get("a", fetch_a)
+
+        self.store.get("c", self.fetch("c", {"docs": "cccc"}))
+
+        self.assertEqual(8, self.store.size())
+        self.store.get("a", fetch_a)
+        self.assertEqual(["a", "b", "c"], self.fetched)
+        self.store.get("b", fetch_b)
+        self.assertEqual(["a", "b", "c", "b"], self.fetched)
+
+    def test_concurrent_gets(self):
+        barrier = threading.Barrier(4)
+
+        def get():
+            barrier.wait()
+            self.store.get("datasets/a", self.fetch("a", {"docs.jsonl": "docs"}))
+
+        threads = [threading.Thread(target=get) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(self.store.verify("datasets/a"))
+        self.assertEqual(len("docs"), self.store.size())
+
+    def test_without_cache_directory(self):
+        with mock.patch("lsr_benchmark.artifacts.artifact_store", side_effect=OSError()):
+            out = fetch_artifact("a", self.fetch("a", {"docs": "docs"}), self.tmp / "out")
+
+        self.assertEqual("docs", (out / "docs").read_text())
+
+    def test_parse_size(self):
+        self.assertEqual([100, 512 * 1024**2, 100 * 1024**3, int(1.5 * 1024**4)], [parse_size(i) for i in ("100", "512M", "100gb", "1.5T")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from pathlib import Path
+
+from lsr_benchmark.batch import batch_search
+from lsr_benchmark.irds import embeddings
+from lsr_benchmark.search import InvertedIndex
+
+RESOURCE_DIR = Path(__file__).parent / "resources"
+DATASET_DIR = str(RESOURCE_DIR / "example-dataset")
+EMBEDDING_DIR = str(RESOURCE_DIR / "example-embeddings")
+
+
+class TestBatchSearch(unittest.TestCase):
+    def setUp(self):
+        self.index = InvertedIndex.from_embeddings(embeddings(DATASET_DIR, EMBEDDING_DIR, "doc"))
+        self.queries = embeddings(DATASET_DIR, EMBEDDING_DIR, "query")
+        # repeat the queries so that they are spread over several shards
+        self.queries = [query for _ in range(20) for query in self.queries]
+        self.expected = [self.index.search(i.tokens, i.values, 3) for i in self.queries]
+
+    def test_sequential(self):
+        actual = batch_search(self.index, self.queries, k=3, threads=1)
+
+        self.assertEqual([i.id for i in self.queries], [i.query_id for i in actual])
+        self.assertEqual(self.expected, [i.results for i in actual])
+        self.assertTrue(all(i.latency >= 0 for i in actual))
+
+    def test_threads_preserve_query_order(self):
+        actual = batch_search(self.index, self.queries, k=3, threads=4)
+
+        self.assertEqual([i.id for i in self.queries], [i.query_id for i in actual])
+        self.assertEqual(self.expected, [i.results for i in actual])
+
+    def test_processes_preserve_query_order(self):
+        actual = batch_search(self.index, self.queries, k=3, threads=2, executor="process")
+
+        self.assertEqual([i.id for i in self.queries], [i.query_id for i in actual])
+        self.assertEqual(self.expected, [i.results for i in actual])
+
+    def test_search_function_as_engine(self):
+        actual = batch_search(lambda query, k: (query.id, k), self.queries[:3], k=7, threads=2)
+
+        self.assertEqual([(i.id, 7) for i in self.queries[:3]], [i.results for i in actual])
+
+    def test_unknown_executor(self):
+        with self.assertRaises(ValueError):
+            batch_search(self.index, self.queries, executor="does-not-exist")
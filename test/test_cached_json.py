@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+import time
+import unittest
+from unittest import mock
+
+from lsr_benchmark.cache import cache_home, cached_json
+
+
+class TestCachedJson(unittest.TestCase):
+    def test_value_is_computed_once(self):
+        compute = mock.Mock(return_value=["a", "b"])
+
+        self.assertEqual(["a", "b"], cached_json("test.json", compute))
+        self.assertEqual(["a", "b"], cached_json("test.json", compute))
+        self.assertEqual(1, compute.call_count)
+
+    def test_expired_value_is_recomputed(self):
+        cached_json("test.json", lambda: ["a"])
+        os.utime(cache_home() / "test.json", (time.time() - 10, time.time() - 10))
+
+        self.assertEqual(["b"], cached_json("test.json", lambda: ["b"], ttl=5))
+
+    def test_force_reload(self):
+        cached_json("test.json", lambda: ["a"])
+
+        self.assertEqual(["b"], cached_json("test.json", lambda: ["b"], force_reload=True))
+
+    def test_expired_value_is_used_when_offline(self):
+        def offline():
+            raise ConnectionError("offline")
+
+        cached_json("test.json", lambda: ["a"])
+
+        self.assertEqual(["a"], cached_json("test.json", offline, force_reload=True))
+        with self.assertRaises(ConnectionError):
+            cached_json("does-not-exist.json", offline)
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_import_does_not_load_ir_datasets_or_tira(self):
+        code = "import sys, lsr_benchmark; print(any(i.split('.')[0] in ('ir_datasets', 'tira') for i in sys.modules))"
+        actual = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+        self.assertEqual("False", actual.stdout.strip())
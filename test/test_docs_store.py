@@ -0,0 +1,65 @@
+import gzip
+import json
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from lsr_benchmark import load
+from lsr_benchmark.cache import cache_home
+from lsr_benchmark.irds import LsrBenchmarkDocsStore
+
+RESOURCE_DIR = str(Path(__file__).parent / "resources" / "example-dataset")
+
+
+class TestDocsStore(unittest.TestCase):
+    def test_get_from_local_directory(self):
+        docs_store = load(RESOURCE_DIR).docs_store()
+
+        actual = docs_store.get("92c8f82d-c8f9-4565-b273-6c1fea175861")
+
+        self.assertEqual("92c8f82d-c8f9-4565-b273-6c1fea175861", actual.doc_id)
+        self.assertEqual("here is some text", actual.default_text())
+        self.assertEqual(1, len(actual.segments))
+
+    def test_get_many_from_local_directory(self):
+        docs_store = load(RESOURCE_DIR).docs_store()
+
+        actual = docs_store.get_many(["302a8583-d3f6-450e-ad18-dc302cae36f4", "does-not-exist"])
+
+        self.assertEqual(["302a8583-d3f6-450e-ad18-dc302cae36f4"], list(actual.keys()))
+        self.assertEqual("hello world", actual["302a8583-d3f6-450e-ad18-dc302cae36f4"].default_text())
+
+    def test_get_missing_doc_raises(self):
+        docs_store = load(RESOURCE_DIR).docs_store()
+
+        with self.assertRaises(KeyError):
+            docs_store.get("does-not-exist")
+
+    def test_docs_count(self):
+        self.assertEqual(4, load(RESOURCE_DIR).docs_count())
+
+    def test_docs_count_does_not_build_the_docs_store(self):
+        dataset = load(RESOURCE_DIR)
+
+        with mock.patch.object(LsrBenchmarkDocsStore, "build", side_effect=AssertionError("the docs store was built")):
+            self.assertEqual(4, dataset.docs_count())
+        self.assertFalse(dataset.docs_store().built())
+
+        dataset.docs_store().build()
+        self.assertEqual(4, dataset.docs_count())
+
+    def test_random_access_over_many_blocks(self):
+        corpus_file = cache_home() / "corpus.jsonl.gz"
+        with gzip.open(corpus_file, "wt") as f:
+            for i in range(500):
+                text = f"text of document {i} " * 20
+                f.write(json.dumps({"doc_id": f"doc-{i}", "segments": [{"start": 1, "end": 2, "text": text}]}) + "\n")
+
+        with mock.patch("lsr_benchmark.irds.CORPUS_BLOCK_SIZE", 1024):
+            docs_store = LsrBenchmarkDocsStore(corpus_file)
+            actual = docs_store.get_many(["doc-499", "doc-0", "doc-250", "doc-251"])
+
+        self.assertEqual(500, docs_store.count())
+        self.assertEqual({"doc-0", "doc-250", "doc-251", "doc-499"}, set(actual.keys()))
+        self.assertEqual("text of document 250 " * 20, actual["doc-250"].default_text())
+        self.assertEqual("text of document 499 " * 20, docs_store.get("doc-499").default_text())
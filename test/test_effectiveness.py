@@ -0,0 +1,115 @@
+import unittest
+
+import ir_measures
+import numpy as np
+from ir_measures import RR, P, R, nDCG
+
+from lsr_benchmark.effectiveness import QrelsIndex, evaluate_runs, supports
+from lsr_benchmark.runs import ColumnarRun, RunRows
+
+MEASURES = [
+    nDCG @ 10,
+    nDCG(judged_only=True) @ 10,
+    nDCG,
+    P @ 10,
+    P(rel=2) @ 5,
+    RR,
+    R @ 5,
+    R @ 1000,
+    R(judged_only=True) @ 5,
+]
+
+
+def random_qrels(rng: np.random.Generator, num_queries: int, num_docs: int) -> "dict[str, dict[str, int]]":
+    ret = {}
+    for query in range(num_queries):
+        docs = rng.choice(num_docs, rng.integers(1, 20), replace=False)
+        ret[f"q{query}"] = {f"d{i}": int(rng.integers(0, 4)) for i in docs}
+    return ret
+
+
+def random_run(rng: np.random.Generator, num_queries: int, num_docs: int) -> RunRows:
+    query_ids, doc_ids, scores = [], [], []
+    # some queries are not retrieved, some retrieved queries are not judged
+    for query in rng.choice(num_queries + 5, num_queries, replace=False):
+        docs = rng.choice(num_docs, rng.integers(0, 30), replace=False)
+        query_ids += [f"q{query}"] * len(docs)
+        doc_ids += [f"d{i}" for i in docs]
+        # few distinct scores, so that many documents are tied
+        scores += rng.integers(0, 5, len(docs)).astype(np.float32).tolist()
+    return RunRows(np.array(query_ids), np.array(doc_ids), np.ones(len(query_ids), dtype=np.int32), np.array(scores, dtype=np.float32))
+
+
+def ir_measures_run(run: RunRows) -> "dict[str, dict[str, float]]":
+    ret: "dict[str, dict[str, float]]" = {}
+    for query_id, doc_id, score in zip(run.query_ids.tolist(), run.doc_ids.tolist(), run.scores.tolist()):
+        ret.setdefault(query_id, {})[doc_id] = score
+    return ret
+
+
+class TestEffectiveness(unittest.TestCase):
+    def assertMatchesIrMeasures(self, qrels, runs):
+        actual = evaluate_runs(QrelsIndex.from_dict(qrels), [ColumnarRun.from_rows(i) for i in runs], MEASURES)
+
+        for run, scores in zip(runs, actual):
+            expected = ir_measures.calc_aggregate(MEASURES, qrels, ir_measures_run(run))
+            for measure in MEASURES:
+                self.assertAlmostEqual(expected[measure], scores[str(measure)], places=10, msg=str(measure))
+
+    def test_random_runs_match_ir_measures(self):
+        rng = np.random.default_rng(0)
+        qrels = random_qrels(rng, 40, 60)
+
+        self.assertMatchesIrMeasures(qrels, [random_run(rng, 40, 60) for _ in range(20)])
+
+    def test_negative_relevance_is_unjudged(self):
+        rng = np.random.default_rng(2)
+        qrels = random_qrels(rng, 40, 60)
+        for judgments in qrels.values():
+            for doc_id in judgments:
+                if rng.random() < 0.3:
+                    judgments[doc_id] = -1
+
+        self.assertMatchesIrMeasures(qrels, [random_run(rng, 40, 60) for _ in range(5)])
+
+        qrels = {"q1": {"d1": 1, "d2": -2, "d3": 0}}
+        run = RunRows(np.array(["q1"] * 3), np.array(["d1", "d2", "d4"]), np.array([1, 2, 3]), np.array([1, 3, 2], np.float32))
+        self.assertMatchesIrMeasures(qrels, [run])
+
+    def test_ties_are_broken_by_descending_doc_id(self):
+        qrels = {"q1": {"d1": 1, "d10": 0, "d2": 0}}
+        run = RunRows(np.array(["q1"] * 3), np.array(["d1", "d2", "d10"]), np.array([1, 2, 3]), np.ones(3, np.float32))
+
+        self.assertMatchesIrMeasures(qrels, [run])
+        self.assertEqual(1 / 3, evaluate_runs(QrelsIndex.from_dict(qrels), [ColumnarRun.from_rows(run)], [RR])[0]["RR"])
+
+    def test_duplicate_documents_keep_the_last_score(self):
+        qrels = {"q1": {"d1": 1, "d2": 1}}
+        run = RunRows(np.array(["q1"] * 3), np.array(["d1", "d3", "d1"]), np.array([1, 2, 3]), np.array([3, 2, 1], np.float32))
+
+        self.assertMatchesIrMeasures(qrels, [run])
+
+    def test_empty_run(self):
+        qrels = {"q1": {"d1": 1}}
+
+        actual = evaluate_runs(QrelsIndex.from_dict(qrels), [ColumnarRun.concatenate([])], MEASURES)
+
+        self.assertEqual([0.0] * len(MEASURES), list(actual[0].values()))
+
+    def test_qrels_to_dict(self):
+        qrels = random_qrels(np.random.default_rng(1), 5, 20)
+
+        self.assertEqual(qrels, QrelsIndex.from_dict(qrels).to_dict())
+
+    def test_unsupported_measures(self):
+        self.assertTrue(all(supports(i) for i in MEASURES))
+        self.assertFalse(supports(ir_measures.AP))
+        self.assertFalse(supports(P))
+        self.assertFalse(supports(RR @ 10))
+        self.assertFalse(supports(nDCG(dcg="exp-log2") @ 10))
+        with self.assertRaises(ValueError):
+            evaluate_runs(QrelsIndex.from_dict({}), [], [ir_measures.AP])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from lsr_benchmark.cache import cache_home
+from lsr_benchmark.irds import embeddings, memory_mapped_embeddings
+
+RESOURCE_DIR = Path(__file__).parent / "resources"
+NPZ_FILE = RESOURCE_DIR / "example-embeddings" / "doc" / "doc-embeddings.npz"
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def test_arrays_are_memory_mapped(self):
+        actual = memory_mapped_embeddings(NPZ_FILE)
+
+        for name in ["data", "indices", "indptr"]:
+            self.assertIsInstance(actual[name], np.memmap)
+            self.assertFalse(actual[name].flags.writeable)
+
+    def test_arrays_are_identical_to_npz(self):
+        expected = np.load(NPZ_FILE)
+        actual = memory_mapped_embeddings(NPZ_FILE)
+
+        for name in ["data", "indices", "indptr"]:
+            self.assertEqual(expected[name].dtype, actual[name].dtype)
+            self.assertEqual(expected[name].tolist(), actual[name].tolist())
+
+    def test_cache_entry_is_reused(self):
+        first = memory_mapped_embeddings(NPZ_FILE)
+        second = memory_mapped_embeddings(NPZ_FILE)
+
+        self.assertEqual(first["data"].filename, second["data"].filename)
+        self.assertEqual(1, len(list((cache_home() / "embeddings" / "v1").iterdir())))
+
+    def test_embeddings_use_the_cache(self):
+        actual = embeddings(str(RESOURCE_DIR / "example-dataset"), str(RESOURCE_DIR / "example-embeddings"), "doc")
+
+        self.assertIsInstance(actual.data, np.memmap)
+        self.assertEqual([1.5, 0.5, 2.0], actual[0].values.tolist())
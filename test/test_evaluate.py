@@ -0,0 +1,108 @@
+import gzip
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from lsr_benchmark._commands import _evaluate
+from lsr_benchmark.effectiveness import QrelsIndex
+
+DATASETS = ("trec-18-web-20251008-test", "trec-19-web-20251008-test")
+QRELS = {
+    DATASETS[0]: {"q1": {"d1": 1, "d2": 0}, "q2": {"d3": 1}},
+    DATASETS[1]: {"q1": {"d2": 1}},
+}
+
+
+def write_approach(directory: Path, dataset: str, run: "list[tuple[str, str, float]]") -> str:
+    directory.mkdir(parents=True)
+    (directory / "retrieval-metadata.yml").write_text(
+        f"actor:\n  team: t\ntag: x\ndata:\n  test collection:\n    name: {dataset}\n"
+        "resources:\n  runtime:\n    wallclock: 40 ms\n"
+    )
+    with gzip.open(directory / "run.txt.gz", "wt") as f:
+        for rank, (query_id, doc_id, score) in enumerate(run):
+            f.write(f"{query_id} Q0 {doc_id} {rank + 1} {score} x\n")
+    return str(directory)
+
+
+class TestEvaluate(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.qrels = dict(QRELS)
+        self.load_qrels = mock.patch.object(
+            _evaluate, "__load_qrels", side_effect=lambda i: QrelsIndex.from_dict(self.qrels[i])
+        )
+        self.load_qrels.start()
+        self.qrels_checksum = mock.patch.object(_evaluate, "__qrels_checksum", side_effect=lambda i: str(self.qrels[i]))
+        self.qrels_checksum.start()
+        self.measures = [getattr(_evaluate, "__parse_measure")(i) for i in ("RR", "runtime_wallclock")]
+
+        runs = Path(self.directory.name) / "runs"
+        self.approaches = [
+            write_approach(runs / "a", DATASETS[0], [("q1", "d2", 2), ("q1", "d1", 1), ("q2", "d3", 1)]),
+            write_approach(runs / "b", DATASETS[1], [("q1", "d1", 2), ("q1", "d2", 1)]),
+            write_approach(runs / "c", DATASETS[0], [("q1", "d1", 2), ("q2", "d4", 1)]),
+        ]
+
+    def tearDown(self):
+        self.qrels_checksum.stop()
+        self.load_qrels.stop()
+        self.directory.cleanup()
+
+    def evaluate(self, **kwargs):
+        return _evaluate.evaluate_approaches(self.approaches, self.measures, **kwargs)
+
+    def test_runs_are_grouped_by_dataset(self):
+        actual = self.evaluate(workers=2)
+
+        self.assertEqual(self.approaches, [i["approach"] for i in actual])
+        self.assertEqual([0.75, 0.5, 0.5], [i["RR"] for i in actual])
+        self.assertEqual(["40 ms"] * 3, [i["retrieval.runtime_wallclock"] for i in actual])
+        self.assertEqual([DATASETS[0], DATASETS[1], DATASETS[0]], [i["tira-dataset-id"] for i in actual])
+        self.assertEqual(2, getattr(_evaluate, "__load_qrels").call_count)
+        self.assertEqual(2, getattr(_evaluate, "__qrels_checksum").call_count)
+
+    def test_runs_of_a_dataset_are_evaluated_in_one_call(self):
+        from lsr_benchmark import effectiveness
+
+        with mock.patch.object(effectiveness, "evaluate_runs", wraps=effectiveness.evaluate_runs) as evaluate_runs:
+            actual = self.evaluate(workers=1)
+
+        self.assertEqual([0.75, 0.5, 0.5], [i["RR"] for i in actual])
+        self.assertEqual([2, 1], [len(i.args[1]) for i in evaluate_runs.call_args_list])
+
+    def test_measures_that_are_not_vectorised(self):
+        self.measures.append(getattr(_evaluate, "__parse_measure")("AP"))
+
+        self.assertEqual([0.75, 0.5, 0.5], [i["AP"] for i in self.evaluate(workers=1)])
+
+    def test_pool_matches_serial_evaluation(self):
+        self.assertEqual(self.evaluate(workers=1, cache=False), self.evaluate(workers=2, cache=False))
+
+    def test_scores_are_cached(self):
+        expected = self.evaluate(workers=1)
+
+        with mock.patch.object(_evaluate, "__read_run", side_effect=AssertionError("the run was parsed again")):
+            self.assertEqual(expected, self.evaluate(workers=1))
+
+    def test_changed_runs_and_measures_are_evaluated_again(self):
+        self.evaluate(workers=1)
+        write_approach(Path(self.approaches[0]).with_name("d"), DATASETS[0], [("q1", "d1", 1), ("q2", "d3", 1)])
+        os.replace(Path(self.approaches[0]).with_name("d") / "run.txt.gz", Path(self.approaches[0]) / "run.txt.gz")
+
+        self.assertEqual([1.0, 0.5, 0.5], [i["RR"] for i in self.evaluate(workers=1)])
+
+        self.measures.append(getattr(_evaluate, "__parse_measure")("P_1"))
+        self.assertEqual([1.0, 0.0, 0.5], [i["P@1"] for i in self.evaluate(workers=1)])
+
+    def test_scores_are_evaluated_again_for_updated_qrels(self):
+        self.evaluate(workers=1)
+        self.qrels[DATASETS[1]] = {"q1": {"d1": 1}}
+
+        self.assertEqual([0.75, 1.0, 0.5], [i["RR"] for i in self.evaluate(workers=1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
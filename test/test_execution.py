@@ -0,0 +1,113 @@
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from lsr_benchmark.execution import ApproachManifest, ContainerBackend, LocalProcessBackend, execution_backend
+
+APPROACHES = Path(__file__).parent.parent / "step-03-retrieval-approaches"
+SCRIPT = """import os, resource, sys
+dataset, output = sys.argv[1], sys.argv[2]
+print("threads", os.environ.get("OMP_NUM_THREADS"), "embeddings", sys.argv[3:])
+print("data", resource.getrlimit(resource.RLIMIT_DATA)[0])
+open(os.path.join(output, "run.txt"), "w").write(open(os.path.join(dataset, "queries.jsonl")).read())
+sys.exit(int(os.environ.get("EXIT_CODE", "0")))
+"""
+
+
+class TestExecution(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.tmp = Path(self.directory.name)
+        self.approach = self.tmp / "my approach"
+        self.approach.mkdir()
+        (self.approach / "search.py").write_text(SCRIPT)
+        (self.approach / "lsr-benchmark.yml").write_text(
+            "name: my-approach\n"
+            "command: /search.py $inputDataset $outputDir $inputRun\n"
+            "local-command: $python search.py $inputDataset $outputDir $inputRun\n"
+        )
+        self.dataset = self.tmp / "data set"
+        self.dataset.mkdir()
+        (self.dataset / "queries.jsonl").write_text("q1\n")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_load_manifest(self):
+        actual = ApproachManifest.load(self.approach)
+
+        self.assertEqual("my-approach", actual.name)
+        self.assertEqual("/search.py $inputDataset $outputDir $inputRun", actual.command)
+        self.assertEqual("$python search.py $inputDataset $outputDir $inputRun", actual.local_command)
+
+    def test_all_approaches_have_a_manifest(self):
+        for directory in [*APPROACHES.glob("*/Dockerfile"), *APPROACHES.glob("lexical/*/Dockerfile")]:
+            manifest = ApproachManifest.load(directory.parent)
+            self.assertTrue((directory.parent / "lsr-benchmark.yml").is_file(), directory.parent)
+            self.assertIn("$outputDir", manifest.local_command)
+            script = directory.parent / manifest.local_command.split()[1]
+            self.assertTrue(script.is_file(), manifest.local_command)
+
+    def test_manifest_from_readme(self):
+        (self.approach / "lsr-benchmark.yml").unlink()
+        (self.approach / "README.md").write_text(
+            "tira-cli code-submission \\\n    --command '/search.py $inputDataset' \\\n"
+        )
+        expected = ApproachManifest("my approach", self.approach, "/search.py $inputDataset")
+
+        self.assertEqual(expected, ApproachManifest.load(self.approach))
+
+        (self.approach / "README.md").unlink()
+        with self.assertRaises(ValueError):
+            ApproachManifest.load(self.approach)
+
+    def test_local_process(self):
+        output = self.tmp / "output"
+
+        approach = ApproachManifest.load(self.approach)
+        with mock.patch("builtins.print") as printed:
+            LocalProcessBackend().run(approach, self.dataset, self.tmp / "emb", output, cpu_count=2, mem_limit="1g")
+
+        self.assertEqual("q1\n", (output / "run.txt").read_text())
+        self.assertEqual(f"threads 2 embeddings ['{self.tmp / 'emb'}']\n", printed.call_args_list[0].args[0])
+        # the memory limit is set before the approach starts
+        self.assertEqual(f"data {1024 ** 3}\n", printed.call_args_list[1].args[0])
+
+    def test_local_process_failures(self):
+        approach = ApproachManifest.load(self.approach)
+
+        with mock.patch.dict("os.environ", {"EXIT_CODE": "3"}), mock.patch("builtins.print"):
+            with self.assertRaises(subprocess.CalledProcessError):
+                LocalProcessBackend().run(approach, self.dataset, self.tmp / "emb", self.tmp / "output")
+            with self.assertRaises(subprocess.CalledProcessError):
+                LocalProcessBackend().run(approach, self.dataset, self.tmp / "emb", self.tmp / "output", mem_limit="1g")
+        with self.assertRaises(ValueError):
+            LocalProcessBackend().run(approach, self.dataset, None, self.tmp / "output")
+        with self.assertRaises(ValueError):
+            LocalProcessBackend().run(approach._replace(local_command=None), self.dataset, None, self.tmp / "output")
+
+    def test_container(self):
+        approach = ApproachManifest.load(self.approach)
+
+        with mock.patch("lsr_benchmark.execution._stream") as stream:
+            backend = execution_backend("podman")
+            backend.prepare(approach)
+            backend.run(approach, self.dataset, self.tmp / "emb", self.tmp / "output", cpu_count=4, mem_limit="16g")
+
+        self.assertIsInstance(backend, ContainerBackend)
+        expected = ["podman", "build", "-t", "lsr-benchmark/my-approach:local", str(self.approach)]
+        self.assertEqual(expected, stream.call_args_list[0].args[0])
+        args = stream.call_args_list[1].args[0]
+        self.assertEqual(["podman", "run", "--rm", "--network", "none"], args[:5])
+        self.assertIn(f"{self.dataset.resolve()}:/tira-data/input:ro", args)
+        self.assertIn(f"{(self.tmp / 'emb').resolve()}:/tira-data/input-run:ro", args)
+        self.assertIn("TIRA_INPUT_DATASET=/tira-data/input", args)
+        self.assertEqual(["--cpus", "4", "--memory", "16g"], args[args.index("--cpus"):args.index("--cpus") + 4])
+        expected = ["/search.py", "/tira-data/input", "/tira-data/output", "/tira-data/input-run"]
+        self.assertEqual(["lsr-benchmark/my-approach:local"] + expected, args[-5:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from lsr_benchmark.irds import IdTable, memory_mapped_ids
+
+RESOURCE_DIR = Path(__file__).parent / "resources"
+IDS_FILE = RESOURCE_DIR / "example-embeddings" / "doc" / "doc-ids.txt"
+DOC_IDS = [
+    "a6551a7a-505c-4b91-84eb-c85100ea6451",
+    "a62a10fe-6c29-437d-b55b-366d8982a238",
+    "92c8f82d-c8f9-4565-b273-6c1fea175861",
+    "302a8583-d3f6-450e-ad18-dc302cae36f4",
+]
+
+
+class TestIdTable(unittest.TestCase):
+    def test_from_file(self):
+        actual = IdTable.from_file(IDS_FILE)
+
+        self.assertEqual(4, len(actual))
+        self.assertEqual(DOC_IDS, list(actual))
+        self.assertEqual(DOC_IDS[2], actual[2])
+        self.assertEqual(DOC_IDS[3], actual[-1])
+
+    def test_from_ids_is_identical_to_from_file(self):
+        self.assertEqual(IdTable.from_file(IDS_FILE).offsets.tolist(), IdTable.from_ids(DOC_IDS).offsets.tolist())
+        self.assertEqual(IdTable.from_file(IDS_FILE).blob.tobytes(), IdTable.from_ids(DOC_IDS).blob.tobytes())
+
+    def test_row_of(self):
+        table = IdTable.from_ids(DOC_IDS)
+
+        for row, doc_id in enumerate(DOC_IDS):
+            self.assertEqual(row, table.row_of(doc_id))
+        self.assertNotIn("does-not-exist", table)
+        with self.assertRaises(KeyError):
+            table.row_of("does-not-exist")
+
+    def test_row_of_with_many_ids_and_non_ascii(self):
+        ids = [f"doc-{i}" for i in range(5000)] + ["dökument-ü"]
+        table = IdTable.from_ids(ids)
+
+        self.assertEqual(5000, table.row_of("dökument-ü"))
+        self.assertEqual(1234, table.row_of("doc-1234"))
+        self.assertEqual("dökument-ü", table[5000])
+
+    def test_ids_of(self):
+        table = IdTable.from_ids(["a", "bbb", "cc", "dökument"])
+
+        actual = table.ids_of(np.array([3, 0, 1, 1, 2]))
+
+        self.assertEqual(["dökument", "a", "bbb", "bbb", "cc"], actual.tolist())
+        self.assertEqual([], table.ids_of([]).tolist())
+
+    def test_slices(self):
+        table = IdTable.from_ids(DOC_IDS)
+        table.row_of(DOC_IDS[0])
+
+        actual = table[1:3]
+
+        self.assertEqual(DOC_IDS[1:3], list(actual))
+        self.assertEqual(1, actual.row_of(DOC_IDS[2]))
+        self.assertNotIn(DOC_IDS[0], actual)
+        self.assertEqual([DOC_IDS[2]], actual.ids_of([1]).tolist())
+
+    def test_concatenate(self):
+        table = IdTable.from_ids(DOC_IDS)
+
+        actual = IdTable.concatenate([table[0:1], table[1:3], table[3:]])
+
+        self.assertEqual(DOC_IDS, list(actual))
+        self.assertEqual(3, actual.row_of(DOC_IDS[3]))
+
+    def test_memory_mapped_ids(self):
+        first = memory_mapped_ids(IDS_FILE)
+        second = memory_mapped_ids(IDS_FILE)
+
+        self.assertIsInstance(first.blob, np.memmap)
+        self.assertEqual(DOC_IDS, list(second))
+        self.assertEqual(2, second.row_of(DOC_IDS[2]))
@@ -0,0 +1,70 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import yaml
+
+from lsr_benchmark import load
+from lsr_benchmark.index_cache import IndexCache, index_key, track_index
+
+RESOURCE_DIR = Path(__file__).parent / "resources"
+DATASET_DIR = str(RESOURCE_DIR / "example-dataset")
+EMBEDDING_DIR = str(RESOURCE_DIR / "example-embeddings")
+DOC_FILES = [RESOURCE_DIR / "example-embeddings" / "doc" / "doc-embeddings.npz", RESOURCE_DIR / "example-embeddings" / "doc" / "doc-ids.txt"]
+
+
+class TestIndexCache(unittest.TestCase):
+    def setUp(self):
+        self.builds = []
+
+    def build(self, target_dir: Path):
+        self.builds.append(target_dir)
+        (target_dir / "index.txt").write_text("my-index")
+
+    def test_index_is_built_once(self):
+        first, second = IndexCache("my-engine", DOC_FILES, {"m": 32}), IndexCache("my-engine", DOC_FILES, {"m": 32})
+
+        first_dir, second_dir = first.get(self.build), second.get(self.build)
+
+        self.assertEqual(1, len(self.builds))
+        self.assertEqual(first_dir, second_dir)
+        self.assertEqual("my-index", (second_dir / "index.txt").read_text())
+        self.assertFalse(first.hit)
+        self.assertTrue(second.hit)
+        self.assertEqual(first.build_seconds, second.build_seconds)
+
+    def test_key_depends_on_engine_params_and_embeddings(self):
+        expected = index_key("my-engine", DOC_FILES, {"m": 32})
+
+        self.assertEqual(expected, index_key("my-engine", DOC_FILES, {"m": 32}))
+        self.assertNotEqual(expected, index_key("other-engine", DOC_FILES, {"m": 32}))
+        self.assertNotEqual(expected, index_key("my-engine", DOC_FILES, {"m": 16}))
+        with tempfile.TemporaryDirectory() as directory:
+            ids_file = Path(directory) / "doc-ids.txt"
+            shutil.copy(DOC_FILES[1], ids_file)
+            self.assertEqual(expected, index_key("my-engine", [DOC_FILES[0], ids_file], {"m": 32}))
+            ids_file.write_text("other-ids\n")
+            self.assertNotEqual(expected, index_key("my-engine", [DOC_FILES[0], ids_file], {"m": 32}))
+
+    def test_disabled_cache_builds_each_time(self):
+        first, second = IndexCache("my-engine", DOC_FILES, enabled=False), IndexCache("my-engine", DOC_FILES, enabled=False)
+
+        self.assertNotEqual(first.get(self.build), second.get(self.build))
+        self.assertEqual(2, len(self.builds))
+        self.assertFalse(second.hit)
+        self.assertNotIn("directory", second.summary())
+
+    def test_cache_hit_is_added_to_the_metadata(self):
+        with tempfile.TemporaryDirectory() as output:
+            output = Path(output)
+            (output / "index-metadata.yml").write_text(yaml.safe_dump({"resources": {"runtime": "1 ms"}}))
+            doc_files = load(DATASET_DIR).doc_embedding_files(EMBEDDING_DIR)
+            with track_index(output, "my-engine", doc_files, {"m": 32}) as cache:
+                cache.get(self.build)
+
+            actual = yaml.safe_load((output / "index-metadata.yml").read_text())
+
+        self.assertEqual("1 ms", actual["resources"]["runtime"])
+        self.assertFalse(actual["resources"]["index_cache"]["hit"])
+        self.assertIn("build_time", actual["resources"]["index_cache"])
@@ -0,0 +1,57 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import yaml
+
+from lsr_benchmark._commands import _evaluate
+from lsr_benchmark.batch import QueryResult
+from lsr_benchmark.latency import LatencyRecorder, track_latency
+
+
+class TestLatency(unittest.TestCase):
+    def test_summary(self):
+        recorder = LatencyRecorder()
+        recorder.extend([QueryResult(str(i), None, i / 1000) for i in range(1, 101)])
+
+        actual = recorder.summary()
+
+        self.assertEqual(100, actual["queries"])
+        self.assertEqual("50.500 ms", actual["p50"])
+        self.assertEqual("99.010 ms", actual["p99"])
+        self.assertEqual("100.000 ms", actual["max"])
+        self.assertGreater(actual["qps"], 0)
+
+    def test_batches_get_the_amortized_latency(self):
+        recorder = LatencyRecorder()
+        with recorder.batch(["1", "2"]):
+            time.sleep(0.02)
+
+        self.assertEqual(["1", "2"], recorder.query_ids)
+        self.assertEqual(recorder.latencies[0], recorder.latencies[1])
+        self.assertGreaterEqual(recorder.latencies[0], 0.01)
+
+    def test_latencies_are_added_to_the_metadata(self):
+        with tempfile.TemporaryDirectory() as output:
+            output = Path(output)
+            with track_latency(output) as latency:
+                for query_id in ["q1", "q2", "q3"]:
+                    with latency.query(query_id):
+                        pass
+                (output / "retrieval-metadata.yml").write_text("resources:\n  runtime:\n    wallclock: 40 ms\n")
+
+            metadata = yaml.safe_load((output / "retrieval-metadata.yml").read_text())
+            sidecar = (output / "query-latencies.tsv").read_text().splitlines()
+
+        self.assertEqual("40 ms", metadata["resources"]["runtime"]["wallclock"])
+        self.assertEqual(3, metadata["resources"]["latency"]["queries"])
+        self.assertEqual(["query_id\tlatency_ms", "q1", "q2", "q3"], [sidecar[0]] + [i.split("\t")[0] for i in sidecar[1:]])
+
+    def test_latency_measures_in_evaluate(self):
+        metadata = {"resources": {"latency": {"p99": "1.500 ms", "qps": 12.5}}}
+        parse_measure = getattr(_evaluate, "__parse_measure")
+
+        self.assertEqual("1.500 ms", parse_measure("latency_p99")[2](metadata))
+        self.assertEqual(12.5, parse_measure("latency_qps")[2](metadata))
+        self.assertIsNone(parse_measure("latency_p90")[2](metadata))
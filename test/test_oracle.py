@@ -0,0 +1,80 @@
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from lsr_benchmark import load
+from lsr_benchmark._commands import _evaluate
+from lsr_benchmark.cache import cache_home
+from lsr_benchmark.irds import SparseEmbeddingMatrix
+from lsr_benchmark.oracle import ann_recall, exact_run, exact_top_k
+from lsr_benchmark.runs import RunRows
+from lsr_benchmark.search import InvertedIndex
+
+RESOURCE_DIR = Path(__file__).parent / "resources"
+DATASET_DIR = str(RESOURCE_DIR / "example-dataset")
+EMBEDDING_DIR = str(RESOURCE_DIR / "example-embeddings")
+
+
+def random_embeddings(prefix: str, num_rows: int, max_tokens: int, vocabulary: int, seed: int) -> SparseEmbeddingMatrix:
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(0, max_tokens, num_rows)
+    indptr = np.concatenate([[0], np.cumsum(counts)])
+    indices = rng.integers(0, vocabulary, indptr[-1]).astype(np.int32)
+    data = rng.random(indptr[-1]).astype(np.float32)
+    return SparseEmbeddingMatrix([f"{prefix}{i}" for i in range(num_rows)], data, indices, indptr)
+
+
+class TestOracle(unittest.TestCase):
+    def test_exact_top_k_is_identical_to_exhaustive_search(self):
+        docs = random_embeddings("d", 3000, 30, 500, 0)
+        queries = random_embeddings("q", 50, 10, 500, 1)
+        index = InvertedIndex.from_embeddings(docs)
+
+        actual = exact_top_k(docs, queries, k=10, threads=2, doc_chunk_size=256)
+
+        for query in queries:
+            expected = [i.doc_id for i in index.search(query.tokens, query.values, 10, pruning=False)]
+            self.assertEqual(expected, actual.doc_ids[actual.query_ids == query.id].tolist())
+
+    def test_ties_are_broken_by_document(self):
+        docs = SparseEmbeddingMatrix(["d0", "d1", "d2"], np.ones(3, np.float32), np.zeros(3, np.int32), np.arange(4))
+        queries = SparseEmbeddingMatrix(["q0"], np.ones(1, np.float32), np.zeros(1, np.int32), np.arange(2))
+
+        actual = exact_top_k(docs, queries, k=2, doc_chunk_size=1)
+
+        self.assertEqual(["d0", "d1"], actual.doc_ids.tolist())
+        self.assertEqual([1, 2], actual.ranks.tolist())
+
+    def test_ties_at_the_cutoff_are_broken_by_document(self):
+        values = np.ones(200, np.float32)
+        values[150] = 2
+        docs = SparseEmbeddingMatrix([f"d{i}" for i in range(200)], values, np.zeros(200, np.int32), np.arange(201))
+        queries = SparseEmbeddingMatrix(["q0"], np.ones(1, np.float32), np.zeros(1, np.int32), np.arange(2))
+
+        actual = exact_top_k(docs, queries, k=5)
+
+        self.assertEqual(["d150", "d0", "d1", "d2", "d3"], actual.doc_ids.tolist())
+
+    def test_ann_recall(self):
+        exact = RunRows(np.array(["q1", "q1", "q2"]), np.array(["d1", "d2", "d3"]), np.array([1, 2, 1]), np.ones(3))
+        run = [("q1", "d2", 3.0), ("q1", "d5", 2.0), ("q1", "d1", 1.0), ("q2", "d3", 1.0), ("q3", "d1", 1.0)]
+
+        self.assertEqual(0.75, ann_recall(run, exact, 2))
+        self.assertEqual(1.0, ann_recall(run, exact, 3))
+
+    def test_exact_run_is_cached(self):
+        dataset = load(DATASET_DIR)
+        expected = exact_run(dataset, EMBEDDING_DIR, 3)
+        with mock.patch("lsr_benchmark.oracle.exact_top_k") as exact_top_k_mock:
+            actual = exact_run(dataset, EMBEDDING_DIR, 3)
+
+        exact_top_k_mock.assert_not_called()
+        self.assertEqual(expected.doc_ids.tolist(), actual.doc_ids.tolist())
+        self.assertEqual(1, len(list((cache_home() / "oracle").iterdir())))
+
+    def test_ann_recall_measure_in_evaluate(self):
+        parse_measure = getattr(_evaluate, "__parse_measure")
+
+        self.assertEqual(("ann_recall@100", "oracle", 100), parse_measure("ann_recall@100"))
@@ -0,0 +1,76 @@
+import gzip
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from lsr_benchmark import load
+from lsr_benchmark.irds import _prefetch, parse_corpus
+
+RESOURCE_DIR = str(Path(__file__).parent / "resources" / "example-dataset")
+
+
+def write_corpus(directory, docs):
+    corpus_file = Path(directory) / "corpus.jsonl.gz"
+    with gzip.open(corpus_file, "wt") as f:
+        for doc in docs:
+            f.write(json.dumps(doc) + "\n")
+    return corpus_file
+
+
+class TestParseCorpus(unittest.TestCase):
+    def test_docs_iter_of_local_directory(self):
+        actual = [i.doc_id for i in load(RESOURCE_DIR).docs_iter()]
+
+        self.assertEqual(4, len(actual))
+        self.assertEqual("a6551a7a-505c-4b91-84eb-c85100ea6451", actual[0])
+
+    def test_parallel_docs_iter_of_local_directory(self):
+        expected = list(load(RESOURCE_DIR).docs_iter())
+        actual = list(load(RESOURCE_DIR).docs_iter(workers=2))
+
+        self.assertEqual(expected, actual)
+
+    def test_parallel_parsing_preserves_order(self):
+        docs = [{"doc_id": f"doc-{i}", "segments": [{"start": 1, "end": 2, "text": f"text {i}"}]} for i in range(2500)]
+        with tempfile.TemporaryDirectory() as directory:
+            corpus_file = write_corpus(directory, docs)
+            actual = list(parse_corpus(corpus_file, workers=3, batch_size=100))
+
+        self.assertEqual([f"doc-{i}" for i in range(2500)], [i.doc_id for i in actual])
+        self.assertEqual("text 1234", actual[1234].default_text())
+
+    def test_prefetch_stops_when_the_consumer_stops(self):
+        closed = threading.Event()
+
+        def numbers():
+            try:
+                yield from range(1000)
+            finally:
+                closed.set()
+
+        threads = threading.active_count()
+        prefetched = _prefetch(numbers(), 2)
+        self.assertEqual([0, 1, 2], [next(prefetched) for _ in range(3)])
+        prefetched.close()
+
+        self.assertTrue(closed.is_set())
+        self.assertEqual(threads, threading.active_count())
+
+    def test_validation_fails_for_missing_fields(self):
+        with tempfile.TemporaryDirectory() as directory:
+            corpus_file = write_corpus(directory, [{"doc_id": "1", "text": "no segments"}])
+
+            with self.assertRaises(ValueError):
+                list(parse_corpus(corpus_file))
+            with self.assertRaises(ValueError):
+                list(parse_corpus(corpus_file, workers=2))
+
+    def test_validation_can_be_disabled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            corpus_file = write_corpus(directory, [{"doc_id": "1", "segments": [], "ignored": 1}])
+
+            actual = list(parse_corpus(corpus_file, validate=False))
+
+        self.assertEqual("", actual[0].default_text())
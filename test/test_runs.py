@@ -0,0 +1,143 @@
+import contextlib
+import gzip
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from lsr_benchmark.irds import IdTable
+from lsr_benchmark.runs import ColumnarRun, RunRows, RunWriter, iter_run, read_run, top_k_rows, write_trec_run
+
+DOC_IDS = IdTable.from_ids(["d0", "d1", "d2", "d3"])
+
+
+class TestRuns(unittest.TestCase):
+    def test_rows_of_each_batch_belong_to_the_queries_of_the_batch(self):
+        first = top_k_rows(["q1", "q2"], [[3.0, 1.0], [2.0, 1.5]], [[2, 0], [1, 3]], DOC_IDS)
+        second = top_k_rows(["q3"], [[0.5, 0.25]], [[3, 2]], DOC_IDS)
+
+        actual = RunRows.concatenate([first, second])
+
+        self.assertEqual(["q1", "q1", "q2", "q2", "q3", "q3"], actual.query_ids.tolist())
+        self.assertEqual(["d2", "d0", "d1", "d3", "d3", "d2"], list(actual.doc_ids))
+        self.assertEqual([1, 2, 1, 2, 1, 2], actual.ranks.tolist())
+        self.assertEqual([3.0, 1.0, 2.0, 1.5, 0.5, 0.25], actual.scores.tolist())
+
+    def test_zero_scores_and_padding_are_dropped(self):
+        actual = top_k_rows(["q1", "q2"], [[2.0, 0.0, -np.inf], [1.0, 0.5, 0.25]], [[1, 2, 3], [0, -1, 2]], DOC_IDS)
+
+        self.assertEqual(["q1", "q2", "q2"], actual.query_ids.tolist())
+        self.assertEqual(["d1", "d0", "d2"], list(actual.doc_ids))
+        self.assertEqual([1, 1, 2], actual.ranks.tolist())
+
+    def test_shape_mismatch_is_rejected(self):
+        with self.assertRaises(ValueError):
+            top_k_rows(["q1"], [[1.0, 2.0], [3.0, 4.0]], [[0, 1], [2, 3]], DOC_IDS)
+
+    def test_empty_run(self):
+        self.assertEqual(0, len(RunRows.concatenate([])))
+
+    def test_write_trec_run(self):
+        run = top_k_rows(["q1", "q2"], [[2.0, 1.0], [0.5, 0.0]], [[1, 0], [3, 2]], DOC_IDS)
+        with tempfile.TemporaryDirectory() as directory:
+            run_file = Path(directory) / "run.txt.gz"
+            write_trec_run(run_file, run, "my-tag")
+            actual = gzip.open(run_file, "rt").read()
+
+        self.assertEqual("q1 Q0 d1 1 2 my-tag\nq1 Q0 d0 2 1 my-tag\nq2 Q0 d3 1 0.5 my-tag\n", actual)
+
+    def test_scores_keep_their_precision(self):
+        # e.g., the float64 sums of DuckDB, which would be tied as float32
+        ids = (np.array(["q1"] * 3), np.array(["d1", "d2", "d3"]), np.array([1, 2, 3]))
+        scores = [10.0000002, 10.0000001, 0.1]
+        for without_pyarrow in (False, True):
+            with tempfile.TemporaryDirectory() as directory, mock.patch(
+                "lsr_benchmark.runs._pyarrow", return_value=None
+            ) if without_pyarrow else contextlib.nullcontext():
+                write_trec_run(Path(directory) / "run.txt", RunRows(*ids, np.array(scores)), "t")
+                write_trec_run(Path(directory) / "run-32.txt", RunRows(*ids, np.array(scores, np.float32)), "t")
+                actual = read_run(Path(directory) / "run.txt").scores.tolist()
+                actual_32 = (Path(directory) / "run-32.txt").read_text().split("\n")[2]
+
+            self.assertEqual(scores, actual)
+            self.assertEqual("q1 Q0 d3 3 0.1 t", actual_32)
+
+    def test_run_writer_adds_rankings_of_queries(self):
+        with tempfile.TemporaryDirectory() as directory:
+            run_file = Path(directory) / "run.txt"
+            with RunWriter(run_file, "my-tag") as run:
+                run.add("q1", ["d2", "d1"], [0.75, 0.25])
+                run.add("q2", [], [])
+                run.add("q3", ["d1"], [1.0])
+            actual = run_file.read_text()
+
+        self.assertEqual("q1 Q0 d2 1 0.75 my-tag\nq1 Q0 d1 2 0.25 my-tag\nq3 Q0 d1 1 1 my-tag\n", actual)
+
+
+class TestReadRuns(unittest.TestCase):
+    RUN = RunRows(
+        np.array(["q2", "q2", "q1", "q1", "q1"]),
+        np.array(["d3", "d1", "d1", "d2", "d4"]),
+        np.array([1, 2, 1, 2, 3]),
+        np.array([0.5, 0.25, 12.5, 3.25, -1.0], dtype=np.float32),
+    )
+
+    def assertRun(self, expected: RunRows, actual: ColumnarRun):
+        self.assertIsInstance(actual, ColumnarRun)
+        self.assertEqual(np.float64, actual.scores.dtype)
+        self.assertEqual(len(set(expected.doc_ids.tolist())), len(actual.doc_ids))
+        rows = actual.rows()
+        self.assertEqual(expected.query_ids.tolist(), rows.query_ids.tolist())
+        self.assertEqual(expected.doc_ids.tolist(), rows.doc_ids.tolist())
+        self.assertEqual(expected.ranks.tolist(), rows.ranks.tolist())
+        self.assertEqual(expected.scores.tolist(), rows.scores.tolist())
+
+    def round_trip(self, file_name: str) -> ColumnarRun:
+        with tempfile.TemporaryDirectory() as directory:
+            write_trec_run(Path(directory) / file_name, self.RUN, "my-tag")
+            return read_run(Path(directory) / file_name)
+
+    def test_round_trip(self):
+        self.assertRun(self.RUN, self.round_trip("run.txt.gz"))
+        self.assertRun(self.RUN, self.round_trip("run.txt"))
+
+    def test_round_trip_without_pyarrow(self):
+        with mock.patch("lsr_benchmark.runs._pyarrow", return_value=None):
+            self.assertRun(self.RUN, self.round_trip("run.txt.gz"))
+
+    def test_runs_with_other_whitespace(self):
+        run = io.BytesIO(b"q2\tQ0\td3  1 0.5 a\nq2 Q0 d1 2 0.25 a\n\nq1 Q0 d1 1 12.5 a\nq1 Q0 d2 2 3.25 a\nq1 Q0 d4 3 -1 a\n")
+
+        self.assertRun(self.RUN, read_run(run))
+
+    def test_scores_keep_double_precision(self):
+        # e.g., runs of other engines, whose scores only differ beyond the precision of float32
+        run = b"q1 Q0 d1 1 10.0000001 a\nq1 Q0 d2 2 10.0000002 a\n"
+
+        self.assertEqual([10.0000001, 10.0000002], read_run(io.BytesIO(run)).scores.tolist())
+        with mock.patch("lsr_benchmark.runs._pyarrow", return_value=None):
+            self.assertEqual([10.0000001, 10.0000002], read_run(io.BytesIO(run)).scores.tolist())
+
+    def test_iter_run_in_blocks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            write_trec_run(Path(directory) / "run.txt", self.RUN, "my-tag")
+            with mock.patch("lsr_benchmark.runs.BLOCK_SIZE", 2):
+                self.assertRun(self.RUN, ColumnarRun.concatenate(iter_run(Path(directory) / "run.txt")))
+                with mock.patch("lsr_benchmark.runs._pyarrow", return_value=None):
+                    blocks = list(iter_run(Path(directory) / "run.txt"))
+
+        self.assertEqual([2, 2, 1], [len(i) for i in blocks])
+        self.assertRun(self.RUN, ColumnarRun.concatenate(blocks))
+
+    def test_to_dict(self):
+        actual = ColumnarRun.from_rows(self.RUN).to_dict()
+
+        self.assertEqual({"q1": {"d1": 12.5, "d2": 3.25, "d4": -1.0}, "q2": {"d3": 0.5, "d1": 0.25}}, actual)
+        self.assertEqual(["d3", "d1"], list(actual["q2"]))
+
+    def test_empty_run(self):
+        self.assertEqual(0, len(read_run(io.BytesIO(b""))))
+
@@ -0,0 +1,109 @@
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from lsr_benchmark.scheduler import DONE, FAILED, Job, JobLedger, run_jobs
+
+JOBS = [Job(d, e, a) for d in ("d1", "d2") for e in ("e1",) for a in ("a1", "a2/")]
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.out = Path(self.directory.name)
+        self.executed = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def ledger(self) -> JobLedger:
+        return JobLedger(self.out / "ledger.jsonl")
+
+    def run_jobs(self, execute=None, **kwargs):
+        def record(job):
+            self.executed.append(job)
+            if execute is not None:
+                execute(job)
+
+        return run_jobs(JOBS, record, self.ledger(), self.out / "logs", **{"backoff": 0, **kwargs})
+
+    def test_all_jobs_are_executed(self):
+        actual = self.run_jobs(workers=2)
+
+        self.assertEqual(JOBS, [i.job for i in actual])
+        self.assertEqual([DONE] * 4, [i.state for i in actual])
+        self.assertCountEqual(JOBS, self.executed)
+        self.assertEqual(self.out / "logs" / "d1" / "e1" / "a2.log", actual[1].log_file)
+
+    def test_jobs_run_concurrently(self):
+        barrier = threading.Barrier(len(JOBS), timeout=10)
+
+        self.assertEqual([DONE] * 4, [i.state for i in self.run_jobs(lambda job: barrier.wait(), workers=len(JOBS))])
+
+    def test_finished_jobs_are_skipped_on_resume(self):
+        def interrupted(job):
+            if job == JOBS[2]:
+                raise KeyboardInterrupt()
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.run_jobs(interrupted, workers=1)
+        self.assertEqual("running", self.ledger().state(JOBS[2])["state"])
+        self.executed.clear()
+
+        actual = self.run_jobs(workers=1)
+
+        # the job that was running is executed again, the queued job may or may not have started before the interrupt
+        self.assertEqual(JOBS[2], self.executed[0])
+        self.assertNotIn(JOBS[0], self.executed)
+        self.assertNotIn(JOBS[1], self.executed)
+        self.assertEqual([0, 0, 1], [i.attempts for i in actual[:3]])
+
+    def test_failed_jobs_are_retried(self):
+        attempts = []
+
+        def flaky(job):
+            if job == JOBS[0]:
+                attempts.append(job)
+                if len(attempts) < 3:
+                    raise ValueError("the container crashed")
+
+        actual = self.run_jobs(flaky, retries=2)
+
+        self.assertEqual((DONE, 3), (actual[0].state, actual[0].attempts))
+        self.assertEqual(2, actual[0].log_file.read_text().count("ValueError: the container crashed"))
+
+    def test_failures_are_reported_with_logs(self):
+        def failing(job):
+            print(f"output of {job.key}")
+            print(f"error of {job.key}", file=sys.stderr)
+            if job.approach == "a1":
+                raise ValueError("invalid run")
+
+        actual = self.run_jobs(failing, workers=2, retries=1)
+
+        self.assertEqual([FAILED, DONE, FAILED, DONE], [i.state for i in actual])
+        self.assertEqual(["ValueError: invalid run", None] * 2, [i.error for i in actual])
+        log = actual[0].log_file.read_text()
+        self.assertEqual(2, log.count("output of d1/e1/a1"))
+        self.assertIn("error of d1/e1/a1", log)
+        self.assertIn("Traceback", log)
+        self.assertNotIn("d2", log)
+        self.assertEqual(FAILED, self.ledger().state(JOBS[0])["state"])
+        self.assertEqual(2, self.ledger().state(JOBS[0])["attempt"])
+
+        self.executed.clear()
+        self.run_jobs(workers=2)
+        self.assertCountEqual([JOBS[0], JOBS[2]], self.executed)
+
+    def test_truncated_ledger(self):
+        self.run_jobs()
+        with (self.out / "ledger.jsonl").open("a") as f:
+            f.write('{"job": "d1/e1/a1", "sta')
+
+        self.assertTrue(all(self.ledger().is_done(i) for i in JOBS))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from lsr_benchmark.irds import SparseEmbeddingMatrix, embeddings
+from lsr_benchmark.search import InvertedIndex, build_index
+
+RESOURCE_DIR = Path(__file__).parent / "resources"
+DATASET_DIR = str(RESOURCE_DIR / "example-dataset")
+EMBEDDING_DIR = str(RESOURCE_DIR / "example-embeddings")
+
+
+def random_embeddings(rows: int, vocabulary: int, max_tokens: int, seed: int) -> SparseEmbeddingMatrix:
+    rng = np.random.default_rng(seed)
+    indices, data, indptr = [], [], [0]
+    for _ in range(rows):
+        # zipfian tokens, i.e., some very long posting lists as for real models
+        tokens = np.unique(np.minimum(rng.zipf(1.5, rng.integers(1, max_tokens)) - 1, vocabulary - 1))
+        indices.append(tokens)
+        data.append(rng.random(len(tokens)).astype(np.float32))
+        indptr.append(indptr[-1] + len(tokens))
+    return SparseEmbeddingMatrix(
+        [f"id-{i}" for i in range(rows)], np.concatenate(data), np.concatenate(indices), np.array(indptr)
+    )
+
+
+def exhaustive_top_k(docs: SparseEmbeddingMatrix, tokens, values, k: int):
+    scores = np.zeros(len(docs), dtype=np.float64)
+    query = dict(zip(np.asarray(tokens).tolist(), np.asarray(values).tolist()))
+    for row, doc in enumerate(docs):
+        scores[row] = sum(query.get(t, 0) * v for t, v in zip(doc.tokens.tolist(), doc.values.tolist()))
+    rows = np.lexsort((np.arange(len(docs)), -scores))[:k]
+    return rows[scores[rows] > 0], scores[rows][scores[rows] > 0]
+
+
+class TestInvertedIndex(unittest.TestCase):
+    def test_search_on_example_embeddings(self):
+        docs = embeddings(DATASET_DIR, EMBEDDING_DIR, "doc")
+        index = InvertedIndex.from_embeddings(docs)
+
+        actual = index.search([7, 11], [1.0, 2.0], k=10)
+
+        self.assertEqual([docs.ids[0], docs.ids[1]], [i.doc_id for i in actual])
+        self.assertAlmostEqual(0.5 + 4.0, actual[0].score, places=5)
+
+    def test_index_from_chunks_is_identical(self):
+        docs = random_embeddings(500, 200, 30, seed=1)
+        expected = InvertedIndex.from_embeddings(docs, block_size=8)
+        actual = InvertedIndex.from_embeddings(docs.chunks(33), block_size=8)
+
+        self.assertEqual(list(expected.doc_ids), list(actual.doc_ids))
+        for name in ["term_offsets", "docs", "values", "term_max", "block_offsets", "block_max"]:
+            np.testing.assert_array_equal(getattr(expected, name), getattr(actual, name))
+
+    def test_top_k_is_exact_with_and_without_pruning(self):
+        docs = random_embeddings(2000, 500, 40, seed=2)
+        queries = random_embeddings(30, 500, 15, seed=3)
+        index = InvertedIndex.from_embeddings(docs, block_size=16)
+
+        for query in queries:
+            expected_rows, expected_scores = exhaustive_top_k(docs, query.tokens, query.values, 10)
+            for pruning in [True, False]:
+                rows, scores = index.search_rows(query.tokens, query.values, 10, pruning)
+                np.testing.assert_allclose(expected_scores, scores, rtol=1e-5)
+                self.assertEqual(len(expected_rows), len(rows))
+
+    def test_searches_do_not_influence_each_other(self):
+        docs = random_embeddings(300, 100, 20, seed=4)
+        query = docs[5]
+        index = InvertedIndex.from_embeddings(docs)
+
+        expected = index.search(query.tokens, query.values, 5)
+        index.search(docs[7].tokens, docs[7].values, 5)
+
+        self.assertEqual(expected, index.search(query.tokens, query.values, 5))
+
+    def test_unknown_tokens_are_ignored(self):
+        index = InvertedIndex.from_embeddings(random_embeddings(10, 20, 5, seed=5))
+
+        self.assertEqual([], index.search([1000], [1.0], 10))
+
+    def test_saved_index_is_memory_mapped(self):
+        docs = random_embeddings(300, 100, 20, seed=6)
+        expected = InvertedIndex.from_embeddings(docs)
+        with tempfile.TemporaryDirectory() as directory:
+            build_index(docs, directory=Path(directory) / "index")
+            actual = build_index(None, directory=Path(directory) / "index")
+
+            self.assertIsInstance(actual.docs, np.memmap)
+            for query in docs.chunks(50):
+                self.assertEqual(
+                    expected.search(query[0].tokens, query[0].values, 10),
+                    actual.search(query[0].tokens, query[0].values, 10),
+                )
@@ -0,0 +1,58 @@
+import gzip
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from lsr_benchmark.irds import LsrBenchmarkSegmentedDocument, build_dataset
+
+RESOURCE_DIR = str(Path(__file__).parent / "resources" / "example-dataset")
+
+
+class TestSegmentedDocuments(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.dataset_dir = Path(self.directory.name) / "dataset"
+        self.dataset_dir.mkdir()
+        with gzip.open(self.dataset_dir / "corpus.jsonl.gz", "wt") as f:
+            for i in range(3):
+                segments = [{"start": j, "end": j + 1, "text": f"doc {i} segment {j}"} for j in range(i + 1)]
+                f.write(json.dumps({"doc_id": f"doc-{i}", "segments": segments}) + "\n")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_docs_iter_of_example_dataset(self):
+        actual = list(build_dataset(RESOURCE_DIR, True).docs_iter())
+
+        self.assertEqual(4, len(actual))
+        self.assertEqual("a6551a7a-505c-4b91-84eb-c85100ea6451___0___", actual[0].doc_id)
+        self.assertEqual("one apple a day keeps doctor away", actual[0].default_text())
+
+    def test_docs_iter(self):
+        actual = list(build_dataset(str(self.dataset_dir), True).docs_iter())
+
+        self.assertEqual(
+            ["doc-0___0___", "doc-1___0___", "doc-1___1___", "doc-2___0___", "doc-2___1___", "doc-2___2___"],
+            [i.doc_id for i in actual],
+        )
+        self.assertEqual("doc 2 segment 1", actual[4].default_text())
+
+    def test_docs_count(self):
+        self.assertEqual(6, build_dataset(str(self.dataset_dir), True).docs_count())
+        self.assertEqual(3, build_dataset(str(self.dataset_dir), False).docs_count())
+
+    def test_random_access_to_segments(self):
+        docs_store = build_dataset(str(self.dataset_dir), True).docs_store()
+
+        actual = docs_store.get_many(["doc-2___1___", "doc-0___0___", "doc-0___5___", "doc-9___0___", "doc-1"])
+
+        self.assertEqual({"doc-0___0___", "doc-2___1___"}, set(actual.keys()))
+        self.assertEqual("doc 2 segment 1", actual["doc-2___1___"].default_text())
+        self.assertEqual("doc 1 segment 0", docs_store.get("doc-1___0___").default_text())
+
+    def test_parse_segment_id(self):
+        self.assertEqual(("a___b", 12), LsrBenchmarkSegmentedDocument.parse_segment_id("a___b___12___"))
+        self.assertEqual("a___3___", LsrBenchmarkSegmentedDocument.segment_id("a", 3))
+        with self.assertRaises(KeyError):
+            LsrBenchmarkSegmentedDocument.parse_segment_id("a___b___")
@@ -0,0 +1,141 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from lsr_benchmark.cache import cache_home
+from lsr_benchmark.irds import SparseEmbeddingMatrix, _token_strings, embeddings, stream_embeddings
+
+RESOURCE_DIR = Path(__file__).parent / "resources"
+EMBEDDING_DIR = str(RESOURCE_DIR / "example-embeddings")
+NPZ_FILE = RESOURCE_DIR / "example-embeddings" / "doc" / "doc-embeddings.npz"
+
+
+class TestSparseEmbeddingMatrix(unittest.TestCase):
+    def test_number_of_doc_embeddings(self):
+        actual = embeddings(str(RESOURCE_DIR / "example-dataset"), EMBEDDING_DIR, "doc")
+
+        self.assertEqual(4, len(actual))
+
+    def test_number_of_query_embeddings(self):
+        actual = embeddings(str(RESOURCE_DIR / "example-dataset"), EMBEDDING_DIR, "query")
+
+        self.assertEqual(3, len(actual))
+
+    def test_random_access_by_row_and_by_id(self):
+        matrix = embeddings(str(RESOURCE_DIR / "example-dataset"), EMBEDDING_DIR, "doc")
+
+        by_row = matrix[1]
+        by_id = matrix["a62a10fe-6c29-437d-b55b-366d8982a238"]
+
+        self.assertEqual("a62a10fe-6c29-437d-b55b-366d8982a238", by_row.id)
+        self.assertEqual([3, 5, 7, 13], by_row.tokens.tolist())
+        self.assertEqual([1.0, 0.25, 0.75, 1.25], by_row.values.tolist())
+        self.assertEqual(by_row.tokens.tolist(), by_id.tokens.tolist())
+        self.assertEqual("302a8583-d3f6-450e-ad18-dc302cae36f4", matrix[-1].id)
+        self.assertEqual(1, matrix.row_of("a62a10fe-6c29-437d-b55b-366d8982a238"))
+
+    def test_missing_rows_raise(self):
+        matrix = embeddings(str(RESOURCE_DIR / "example-dataset"), EMBEDDING_DIR, "doc")
+
+        with self.assertRaises(IndexError):
+            matrix[4]
+        with self.assertRaises(KeyError):
+            matrix.get("does-not-exist")
+
+    def test_rows_are_views(self):
+        matrix = embeddings(str(RESOURCE_DIR / "example-dataset"), EMBEDDING_DIR, "doc")
+
+        for _, tokens, values in matrix:
+            self.assertTrue(np.shares_memory(matrix.indices, tokens))
+            self.assertTrue(np.shares_memory(matrix.data, values))
+
+    def test_slicing(self):
+        matrix = embeddings(str(RESOURCE_DIR / "example-dataset"), EMBEDDING_DIR, "doc")
+
+        actual = matrix[1:3]
+
+        self.assertEqual(2, len(actual))
+        self.assertEqual([0, 4, 5], actual.indptr.tolist())
+        self.assertEqual([1], actual["92c8f82d-c8f9-4565-b273-6c1fea175861"].tokens.tolist())
+        self.assertEqual([list(matrix[i].tokens) for i in [1, 2]], [list(i.tokens) for i in actual])
+
+    def test_legacy_tuples_have_string_tokens(self):
+        matrix = embeddings(str(RESOURCE_DIR / "example-dataset"), EMBEDDING_DIR, "query")
+
+        actual = list(matrix.tuples())
+
+        self.assertEqual(["300", "700", "701"], [i[0] for i in actual])
+        self.assertEqual(["2", "11"], actual[0][1].tolist())
+        self.assertEqual([1.0, 0.5], actual[0][2].tolist())
+
+    def test_string_token_type(self):
+        matrix = embeddings(str(RESOURCE_DIR / "example-dataset"), EMBEDDING_DIR, "doc", token_type="str")
+
+        self.assertEqual(["3", "5", "7", "13"], matrix[1].tokens.tolist())
+        self.assertEqual(["1"], matrix[1:3][1].tokens.tolist())
+        self.assertEqual([["2", "7", "11"], ["3", "5", "7", "13"]], [i.tokens.tolist() for i in matrix][:2])
+
+    def test_string_tokens_of_concurrent_threads(self):
+        tokens = [np.arange(i, 50 * i, i) for i in range(1, 65)]
+
+        with ThreadPoolExecutor(8) as executor:
+            actual = list(executor.map(_token_strings, tokens))
+
+        self.assertEqual([i.astype(str).tolist() for i in tokens], [i.tolist() for i in actual])
+
+    def test_int_token_type_is_default(self):
+        matrix = embeddings(str(RESOURCE_DIR / "example-dataset"), EMBEDDING_DIR, "doc")
+
+        self.assertEqual("int", matrix.token_type)
+        self.assertTrue(np.issubdtype(matrix[0].tokens.dtype, np.integer))
+
+    def test_invalid_token_type_is_rejected(self):
+        with self.assertRaises(ValueError):
+            embeddings(str(RESOURCE_DIR / "example-dataset"), EMBEDDING_DIR, "doc", token_type="float")
+
+    def test_invalid_indptr_is_rejected(self):
+        with self.assertRaises(ValueError):
+            SparseEmbeddingMatrix(["a"], np.array([1.0]), np.array([1]), np.array([0, 1, 1]))
+
+
+class TestChunkedEmbeddings(unittest.TestCase):
+    def assert_chunks(self, chunks):
+        chunks = list(chunks)
+        expected = embeddings(str(RESOURCE_DIR / "example-dataset"), EMBEDDING_DIR, "doc")
+
+        self.assertEqual([3, 1], [len(i) for i in chunks])
+        self.assertEqual([0, 2], chunks[1].indptr.tolist())
+        self.assertEqual(
+            [(i.id, i.tokens.tolist(), i.values.tolist()) for i in expected],
+            [(i.id, i.tokens.tolist(), i.values.tolist()) for chunk in chunks for i in chunk],
+        )
+
+    def test_chunks_streamed_from_archive(self):
+        chunks = list(embeddings(str(RESOURCE_DIR / "example-dataset"), EMBEDDING_DIR, "doc", chunk_size=3))
+
+        self.assertFalse((cache_home() / "embeddings").exists())
+        self.assert_chunks(chunks)
+
+    def test_chunks_from_cache(self):
+        embeddings(str(RESOURCE_DIR / "example-dataset"), EMBEDDING_DIR, "doc")
+        chunks = list(embeddings(str(RESOURCE_DIR / "example-dataset"), EMBEDDING_DIR, "doc", chunk_size=3))
+
+        self.assertIsInstance(chunks[0].data, np.memmap)
+        self.assert_chunks(chunks)
+
+    def test_stream_with_chunk_size_larger_than_dataset(self):
+        chunks = list(stream_embeddings(NPZ_FILE, [str(i) for i in range(4)], 100))
+
+        self.assertEqual(1, len(chunks))
+        self.assertEqual([0, 3, 7, 8, 10], chunks[0].indptr.tolist())
+
+    def test_streamed_chunks_with_string_tokens(self):
+        chunks = list(stream_embeddings(NPZ_FILE, [str(i) for i in range(4)], 3, "str"))
+
+        self.assertEqual(["4", "9"], chunks[1][0].tokens.tolist())
+
+    def test_invalid_chunk_size(self):
+        with self.assertRaises(ValueError):
+            list(stream_embeddings(NPZ_FILE, ["a"], 0))
@@ -0,0 +1,81 @@
+import contextlib
+import gzip
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from lsr_benchmark import load
+from lsr_benchmark.sweep import NativeEngine, SeismicEngine, grid_points, pareto_optimal, parse_grid, sweep
+
+RESOURCE_DIR = Path(__file__).parent / "resources"
+DATASET_DIR = str(RESOURCE_DIR / "example-dataset")
+EMBEDDING_DIR = str(RESOURCE_DIR / "example-embeddings")
+
+
+class TestSweep(unittest.TestCase):
+    def test_parse_grid(self):
+        actual = parse_grid(["query-cut=5,10", "heap_factor=0.5"], {"query_cut": 10, "heap_factor": 0.8, "use_u32": False})
+
+        self.assertEqual({"query_cut": [5, 10], "heap_factor": [0.5], "use_u32": [False]}, actual)
+        self.assertEqual([True, False], parse_grid(["pruning=true,false"], {"pruning": True})["pruning"])
+
+    def test_unknown_parameters_are_rejected(self):
+        with self.assertRaises(ValueError):
+            parse_grid(["ef_search=10"], {"query_cut": 10})
+
+    def test_grid_points(self):
+        actual = grid_points({"a": [1, 2], "b": [True]})
+
+        self.assertEqual([{"a": 1, "b": True}, {"a": 2, "b": True}], actual)
+
+    def test_pareto_optimal(self):
+        actual = pareto_optimal([0.5, 0.9, 0.8, 0.9], [1.0, 5.0, 6.0, 4.0])
+
+        self.assertEqual([True, False, False, True], actual)
+
+    def test_seismic_loads_indexes_of_the_step_03_script(self):
+        # the step-03 seismic script caches its index under the same key, but only writes the index itself
+        index_class = mock.Mock()
+        with tempfile.TemporaryDirectory() as index_dir, mock.patch.object(
+            SeismicEngine, "_SeismicEngine__seismic", return_value=(None, index_class)
+        ) as seismic:
+            (Path(index_dir) / "index.index.seismic").write_text("")
+            SeismicEngine().load(Path(index_dir), use_u32=True)
+
+        seismic.assert_called_once_with(True)
+        index_class.load.assert_called_once_with(str(Path(index_dir) / "index.index.seismic"))
+
+    def test_embedding_names_of_the_command(self):
+        from click.testing import CliRunner
+
+        from lsr_benchmark import main
+
+        with tempfile.TemporaryDirectory() as output, mock.patch("lsr_benchmark.irds.build_dataset"), mock.patch(
+            "lsr_benchmark.sweep.sweep", return_value=[]
+        ) as run_sweep:
+            embeddings = [("naver/splade-v3", "lightning-ir/naver-splade-v3"), (EMBEDDING_DIR, EMBEDDING_DIR)]
+            for embedding, expected in embeddings:
+                args = ["sweep", "--dataset", DATASET_DIR, "--embedding", embedding, "-o", output]
+                result = CliRunner().invoke(main, args)
+
+                self.assertEqual(0, result.exit_code, result.output)
+                self.assertEqual(expected, run_sweep.call_args.args[1])
+
+    def test_sweep_builds_each_index_once(self):
+        with tempfile.TemporaryDirectory() as output, mock.patch(
+            "lsr_benchmark.sweep._tracking", lambda *args: contextlib.nullcontext()
+        ):
+            engine = NativeEngine()
+            grid = {"pruning": [True, False]}
+            with mock.patch.object(engine, "build", wraps=engine.build) as build:
+                rows = sweep(load(DATASET_DIR), EMBEDDING_DIR, engine, {"block_size": [2]}, grid, Path(output), k=3)
+                runs = [gzip.open(Path(output) / i["run"] / "run.txt.gz", "rt").read().split("\n") for i in rows]
+
+                self.assertEqual(1, build.call_count)
+                self.assertTrue((Path(output) / "pareto.tsv").is_file())
+                self.assertTrue((Path(output) / rows[0]["run"] / "query-latencies.tsv").is_file())
+
+        self.assertEqual(["native-search-block-size-2-pruning-True", "native-search-block-size-2-pruning-False"], [i["run"] for i in rows])
+        self.assertEqual([r.split(" ")[:5] for r in runs[0]], [r.split(" ")[:5] for r in runs[1]])
+        self.assertEqual(1.0, rows[0]["recall@3"])